@@ -0,0 +1,123 @@
+"""
+An on-disk cache of parsed lattices.  Loading the same Dynac input file many
+times (e.g., once per iteration of an error study) then only parses it once, with
+every later load being a single unpickling of the cached lattice.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+
+# Bump this whenever a change to the parser or to the element classes would make
+# previously pickled lattices invalid.
+_CACHE_VERSION = b'3'
+
+CACHE_DIR_ENV = 'PYNAC_CACHE_DIR'
+"""
+Name of the environment variable that, when set, gives the directory of the
+lattice cache used by default by every ``Pynac`` instance in the process.
+"""
+
+
+class LatticeCache(object):
+    """
+    A size-bounded directory of pickled ``(name, lattice)`` pairs, keyed by a
+    SHA-1 hash of the content of the input file they were parsed from.  Any edit
+    to an input file therefore results in a cache miss, rather than a stale
+    lattice.
+
+    Entries are written atomically, so that a single cache directory can safely
+    be shared between many processes (e.g., the workers of ``multi_process_pynac``).
+    When the total size of the entries exceeds ``max_bytes``, the least recently
+    used entries are evicted.
+    """
+    def __init__(self, directory, max_bytes=64 * 2**20):
+        self.directory = directory
+        self.maxBytes = max_bytes
+
+    @classmethod
+    def for_deck(cls, filename):
+        """
+        Return the default cache for the input file ``filename``.  This is in the
+        directory named by the ``PYNAC_CACHE_DIR`` environment variable if it is
+        set, or in a ``.pynac_cache`` directory next to the input file otherwise.
+        """
+        directory = os.environ.get(CACHE_DIR_ENV)
+        if not directory:
+            directory = os.path.join(os.path.dirname(os.path.abspath(filename)), '.pynac_cache')
+        return cls(directory)
+
+    def key(self, filename):
+        """
+        Return the cache key of the input file ``filename``.
+        """
+        sha = hashlib.sha1(_CACHE_VERSION)
+        with open(filename, 'rb') as f:
+            sha.update(f.read())
+        return sha.hexdigest()
+
+    def load(self, key):
+        """
+        Return the ``(name, lattice)`` pair stored under ``key``, or ``None`` if
+        there is no such entry.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                name, lattice = pickle.load(f)
+            os.utime(path, None)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, ValueError):
+            return None
+        return name, lattice
+
+    def store(self, key, name, lattice):
+        """
+        Store the ``(name, lattice)`` pair under ``key``, and evict old entries if
+        the cache has grown beyond its size limit.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((name, lattice), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the total size of the cache
+        is no more than ``maxBytes``.
+        """
+        entries = []
+        for entry in os.listdir(self.directory):
+            if not entry.endswith('.pkl'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, entry))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.maxBytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, entry))
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        """
+        Remove every entry from the cache.
+        """
+        if os.path.isdir(self.directory):
+            for entry in os.listdir(self.directory):
+                if entry.endswith('.pkl'):
+                    os.remove(os.path.join(self.directory, entry))
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pkl')
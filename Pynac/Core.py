@@ -1,11 +1,23 @@
 """
 The primary module for Pynac.
 """
+import asyncio
+import functools
+import math
 import subprocess as subp
+import tempfile
+from collections.abc import Sequence
 from contextlib import contextmanager
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
 import os
+import queue
+import re
+import resource
 import shutil
+import signal
+import sys
+import threading
+import time
 from IPython.display import display
 import ipywidgets as widgets
 from ipywidgets import HBox, VBox, Layout, Box
@@ -13,10 +25,24 @@ from bokeh.models import ColumnDataSource
 from bokeh.plotting import figure
 from bokeh.layouts import gridplot
 from bokeh.io import show, push_notebook, curdoc, curstate
-from Pynac.DataClasses import Param, SingleDimPS, CentreOfGravity
+from Pynac.DataClasses import Param, SingleDimPS, CentreOfGravity, ProgressEvent, RunStats, IterationResult
+from Pynac.Cache import LatticeCache, CACHE_DIR_ENV
+from Pynac.Lattice import IndexedLattice, render_deck
+from Pynac.Output import read_emit_cards, _default_directory
+from Pynac._batch import settings as _batch_settings
 import Pynac.Elements as pyEle
 import Pynac.Plotting as pynPlt
 
+# ru_maxrss is in bytes on macOS, and in kilobytes elsewhere.
+_RSS_SCALE = 1 if sys.platform == 'darwin' else 1024
+# The files written by Dynac, and the caches that Pynac keeps beside them, which
+# are never linked into the slot of a DynacPool.
+_DYNAC_OUTPUTS = frozenset(['dynac.short', 'dynac.print', 'dynac.dmp', 'emit.plot',
+                            'dynac.print.npy', 'emit.plot.idx'])
+# A line of Dynac's stdout reporting the element that it starts to process, as its
+# (1-based) position in the lattice, followed by its Dynac type.
+_PROGRESS_LINE = re.compile(r'\s*(\d+)\s+([A-Z][A-Z0-9_]*)\s*\Z')
+
 
 class Pynac(object):
     """
@@ -25,6 +51,12 @@ class Pynac(object):
     as methods to manipulate the lattice, and to make the call to Dynac.
     """
     _DEBUG = False
+    timeout = None
+    """Default wall-clock time limit of ``run``, in seconds (``None`` for no limit)."""
+    cpuLimit = None
+    """Default CPU time limit of ``run``, in seconds (``None`` for no limit)."""
+    pool = None
+    """Default ``DynacPool`` of warm Dynac processes used by ``run`` (``None`` for none)."""
     _fieldData = {
         'INPUT': 2,
         'RDBEAM': 5,
@@ -53,15 +85,35 @@ class Pynac(object):
         'T3D': 0
     }
 
-    def __init__(self, filename=None):
+    def __init__(self, filename=None, cache=None):
+        """
+        Parse the Dynac input file ``filename`` (if given) into the ``lattice``
+        attribute.
+
+        ``cache`` controls the use of an on-disk ``Cache.LatticeCache`` of parsed
+        lattices.  It may be ``True`` (use the default cache for this file), the
+        name of a cache directory, a ``LatticeCache`` instance, or ``False`` (never
+        use a cache).  The default of ``None`` uses the cache in the directory
+        named by the ``PYNAC_CACHE_DIR`` environment variable if that is set, and
+        no cache otherwise.
+        """
         if filename:
             self.filename = filename
+            cache = self._lattice_cache(cache)
+            if cache:
+                key = cache.key(self.filename)
+                cached = cache.load(key)
+                if cached is not None:
+                    self.name, self.lattice = cached
+                    return
             with open(self.filename, 'r') as file:
                 self.rawData = [' '.join(line.split()) for line in file]
-                if self._DEBUG:
-                    print("rawData:")
-                    print(self.rawData)
+            if self._DEBUG:
+                print("rawData:")
+                print(self.rawData)
             self._parse()
+            if cache:
+                cache.store(key, self.name, self.lattice)
 
     @classmethod
     def from_lattice(cls, name, lattice):
@@ -70,41 +122,277 @@ class Pynac(object):
         pyn.lattice = lattice
         return pyn
 
-    def run(self):
+    def run(self, progress=None, timeout=None, cpu_limit=None, cancel=None, cwd=None, pool=None):
         """
-        Run the simulation in the current directory.
+        Run the simulation in the directory ``cwd``, or in the current directory if
+        this is not given.  As this doesn't change the working directory of the
+        calling process, simulations can be run concurrently from several threads,
+        each in its own directory (see ``run_directory``).  When the calling thread
+        is running an iteration of ``map_pynac`` or ``multi_process_pynac`` with the
+        thread backend, the directory of that iteration is used by default.
+
+        The whole input is rendered (see ``render``) before Dynac is started, and is
+        then sent to Dynac in a single write.
+
+        Dynac's stdout and stderr are drained continuously while it runs, so that a
+        verbose run cannot stall on a full pipe, and are kept, line by line, in the
+        ``dynacStdout`` and ``dynacStderr`` attributes.  If a callable is given as
+        ``progress``, it is called with a ``DataClasses.ProgressEvent`` for every
+        element that Dynac reports starting to process.  Only the lines giving the
+        position and Dynac type of an element of the lattice are reported, so that
+        other output that happens to look alike (e.g., a count of lost particles) is
+        not.  It is called from a background thread; any exception it raises is
+        re-raised here once Dynac has finished.
+
+        Dynac is killed, along with any processes it has started, if it runs for
+        longer than ``timeout`` seconds of wall-clock time, or ``cpu_limit`` seconds
+        of CPU time, in which case ``DynacTimeoutError`` is raised.  These default to
+        the ``timeout`` and ``cpuLimit`` attributes.  Setting the
+        ``threading.Event`` given as ``cancel`` (e.g., from another thread) kills
+        Dynac in the same way, and raises ``DynacCancelledError``.  Any other failure
+        of Dynac raises ``DynacError``.
+
+        The wall-clock time, CPU time and peak memory use of the run are recorded in
+        the ``runStats`` attribute as a ``DataClasses.RunStats``.
+
+        If a ``DynacPool`` is given as ``pool`` (by default, the ``pool`` attribute),
+        the deck is sent to one of its Dynac processes, which have already been
+        started, rather than to a new one.
         """
-        self._start_dynac_proc(stdin=subp.PIPE, stdout=subp.PIPE)
-        str2write = self.name + '\r\n'
-        if self._DEBUG:
-            with open('pynacrun.log', 'a') as f:
-                f.write(str2write)
-        self.dynacProc.stdin.write(str2write.encode())  # The name field
-        for pynEle in self.lattice:
-            try:
-                ele = pynEle.dynacRepresentation()
-            except AttributeError:
-                ele = pynEle
-            str2write = ele[0]
+        timeout = self._run_setting('timeout', timeout)
+        cpu_limit = self._run_setting('cpuLimit', cpu_limit)
+        pool = self._run_setting('pool', pool)
+        if cwd is None:
+            cwd = getattr(_batch_settings, 'directory', None)
+        deck = self.render()
+        start = time.monotonic()
+        slot = None
+        if pool is None:
+            self._start_dynac_proc(stdin=subp.PIPE, stdout=subp.PIPE, cpu_limit=cpu_limit, cwd=cwd)
+        else:
+            self.dynacProc, slot = pool.acquire(cwd, cpu_limit)
+        watchdog = drain = None
+        try:
+            watchdog = _Watchdog(self.dynacProc, timeout, cancel)
+            drain = _OutputDrain(self.dynacProc, progress, self._lattice_types(progress))
             if self._DEBUG:
-                with open('pynacrun.log', 'a') as f:
-                    f.write(str2write + '\r\n')
+                self.write_deck(os.path.join(cwd or '', 'pynacrun.log'), append=True)
             try:
-                self.dynacProc.stdin.write((str2write + '\r\n').encode())
+                self.dynacProc.stdin.write(deck)
             except IOError:
-                break
-            for datum in ele[1]:
-                str2write = ' '.join([str(i) for i in datum])
-                if self._DEBUG:
-                    with open('pynacrun.log', 'a') as f:
-                        f.write(str2write+'\r\n')
-                try:
-                    self.dynacProc.stdin.write((str2write+'\r\n').encode())
-                except IOError:
+                pass
+            try:
+                self.dynacProc.stdin.close()
+            except IOError:
+                pass
+            if hasattr(os, 'waitid'):
+                # Wait without reaping, so that the watchdog can't signal a
+                # recycled process group.
+                os.waitid(os.P_PID, self.dynacProc.pid, os.WEXITED | os.WNOWAIT)
+            watchdog.stop()
+            returncode, rusage = _wait_with_rusage(self.dynacProc)
+        except BaseException:
+            if watchdog is not None:
+                watchdog.stop()
+            _kill_process_group(self.dynacProc)
+            self.dynacProc.wait()
+            if drain is not None:
+                drain.join()
+            raise
+        finally:
+            if slot is not None:
+                pool.release(slot, cwd)
+        self.runStats = _run_stats(time.monotonic() - start, rusage)
+        if getattr(_batch_settings, 'stats', None) is not None:
+            _batch_settings.stats.append(self.runStats)
+        drain.join()
+        self.dynacStdout, self.dynacStderr = drain.stdout, drain.stderr
+        _check_outcome(returncode, watchdog.reason, timeout, cpu_limit, self.runStats)
+        if drain.error is not None:
+            raise drain.error
+
+    async def run_async(self, *, progress=None, timeout=None, cpu_limit=None, cancel=None, cwd=None, pool=None):
+        """
+        Coroutine version of ``run``, taking the same (keyword-only) arguments, and
+        using an ``asyncio`` subprocess so that many Dynac runs can be in flight
+        from a single event loop (see ``run_pynacs_async``).  ``progress`` is called
+        from the event loop (see also ``iter_progress``).  Cancelling the task
+        running this coroutine kills Dynac before the cancellation is propagated.
+
+        ``runStats`` is recorded as by ``run``, but as the event loop, rather than
+        Pynac, reaps the Dynac process, its CPU times and peak memory use are taken
+        from the change in ``resource.getrusage(RUSAGE_CHILDREN)`` over the run.
+        When several runs overlap, they are therefore only upper bounds, as they
+        include any other child processes that ended during the run.
+
+        A run with a ``DynacPool`` is made by ``run`` in the default executor of the
+        event loop, as the processes of the pool are not ``asyncio`` subprocesses.
+        """
+        timeout = self._run_setting('timeout', timeout)
+        cpu_limit = self._run_setting('cpuLimit', cpu_limit)
+        pool = self._run_setting('pool', pool)
+        if cwd is None:
+            cwd = getattr(_batch_settings, 'directory', None)
+        if pool is not None:
+            return await self._run_in_executor(progress, timeout, cpu_limit, cancel, cwd, pool)
+        deck = self.render()
+        before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        start = time.monotonic()
+        self.dynacProc = await _start_process_async(
+            'dynacv6_0', '--pipe',
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+            start_new_session=True,
+            preexec_fn=_cpu_limiter(cpu_limit),
+        )
+        _limit_cpu(self.dynacProc, cpu_limit)
+        reason = None
+        communicate = asyncio.ensure_future(self._communicate_async(deck, cwd, progress, start))
+        watched = [communicate]
+        if cancel is not None:
+            watched.append(asyncio.ensure_future(_wait_for_event_async(cancel)))
+        try:
+            done, _ = await asyncio.wait(watched, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if communicate in done:
+                returncode, errors = communicate.result()
+            else:
+                reason = 'cancelled' if done else 'timeout'
+        except BaseException:
+            communicate.cancel()
+            await asyncio.gather(communicate, return_exceptions=True)
+            await _kill_process_group_async(self.dynacProc)
+            raise
+        finally:
+            for task in watched[1:]:
+                task.cancel()
+            if reason is not None:
+                communicate.cancel()
+                await asyncio.gather(communicate, return_exceptions=True)
+                await _kill_process_group_async(self.dynacProc)
+                returncode, errors = self.dynacProc.returncode, []
+            self.runStats = _run_stats(
+                time.monotonic() - start,
+                resource.getrusage(resource.RUSAGE_CHILDREN),
+                before,
+            )
+        _check_outcome(returncode, reason, timeout, cpu_limit, self.runStats)
+        if errors:
+            raise errors[0]
+
+    async def _run_in_executor(self, progress, timeout, cpu_limit, cancel, cwd, pool):
+        loop = asyncio.get_running_loop()
+        stop = threading.Event()
+        if progress is not None:
+            report = progress
+
+            def progress(event):
+                loop.call_soon_threadsafe(report, event)
+        run = loop.run_in_executor(None, functools.partial(
+            self.run, progress=progress, timeout=timeout, cpu_limit=cpu_limit,
+            cancel=_EitherEvent(cancel, stop), cwd=cwd, pool=pool,
+        ))
+        try:
+            await asyncio.shield(run)
+        except asyncio.CancelledError:
+            # Kill Dynac, and wait for run to have reaped it.
+            stop.set()
+            await asyncio.gather(run, return_exceptions=True)
+            raise
+
+    async def _communicate_async(self, deck, cwd, progress, start):
+        if b'Error' in await self.dynacProc.stdout.readline():
+            raise DynacError('Installed version of Dynac should be upgraded to support the --pipe flag')
+        if self._DEBUG:
+            self.write_deck(os.path.join(cwd or '', 'pynacrun.log'), append=True)
+        self.dynacStdout, self.dynacStderr = [], []
+        drains = asyncio.gather(
+            _drain_stream_async(self.dynacProc.stdout, self.dynacStdout, progress, start,
+                                self._lattice_types(progress)),
+            _drain_stream_async(self.dynacProc.stderr, self.dynacStderr, None, start),
+        )
+        try:
+            try:
+                self.dynacProc.stdin.write(deck)
+                await self.dynacProc.stdin.drain()
+                self.dynacProc.stdin.close()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            returncode = await self.dynacProc.wait()
+        except BaseException:
+            drains.cancel()
+            await asyncio.gather(drains, return_exceptions=True)
+            raise
+        errors = [err for err in await drains if err is not None]
+        return returncode, errors
+
+    def _lattice_types(self, progress):
+        # The Dynac type of each element, against which progress lines are checked.
+        if progress is None:
+            return None
+        return [dynac_from_ele(ele) for ele in self.lattice]
+
+    async def iter_progress(self, cwd=None):
+        """
+        Run the simulation as ``run_async`` does, yielding a
+        ``DataClasses.ProgressEvent`` for every element that Dynac reports starting
+        to process, for use as::
+
+            async for event in pyn.iter_progress():
+                print(event.index, event.dynacType)
+
+        Any exception raised by the run is raised once every event has been yielded.
+        """
+        queue = asyncio.Queue()
+        run = asyncio.ensure_future(self.run_async(cwd=cwd, progress=queue.put_nowait))
+        run.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
                     break
-        self.dynacProc.stdin.close()
-        if self.dynacProc.wait() != 0:
-            raise RuntimeError("Errors occured during execution of Dynac")
+                yield event
+            await run
+        finally:
+            if not run.done():
+                run.cancel()
+
+    def render(self):
+        """
+        Render the Dynac input for this simulation (the name line followed by the
+        whole lattice) into a single bytes object, which is returned and kept in the
+        ``deckBuffer`` attribute.
+        """
+        self.deckBuffer = render_deck(self.name, self.lattice)
+        return self.deckBuffer
+
+    def write_deck(self, filename, append=False):
+        """
+        Write the most recently rendered Dynac input (rendering it first if this
+        hasn't yet been done) to the file ``filename``.  The result is a plain Dynac
+        input file, which can also be loaded with ``Pynac(filename)``.
+        """
+        deck = getattr(self, 'deckBuffer', None)
+        if deck is None:
+            deck = self.render()
+        with open(filename, 'ab' if append else 'wb') as f:
+            f.write(deck)
+
+    @property
+    def lattice(self):
+        """
+        The list of elements to be simulated.  Any plain list assigned to this
+        attribute is converted to a ``Lattice.IndexedLattice``, so that lookups by
+        Dynac type do not have to scan the whole lattice.
+        """
+        return self._lattice
+
+    @lattice.setter
+    def lattice(self, lattice):
+        if isinstance(lattice, list) and not isinstance(lattice, IndexedLattice):
+            lattice = IndexedLattice(lattice)
+        self._lattice = lattice
 
     def get_x_inds(self, *dynac_type):
         """
@@ -112,6 +400,8 @@ class Pynac(object):
         type matches the input string.  Multiple input strings can be given, either
         as a comma-separated list or as a genuine Python list.
         """
+        if isinstance(self.lattice, IndexedLattice):
+            return self.lattice.indices(*dynac_type)
         return [i for i, x in enumerate(self.lattice) for y in dynac_type if dynac_from_ele(x) == y]
 
     def get_x_objs(self, *dynac_type):
@@ -120,6 +410,8 @@ class Pynac(object):
         type matches the input string.  Multiple input strings can be given, either
         as a comma-separated list or as a genuine Python list.
         """
+        if isinstance(self.lattice, IndexedLattice):
+            return [self.lattice[i] for i in self.lattice.indices(*dynac_type)]
         return [i for i in self.lattice for y in dynac_type if dynac_from_ele(i) == y]
 
     def get_plot_inds(self):
@@ -143,16 +435,17 @@ class Pynac(object):
         """
         self.lattice[self.get_x_inds('RDBEAM')[0]][1][0][0] = filename
 
-    def _start_dynac_proc(self, stdin, stdout):
+    def _run_setting(self, name, value):
+        # An explicit argument takes precedence over a setting of the batch being
+        # run by this thread, which takes precedence over the attribute.
+        if value is not None:
+            return value
+        value = getattr(_batch_settings, name, None)
+        return getattr(self, name) if value is None else value
+
+    def _start_dynac_proc(self, stdin, stdout, cpu_limit=None, cwd=None):
         # self.dynacProc = subp.Popen(['dynacv6_0','--pipe'], stdin=stdin, stdout=stdout)
-        self.dynacProc = subp.Popen(
-            ['dynacv6_0', '--pipe'],
-            stdin=stdin,
-            stdout=stdout,
-            stderr=subp.PIPE
-        )
-        if b'Error' in self.dynacProc.stdout.readline():
-            raise RuntimeError('Installed version of Dynac should be upgraded to support the --pipe flag')
+        self.dynacProc = _spawn_dynac(stdin, stdout, cpu_limit, cwd)
 
     def _loop(self, item):
         print(item)
@@ -160,6 +453,21 @@ class Pynac(object):
         for data in item[1]:
             self.dynacProc.stdin.write(data)
 
+    def _lattice_cache(self, cache):
+        if cache is None:
+            cache = getattr(_batch_settings, 'cacheDir', None)
+        if cache is None:
+            if not os.environ.get(CACHE_DIR_ENV):
+                return None
+            cache = True
+        if cache is True:
+            return LatticeCache.for_deck(self.filename)
+        if cache is False:
+            return None
+        if isinstance(cache, LatticeCache):
+            return cache
+        return LatticeCache(cache)
+
     def _parse(self):
         self.lattice = []
         self.name = self.rawData[0]
@@ -216,6 +524,20 @@ class Pynac(object):
         return ('.' in thing) or ('e' in thing) or ('E' in thing)
 
 
+def read_generated_beam(filename='emit.plot'):
+    '''
+    Return the particle coordinates ``x, xp, y, yp, z, zp`` of the beam in the
+    first plot of the ``emit.plot`` file ``filename``, which is the EMITGR plot of
+    the beam generated by ``Builder``, as arrays read straight from the blocks
+    found by a ``Plotting.EmitPlotIndex`` of the file.
+    '''
+    index = pynPlt.EmitPlotIndex(filename)
+    x, xp = index.readPairs(0, 'horizBeam')
+    y, yp = index.readPairs(0, 'vertBeam')
+    z, zp = index.readPairs(0, 'longBeam')
+    return x, xp, y, yp, z, zp
+
+
 class Builder:
     def __init__(self):
         self.inputBeamLattice = None
@@ -387,31 +709,7 @@ class Builder:
         test = Pynac.from_lattice("Zero-length lattice for beam generation", self.inputBeamLattice)
         test.run()
 
-        with open('emit.plot') as f:
-            for i in range(204):
-                f.readline()
-            num_parts = int(f.readline())
-            x, xp = [], []
-            for i in range(num_parts):
-                dat = f.readline().split()
-                x.append(float(dat[0]))
-                xp.append(float(dat[1]))
-            f.readline()
-            for i in range(202):
-                f.readline()
-            y, yp = [], []
-            for i in range(num_parts):
-                dat = f.readline().split()
-                y.append(float(dat[0]))
-                yp.append(float(dat[1]))
-            f.readline()
-            for i in range(203):
-                f.readline()
-            z, zp = [], []
-            for i in range(num_parts):
-                dat = f.readline().split()
-                z.append(float(dat[0]))
-                zp.append(float(dat[1]))
+        x, xp, y, yp, z, zp = read_generated_beam()
 
         data_source = ColumnDataSource(data=dict(x=x, xp=xp, y=y, yp=yp, z=z, zp=zp))
 
@@ -442,31 +740,7 @@ class Builder:
             self.inputBeamLattice[0][1][1][1] = 1000
             zero_length_lattice = Pynac.from_lattice("Zero-length lattice for beam generation", self.inputBeamLattice)
             zero_length_lattice.run()
-            with open('emit.plot') as f:
-                for i in range(204):
-                    f.readline()
-                num_parts = int(f.readline())
-                x, xp = [], []
-                for i in range(num_parts):
-                    dat = f.readline().split()
-                    x.append(float(dat[0]))
-                    xp.append(float(dat[1]))
-                f.readline()
-                for i in range(202):
-                    f.readline()
-                y, yp = [], []
-                for i in range(num_parts):
-                    dat = f.readline().split()
-                    y.append(float(dat[0]))
-                    yp.append(float(dat[1]))
-                f.readline()
-                for i in range(203):
-                    f.readline()
-                z, zp = [], []
-                for i in range(num_parts):
-                    dat = f.readline().split()
-                    z.append(float(dat[0]))
-                    zp.append(float(dat[1]))
+            x, xp, y, yp, z, zp = read_generated_beam()
             data_source.data['x'] = x
             data_source.data['xp'] = xp
             data_source.data['y'] = y
@@ -599,46 +873,44 @@ class Builder:
 
 class PhaseSpace:
     """
-    A representation of the phase space of the simulated bunch read from the
-    ``dynac.short`` file.  Each of the phase space parameters is represented as a
-    ``elements.Parameter`` namedtuple.
+    A representation of the phase space of the simulated bunch at one ``EMIT``
+    card of the ``dynac.short`` file, built from the row ``card`` of the array
+    returned by ``Output.read_emit_cards`` (which is kept as the ``card``
+    attribute).  Each of the phase space parameters is represented as a
+    ``DataClasses.Param`` namedtuple.
 
     This class is intended to be used in interactive explorations of the data
     produced during Pynac simulations.
     """
-    def __init__(self, data_str_matrix):
-        self.dataStrMatrix = data_str_matrix
-        self.xPhaseSpace = self._get_ps_from_line(5)
-        self.yPhaseSpace = self._get_ps_from_line(6)
-        self.zPhaseSpace = self._get_ps_from_line(4)
+    def __init__(self, card):
+        self.card = card
+        self.xPhaseSpace = self._get_transverse_ps('x')
+        self.yPhaseSpace = self._get_transverse_ps('y')
+        self.zPhaseSpace = SingleDimPS(
+            pos=Param(val=float(card['dPhi']), unit='deg'),
+            mom=Param(val=float(card['dW']), unit='keV'),
+            R12=Param(val=float(card['r12Z']), unit='?'),
+            normEmit=Param(val=float(card['emitZ']), unit='keV.ns'),
+            nonNormEmit=Param(val=None, unit=None),
+        )
         self.COG = CentreOfGravity(
-            x=Param(val=float(self.dataStrMatrix[1][0]), unit='mm'),
-            xp=Param(val=float(self.dataStrMatrix[1][1]), unit='mrad'),
-            y=Param(val=float(self.dataStrMatrix[1][2]), unit='mm'),
-            yp=Param(val=float(self.dataStrMatrix[1][3]), unit='mrad'),
-            KE=Param(val=float(self.dataStrMatrix[0][3]), unit='MeV'),
-            TOF=Param(val=float(self.dataStrMatrix[0][4]), unit='deg'),
+            x=Param(val=float(card['x']), unit='mm'),
+            xp=Param(val=float(card['xp']), unit='mrad'),
+            y=Param(val=float(card['y']), unit='mm'),
+            yp=Param(val=float(card['yp']), unit='mrad'),
+            KE=Param(val=float(card['KE']), unit='MeV'),
+            TOF=Param(val=float(card['TOF']), unit='deg'),
+        )
+        self.particlesLeft = Param(val=float(card['particlesLeft']), unit='num')
+
+    def _get_transverse_ps(self, plane):
+        return SingleDimPS(
+            pos=Param(val=float(self.card[plane + 'Size']), unit='mm'),
+            mom=Param(val=float(self.card[plane + 'pSize']), unit='mrad'),
+            R12=Param(val=float(self.card['r12' + plane.upper()]), unit='?'),
+            normEmit=Param(val=float(self.card['normEmit' + plane.upper()]), unit='mm.mrad'),
+            nonNormEmit=Param(val=float(self.card['nonNormEmit' + plane.upper()]), unit='mm.mrad'),
         )
-        self.particlesLeft = Param(val=float(self.dataStrMatrix[4][5]), unit='num')
-
-    def _get_ps_from_line(self, num):
-        try:
-            test = float(self.dataStrMatrix[num][6])
-            return SingleDimPS(
-                pos=Param(val=float(self.dataStrMatrix[num][0]), unit='mm'),
-                mom=Param(val=float(self.dataStrMatrix[num][1]), unit='mrad'),
-                R12=Param(val=float(self.dataStrMatrix[num][2]), unit='?'),
-                normEmit=Param(val=float(self.dataStrMatrix[num][3]), unit='mm.mrad'),
-                nonNormEmit=Param(val=float(self.dataStrMatrix[num][6]), unit='mm.mrad'),
-            )
-        except IndexError:
-            return SingleDimPS(
-                mom=Param(val=float(self.dataStrMatrix[num][1]), unit='keV'),
-                pos=Param(val=float(self.dataStrMatrix[num][0]), unit='deg'),
-                R12=Param(val=float(self.dataStrMatrix[num][2]), unit='?'),
-                normEmit=Param(val=float(self.dataStrMatrix[num][3]), unit='keV.ns'),
-                nonNormEmit=Param(val=None, unit=None),
-            )
 
     def __repr__(self):
         repr_str = 'COG: ' + self.COG.__repr__()
@@ -649,29 +921,487 @@ class PhaseSpace:
         return repr_str
 
 
-def make_phase_space_list():
+class PhaseSpaceList(Sequence):
+    """
+    A read-only list of the ``PhaseSpace`` of each row of ``cards`` (an array as
+    returned by ``Output.read_emit_cards``, kept as the ``cards`` attribute), in
+    which each ``PhaseSpace`` is only built when it is first asked for.
+    """
+    def __init__(self, cards):
+        self.cards = cards
+        self._phaseSpaces = {}
+
+    def __len__(self):
+        return len(self.cards)
+
+    def __getitem__(self, ind):
+        if isinstance(ind, slice):
+            return [self[i] for i in range(*ind.indices(len(self)))]
+        if ind < 0:
+            ind += len(self)
+        if not 0 <= ind < len(self):
+            raise IndexError('PhaseSpaceList index out of range')
+        if ind not in self._phaseSpaces:
+            self._phaseSpaces[ind] = PhaseSpace(self.cards[ind])
+        return self._phaseSpaces[ind]
+
+    def __repr__(self):
+        return 'PhaseSpaceList(%d EMIT cards)' % len(self)
+
+
+def make_phase_space_list(directory=None):
     """
     Extract all the phase space information (due to ``EMIT`` commands in the input
     file), and create a list of PhaseSpace objects.  The primary purpose of this
     is for interactive explorations of the data produced during Pynac simulations.
+
+    The ``dynac.short`` file is read from ``directory`` (by default, the directory
+    of the current iteration of a batch run with the thread backend, or otherwise
+    the current directory) by ``Output.read_emit_cards``, and the list is a ``PhaseSpaceList``,
+    so a ``PhaseSpace`` is only built for the cards that are looked at.  Where only
+    a few numbers are needed from each card, using the array in the ``cards``
+    attribute directly (e.g., ``cards['normEmitX']``) is much faster.
     """
-    with open('dynac.short') as f:
-        data_str = ''.join(line for line in f.readlines())
-        data_str_array = data_str.split('beam (emit card)')[1:]
-        data_str_matrix = [[j.strip().split() for j in i] for i in[chunk.split('\n')[1:8] for chunk in data_str_array]]
+    return PhaseSpaceList(read_emit_cards(directory))
 
-        return [PhaseSpace(data) for data in data_str_matrix]
+
+def get_number_of_particles(directory=None):
+    """
+    Queries the ``dynac.short`` file in ``directory`` (by default, the directory of
+    the current iteration of a batch run with the thread backend, or otherwise the
+    current directory) for the number of particles used in the simulation.
+    """
+    with open(os.path.join(_default_directory(directory), 'dynac.short')) as f:
+        for line in f:
+            if 'Simulation with' in line:
+                return int(line.split('Simulation with')[1].split()[0])
+    raise ValueError('No number of particles found in dynac.short')
 
 
-def get_number_of_particles():
+class DynacError(RuntimeError):
     """
-    Queries the ``dynac.short`` file for the number of particles used in the
-    simulation.
+    Raised when a Dynac run fails.
     """
-    with open('dynac.short') as f:
-        data_str = ''.join(line for line in f.readlines())
-        num_of_parts = int(data_str.split('Simulation with')[1].strip().split()[0])
-    return num_of_parts
+
+
+class DynacTimeoutError(DynacError):
+    """
+    Raised when a Dynac run is killed for exceeding its wall-clock or CPU time
+    limit.
+    """
+
+
+class DynacCancelledError(DynacError):
+    """
+    Raised when a Dynac run is killed because it was cancelled.
+    """
+
+
+def _check_outcome(returncode, reason, timeout, cpu_limit, stats=None):
+    if reason == 'timeout':
+        raise DynacTimeoutError('Dynac did not finish within %g s' % timeout)
+    if reason == 'cancelled':
+        raise DynacCancelledError('Dynac run was cancelled')
+    if cpu_limit is not None and returncode == -signal.SIGXCPU:
+        raise DynacTimeoutError('Dynac exceeded its CPU time limit of %g s' % cpu_limit)
+    # SIGKILL is sent at the hard CPU limit, but may also come from elsewhere (e.g.,
+    # the OOM killer), so it is only put down to the limit if the CPU time used
+    # (from ``stats``) reached it.
+    if cpu_limit is not None and returncode == -signal.SIGKILL and stats is not None and stats.user is not None:
+        if stats.user + stats.sys >= cpu_limit:
+            raise DynacTimeoutError('Dynac exceeded its CPU time limit of %g s' % cpu_limit)
+    if returncode != 0:
+        raise DynacError("Errors occured during execution of Dynac")
+
+
+def _spawn_dynac(stdin, stdout, cpu_limit=None, cwd=None):
+    """
+    Start Dynac in pipe mode, in a new session, and return its process once it has
+    answered the handshake.
+    """
+    proc = subp.Popen(
+        ['dynacv6_0', '--pipe'],
+        stdin=stdin,
+        stdout=stdout,
+        stderr=subp.PIPE,
+        cwd=cwd,
+        start_new_session=True,
+        preexec_fn=_cpu_limiter(cpu_limit),
+    )
+    _limit_cpu(proc, cpu_limit)
+    if b'Error' in proc.stdout.readline():
+        _kill_process_group(proc)
+        proc.wait()
+        raise DynacError('Installed version of Dynac should be upgraded to support the --pipe flag')
+    return proc
+
+
+class DynacPool(object):
+    """
+    A pool of ``size`` Dynac processes, started ahead of time, which have answered
+    the handshake and are waiting for a deck on stdin, each in a directory (or
+    slot) of its own, created in ``root`` (by default, the temporary directory).
+    Giving a pool to ``Pynac.run`` (or setting it as ``Pynac.pool``) then takes
+    starting Dynac out of the time of each run, which dominates the runs of short
+    lattices.  Each process is used for a single run, and a background thread
+    starts a replacement as soon as one is taken.
+
+    As a waiting process can't change directory, the inputs of a run are linked
+    into the slot before the deck is sent, and the files written by Dynac are
+    moved back to the directory of the run once it has finished (which is a rename
+    if ``root`` is on the same filesystem).  The inputs are the files listed in
+    ``file_list`` (relative to the directory of the run) if this is given, and
+    otherwise every entry of the directory other than the outputs of a previous
+    run (``dynac.short``, ``dynac.print``, ``dynac.dmp`` and ``emit.plot``, and
+    the caches of their readers), which Dynac would otherwise write through the
+    links.  Giving ``file_list`` avoids linking a directory that holds many other
+    files for every run.
+
+    The processes still waiting are killed by ``close``, or on leaving the
+    context if a ``DynacPool`` is used as a context manager.
+    """
+    def __init__(self, size=2, root=None, file_list=None):
+        self.size = size
+        self.root = root
+        self.fileList = file_list
+        self._ready = queue.Queue()
+        self._free = threading.Semaphore(size)
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._refill)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _refill(self):
+        while True:
+            self._free.acquire()
+            if self._closed.is_set():
+                return
+            slot = tempfile.mkdtemp(prefix='dynacSlot_', dir=self.root)
+            try:
+                self._ready.put((_spawn_dynac(subp.PIPE, subp.PIPE, cwd=slot), slot))
+            except Exception as exc:
+                # Raised by the next acquire, after which another start is tried.
+                shutil.rmtree(slot, ignore_errors=True)
+                self._ready.put((None, exc))
+
+    def acquire(self, cwd=None, cpu_limit=None):
+        """
+        Wait for a ready Dynac process, link the inputs in the directory ``cwd``
+        (by default, the current directory) into its slot, limit its CPU time to
+        ``cpu_limit`` seconds (if given), and return the process and its slot.  The
+        slot must be handed back to ``release`` once the process has finished.
+        """
+        while True:
+            if self._closed.is_set():
+                raise RuntimeError('The DynacPool is closed')
+            proc, slot = self._ready.get()
+            self._free.release()
+            if proc is None and slot is None:
+                # Put by close, and passed on to any other waiting thread.
+                self._ready.put((None, None))
+                raise RuntimeError('The DynacPool is closed')
+            if proc is None:
+                raise slot
+            if proc.poll() is None:
+                break
+            # Died while waiting (e.g., killed from outside), so take another.
+            proc.wait()
+            shutil.rmtree(slot, ignore_errors=True)
+        try:
+            cwd = os.path.abspath(cwd or '.')
+            if self.fileList is not None:
+                inputs = self.fileList
+            else:
+                inputs = [entry for entry in os.listdir(cwd) if entry not in _DYNAC_OUTPUTS]
+            for f in inputs:
+                os.symlink(os.path.join(cwd, f), os.path.join(slot, os.path.basename(f)))
+            _limit_cpu(proc, cpu_limit)
+        except BaseException:
+            _kill_process_group(proc)
+            proc.wait()
+            shutil.rmtree(slot, ignore_errors=True)
+            raise
+        return proc, slot
+
+    def release(self, slot, cwd=None):
+        """
+        Move the files written by Dynac in ``slot`` to the directory ``cwd`` (by
+        default, the current directory), and remove the slot.
+        """
+        cwd = os.path.abspath(cwd or '.')
+        for entry in os.listdir(slot):
+            path = os.path.join(slot, entry)
+            if not os.path.islink(path):
+                shutil.move(path, os.path.join(cwd, entry))
+        shutil.rmtree(slot, ignore_errors=True)
+
+    def close(self):
+        """
+        Stop refilling the pool, and kill the processes that are still waiting.  Any
+        thread waiting in ``acquire`` then raises ``RuntimeError``.
+        """
+        self._closed.set()
+        self._free.release()
+        self._thread.join()
+        while True:
+            try:
+                proc, slot = self._ready.get_nowait()
+            except queue.Empty:
+                break
+            if proc is not None:
+                _kill_process_group(proc)
+                proc.wait()
+                shutil.rmtree(slot, ignore_errors=True)
+        self._ready.put((None, None))
+
+
+def _cpu_rlimit(cpu_limit):
+    # The process is sent SIGXCPU at the soft limit, and SIGKILL a second later.
+    soft = max(1, int(math.ceil(cpu_limit)))
+    return soft, soft + 1
+
+
+def _cpu_limiter(cpu_limit):
+    """
+    Return a ``preexec_fn`` that limits the CPU time of the new process to
+    ``cpu_limit`` seconds, or ``None`` if there is no limit or if the limit can be
+    applied by ``_limit_cpu`` instead.  A ``preexec_fn`` is not safe to use when the
+    calling process has several threads, so it is only a fallback for platforms
+    without ``resource.prlimit``.
+    """
+    if cpu_limit is None or hasattr(resource, 'prlimit'):
+        return None
+
+    def limit_cpu():
+        resource.setrlimit(resource.RLIMIT_CPU, _cpu_rlimit(cpu_limit))
+    return limit_cpu
+
+
+def _limit_cpu(proc, cpu_limit):
+    if cpu_limit is not None and hasattr(resource, 'prlimit'):
+        try:
+            resource.prlimit(proc.pid, resource.RLIMIT_CPU, _cpu_rlimit(cpu_limit))
+        except ProcessLookupError:
+            pass
+
+
+def _kill_process_group(proc):
+    # Dynac is started in a new session, so its process group contains it and
+    # anything it has started.
+    if proc.returncode is not None:
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def _kill_process_group_async(proc):
+    _kill_process_group(proc)
+    await proc.wait()
+
+
+async def _start_process_async(*args, **kwargs):
+    """
+    Like ``asyncio.create_subprocess_exec``, except that if the caller is cancelled
+    while the process is being started, the process is killed once it has started,
+    rather than being left running.
+    """
+    starting = asyncio.ensure_future(asyncio.create_subprocess_exec(*args, **kwargs))
+    try:
+        return await asyncio.shield(starting)
+    except asyncio.CancelledError:
+        await asyncio.wait([starting])
+        if not starting.cancelled() and starting.exception() is None:
+            await _kill_process_group_async(starting.result())
+        raise
+
+
+class _Watchdog(object):
+    """
+    Kill the process group of ``proc`` if it is still running after ``timeout``
+    seconds, or once the ``threading.Event`` ``cancel`` is set.  The cause is then
+    given by the ``reason`` attribute (``'timeout'`` or ``'cancelled'``).
+    """
+    _POLL_INTERVAL = 0.05
+
+    def __init__(self, proc, timeout=None, cancel=None):
+        self.reason = None
+        self._proc = proc
+        self._timeout = timeout
+        self._cancel = cancel
+        self._stopped = threading.Event()
+        self._thread = None
+        if timeout is not None or cancel is not None:
+            self._thread = threading.Thread(target=self._watch)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _watch(self):
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        while True:
+            if self._cancel is not None and self._cancel.is_set():
+                reason = 'cancelled'
+                break
+            wait = None
+            if deadline is not None:
+                wait = deadline - time.monotonic()
+                if wait <= 0:
+                    reason = 'timeout'
+                    break
+            if self._cancel is not None:
+                wait = self._POLL_INTERVAL if wait is None else min(wait, self._POLL_INTERVAL)
+            if self._stopped.wait(wait):
+                return
+        if not self._stopped.is_set():
+            self.reason = reason
+            _kill_process_group(self._proc)
+
+    def stop(self):
+        """
+        Stop watching.  This must be called before the process is reaped.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class _EitherEvent(object):
+    # The part of threading.Event used by _Watchdog, which is set once any of the
+    # given events (ignoring None) is set.
+    def __init__(self, *events):
+        self._events = [event for event in events if event is not None]
+
+    def is_set(self):
+        return any(event.is_set() for event in self._events)
+
+
+async def _wait_for_event_async(event):
+    # Wait, from the event loop, for the threading.Event event to be set.
+    while not event.is_set():
+        await asyncio.sleep(_Watchdog._POLL_INTERVAL)
+
+
+def _wait_with_rusage(proc):
+    """
+    Wait for ``proc`` to finish, and return its return code, along with its
+    resource usage (or ``None`` where ``os.wait4`` is unavailable).
+    """
+    if not hasattr(os, 'wait4'):
+        return proc.wait(), None
+    _, status, rusage = os.wait4(proc.pid, 0)
+    if os.WIFSIGNALED(status):
+        proc.returncode = -os.WTERMSIG(status)
+    else:
+        proc.returncode = os.WEXITSTATUS(status)
+    return proc.returncode, rusage
+
+
+def _run_stats(wall, rusage, before=None):
+    if rusage is None:
+        return RunStats(wall, None, None, None)
+    if before is None:
+        return RunStats(wall, rusage.ru_utime, rusage.ru_stime, rusage.ru_maxrss * _RSS_SCALE)
+    return RunStats(
+        wall,
+        rusage.ru_utime - before.ru_utime,
+        rusage.ru_stime - before.ru_stime,
+        rusage.ru_maxrss * _RSS_SCALE,
+    )
+
+
+def total_run_stats(stats):
+    """
+    Combine a sequence of ``DataClasses.RunStats`` (e.g., those collected by
+    ``multi_process_pynac``) into a single ``RunStats`` holding the total wall-clock
+    and CPU times, and the largest peak memory use.  ``None`` entries (i.e., failed
+    iterations) are skipped.
+    """
+    stats = [s for s in stats if s is not None]
+    return RunStats(
+        sum((s.wall for s in stats), 0.0),
+        sum(s.user or 0.0 for s in stats),
+        sum(s.sys or 0.0 for s in stats),
+        max([s.maxRSS or 0 for s in stats] or [0]),
+    )
+
+
+def _progress_event(line, start, types):
+    match = _PROGRESS_LINE.match(line)
+    if match is None:
+        return None
+    index, dynac_type = int(match.group(1)), match.group(2)
+    if not 1 <= index <= len(types) or types[index - 1] != dynac_type:
+        return None
+    return ProgressEvent(index, dynac_type, time.monotonic() - start)
+
+
+class _OutputDrain(object):
+    """
+    Continuously read the stdout and stderr of a Dynac process on background
+    threads, collecting the decoded lines in the ``stdout`` and ``stderr``
+    attributes, and passing a ``ProgressEvent`` for each progress line of stdout
+    (checked against the Dynac types of the lattice, ``types``) to the
+    ``progress`` callable, if one is given.
+    """
+    def __init__(self, proc, progress=None, types=None):
+        self.stdout = []
+        self.stderr = []
+        self.error = None
+        self._start = time.monotonic()
+        self._threads = [
+            threading.Thread(target=self._drain, args=(proc.stdout, self.stdout, progress, types)),
+            threading.Thread(target=self._drain, args=(proc.stderr, self.stderr, None, None)),
+        ]
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def _drain(self, stream, lines, progress, types):
+        for raw in iter(stream.readline, b''):
+            line = raw.decode(errors='replace').rstrip()
+            lines.append(line)
+            if progress is not None:
+                event = _progress_event(line, self._start, types)
+                if event is None:
+                    continue
+                try:
+                    progress(event)
+                except Exception as exc:
+                    # Keep draining, so that Dynac isn't blocked, and report the
+                    # error once it has finished.
+                    self.error = exc
+                    progress = None
+        stream.close()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+
+async def _drain_stream_async(stream, lines, progress, start, types=None):
+    error = None
+    while True:
+        raw = await stream.readline()
+        if not raw:
+            return error
+        line = raw.decode(errors='replace').rstrip()
+        lines.append(line)
+        if progress is not None:
+            event = _progress_event(line, start, types)
+            if event is None:
+                continue
+            try:
+                progress(event)
+            except Exception as exc:
+                error = exc
+                progress = None
 
 
 def dynac_from_ele(ele):
@@ -691,36 +1421,548 @@ def ele_from_pynac(pynac_repr):
     return obj
 
 
-def multi_process_pynac(file_list, pynac_func, num_iters=100, max_workers=8):
+def multi_process_pynac(file_list, pynac_func, num_iters=100, max_workers=8, cache_dir=None, stats=None,
+                        timeout=None, cpu_limit=None, reuse_dirs=False, backend='process', callback=None,
+                        max_pending=None):
     """
     Use a ProcessPool from the ``concurrent.futures`` module to execute ``num_iters``
     number of instances of ``pynac_func``.  This function takes advantage of ``do_single_dynac_process``
     and ``pynac_in_sub_directory``.
+
+    If ``cache_dir`` is given, every worker shares the ``Cache.LatticeCache`` in that
+    directory, so that the input file loaded by ``pynac_func`` is parsed once for the
+    whole batch, rather than once per iteration.
+
+    If a list is given as ``stats``, it is extended with the ``DataClasses.RunStats``
+    of each iteration (as returned by ``do_single_dynac_process``, and ``None`` for
+    iterations that failed), in iteration order.  ``total_run_stats`` sums these
+    over the batch.
+
+    ``timeout`` and ``cpu_limit`` become the default limits of every ``Pynac.run``
+    made by ``pynac_func`` (see ``Pynac.timeout`` and ``Pynac.cpuLimit``), so that a
+    hung run is killed, and appears in the returned list as a
+    ``DynacTimeoutError``, rather than stalling its worker, while the rest of the
+    batch carries on.
+
+    By default, every iteration is run in a freshly created ``dynacProc_NNNN``
+    directory (see ``pynac_in_sub_directory``), into which ``file_list`` is copied.
+    If ``reuse_dirs`` is true, each worker process instead copies ``file_list`` once
+    into its own ``dynacWorker_PID`` directory, and runs all of its iterations there,
+    deleting only the outputs of the previous iteration (i.e., everything other
+    than the staged inputs) before each one.  This avoids creating a directory and
+    copying every input file for each iteration, but leaves only the outputs of the
+    last iteration of each worker on disk, so ``pynac_func`` should itself save
+    anything it needs.
+
+    If ``backend`` is ``'thread'``, the iterations are instead run in a ThreadPool in
+    the calling process (see ``map_pynac``), each in its own ``dynacProc_NNNN``
+    directory, without changing the working directory of the process, so
+    ``pynac_func`` needn't be picklable.  ``reuse_dirs`` is then ignored.  Any
+    ``backend`` other than ``'process'`` or ``'thread'`` raises ``ValueError``.
+
+    No more than ``max_pending`` iterations (by default, twice ``max_workers``) are
+    submitted to the pool at a time, with more being submitted as others complete,
+    so that memory use doesn't grow with ``num_iters``.  If a callable is given as
+    ``callback``, it is called with a ``DataClasses.IterationResult`` (with a
+    ``result`` of ``None``) as each iteration completes, so the progress of a large
+    batch can be followed before it has finished.
     """
-    with ProcessPoolExecutor(max_workers=max_workers) as executor:
-        tasks = [executor.submit(do_single_dynac_process, num, file_list, pynac_func) for num in range(num_iters)]
-    exc = [task.exception() for task in tasks if task.exception()]
+    if backend not in ('thread', 'process'):
+        raise ValueError('Unknown backend: %r' % (backend,))
+    if cache_dir is not None:
+        cache_dir = os.path.abspath(cache_dir)
+    if backend == 'thread':
+        pool = ThreadPoolExecutor(max_workers=max_workers)
+    elif reuse_dirs:
+        pool = ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=init_worker_directory,
+            initargs=(file_list, cache_dir, timeout, cpu_limit),
+        )
+    else:
+        pool = ProcessPoolExecutor(max_workers=max_workers)
+    settings = {'cacheDir': cache_dir, 'timeout': timeout, 'cpuLimit': cpu_limit}
+
+    def submit(num, _):
+        if backend == 'thread':
+            return executor.submit(do_threaded_single_dynac_process, num, file_list, pynac_func, settings)
+        elif reuse_dirs:
+            return executor.submit(do_dynac_process_in_worker_directory, num, pynac_func)
+        else:
+            return executor.submit(do_single_dynac_process, num, file_list, pynac_func, cache_dir,
+                                   timeout, cpu_limit)
+
+    errors = {}
+    run_stats = [None] * num_iters if stats is not None else None
+    with pool as executor:
+        for num, future in bounded_completions(submit, range(num_iters), max_pending or 2 * max_workers):
+            if future.exception() is not None:
+                errors[num] = future.exception()
+                iteration = IterationResult(num, None, errors[num], None)
+            else:
+                iteration = IterationResult(num, None, None, future.result())
+            if run_stats is not None:
+                run_stats[num] = iteration.stats
+            if callback is not None:
+                callback(iteration)
+    if stats is not None:
+        stats.extend(run_stats)
+    exc = [errors[num] for num in sorted(errors)]
     if exc:
         return exc
     else:
         return "No errors encountered"
 
 
-def do_single_dynac_process(num, filelist, pynac_func):
+def bounded_completions(submit, items, max_pending):
+    """
+    Call ``submit(index, item)``, which should return a ``concurrent.futures``
+    future, for each item of ``items``, while keeping no more than ``max_pending``
+    of the futures pending.  ``items`` is consumed lazily, with the next item being
+    submitted as soon as a pending one completes.
+
+    This is a generator, yielding an ``(index, future)`` pair for each item as its
+    future completes.  Any futures still pending when the generator is closed are
+    cancelled.
+    """
+    items = enumerate(items)
+    pending = {}
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < max_pending:
+                try:
+                    index, item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[submit(index, item)] = index
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def do_single_dynac_process(num, filelist, pynac_func, cache_dir=None, timeout=None, cpu_limit=None):
     """
     Execute ``pynac_func`` in the ``pynac_in_sub_directory`` context manager.  See the
     docstring for that context manager to understand the meaning of the ``num`` and
-    ``filelist`` inputs.
+    ``filelist`` inputs.  If ``cache_dir`` is given, it becomes the default lattice
+    cache directory of this process (see ``Cache.CACHE_DIR_ENV``), and if
+    ``timeout`` or ``cpu_limit`` are given, they become the default limits of
+    ``Pynac.run`` in this process.
+
+    Returns a ``DataClasses.RunStats`` of the resources used by the Dynac runs made
+    by ``pynac_func``, taken from the change in
+    ``resource.getrusage(RUSAGE_CHILDREN)``.  The CPU times are exact, but as this is
+    the peak over every child process of the calling process so far, ``maxRSS`` is
+    an upper bound.
 
     The primary purpose of this function is to enable multiprocess use of Pynac via
     the ``multi_process_pynac`` function.
     """
+    init_worker(cache_dir, timeout, cpu_limit)
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.monotonic()
     with pynac_in_sub_directory(num, filelist):
         pynac_func()
+    return _run_stats(time.monotonic() - start, resource.getrusage(resource.RUSAGE_CHILDREN), before)
+
+
+_worker_home = None
+_worker_dir = None
+_worker_inputs = frozenset()
+
+
+def init_worker(cache_dir=None, timeout=None, cpu_limit=None):
+    """
+    Initialise a worker process of a batch: if given, ``cache_dir`` becomes the
+    default lattice cache directory of the process (see ``Cache.CACHE_DIR_ENV``),
+    and ``timeout`` and ``cpu_limit`` become the default limits of ``Pynac.run``.
+    """
+    if cache_dir is not None:
+        os.environ[CACHE_DIR_ENV] = cache_dir
+    if timeout is not None:
+        Pynac.timeout = timeout
+    if cpu_limit is not None:
+        Pynac.cpuLimit = cpu_limit
+
+
+def init_worker_directory(file_list, cache_dir=None, timeout=None, cpu_limit=None, root=None, stage='copy'):
+    """
+    Initialise a worker process of ``multi_process_pynac`` when ``reuse_dirs`` is
+    set: create its ``dynacWorker_PID`` scratch directory in ``root`` (by default,
+    the current directory) and stage the files in ``file_list`` into it (see
+    ``stage_files``), once for the lifetime of the worker.  The other arguments are
+    passed on to ``init_worker``.
+    """
+    global _worker_home, _worker_dir, _worker_inputs
+    init_worker(cache_dir, timeout, cpu_limit)
+    _worker_home = os.getcwd()
+    _worker_dir = os.path.join(root or _worker_home, 'dynacWorker_%d' % os.getpid())
+    if os.path.isdir(_worker_dir):
+        shutil.rmtree(_worker_dir)
+    os.mkdir(_worker_dir)
+    stage_files(file_list, _worker_dir, stage)
+    _worker_inputs = frozenset(os.listdir(_worker_dir))
+
+
+def clear_worker_outputs():
+    """
+    Delete everything in the scratch directory of this worker process other than
+    the inputs staged by ``init_worker_directory``.
+    """
+    for entry in os.listdir(_worker_dir):
+        if entry in _worker_inputs:
+            continue
+        path = os.path.join(_worker_dir, entry)
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+
+@contextmanager
+def pynac_in_worker_directory():
+    """
+    A context manager to clear the outputs of the previous iteration from the
+    scratch directory of this worker process (see ``init_worker_directory``), and
+    change to that directory.  The closing action is to change back to the original
+    directory.
+    """
+    clear_worker_outputs()
+    os.chdir(_worker_dir)
+    try:
+        yield
+    finally:
+        os.chdir(_worker_home)
+
+
+def do_dynac_process_in_worker_directory(num, pynac_func):
+    """
+    Execute ``pynac_func`` in the ``pynac_in_worker_directory`` context manager.
+    Returns a ``DataClasses.RunStats``, as does ``do_single_dynac_process``.
+
+    The primary purpose of this function is to enable multiprocess use of Pynac via
+    the ``multi_process_pynac`` function.
+    """
+    print('Running %d' % num)
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.monotonic()
+    with pynac_in_worker_directory():
+        pynac_func()
+    return _run_stats(time.monotonic() - start, resource.getrusage(resource.RUSAGE_CHILDREN), before)
+
+
+def map_pynac(pynac_func, items, extractor=None, file_list=(), max_workers=8, keep_outputs=False,
+              cache_dir=None, timeout=None, cpu_limit=None, backend='process', stage='symlink',
+              max_pending=None):
+    """
+    A parallel map of ``pynac_func`` over ``items``, that hands the results of the
+    simulations back to the caller, rather than leaving them on disk.
+
+    For each item, ``pynac_func(item)`` is called, and is expected to build and run
+    a simulation.  Then ``extractor(directory)`` (e.g., ``make_phase_space_list``)
+    is called with the directory of that simulation to extract the results, which
+    are handed back to the caller.  If no ``extractor`` is given, the value returned
+    by ``pynac_func`` is handed back instead.
+
+    This is a generator, yielding a ``DataClasses.IterationResult`` for each item in
+    the order in which they complete, so results can be used as soon as they are
+    available.  A failed iteration is yielded with its exception, rather than
+    stopping the map.  ``items`` is consumed lazily, with no more than
+    ``max_pending`` items (by default, twice ``max_workers``) in flight at a time,
+    so neither the items nor the results of the whole map are held in memory at
+    once (see ``bounded_completions``).
+
+    ``backend`` selects how the iterations are run concurrently, with up to
+    ``max_workers`` at a time:
+
+    * ``'process'``: in a ProcessPool from the ``concurrent.futures`` module, so
+      ``pynac_func``, ``extractor`` and the results have to be picklable.  Each
+      worker runs all of its simulations in one scratch directory (see
+      ``init_worker_directory``), which is cleared after each simulation and
+      removed once the map is complete.
+    * ``'thread'``: in a ThreadPool in the calling process.  As Dynac runs in its
+      own process, the GIL doesn't limit this, and nothing has to be pickled, or
+      imported again in worker processes.  Each simulation is run in a directory
+      of its own (see ``run_directory``), created in a memory-backed filesystem and
+      removed once the results have been extracted.  ``Pynac.run`` uses this
+      directory by default, so ``pynac_func`` should not change directory, and
+      should not give another.
+
+    The files in ``file_list`` are staged into the simulation directories as set by
+    ``stage`` (see ``stage_files``).  If ``keep_outputs`` is true, each simulation
+    is instead run in its own ``dynacProc_NNNN`` directory (``NNNN`` being the
+    position of the item in ``items``), which is left in place.  ``cache_dir``,
+    ``timeout`` and ``cpu_limit`` are as for ``multi_process_pynac``.
+    """
+    if cache_dir is not None:
+        cache_dir = os.path.abspath(cache_dir)
+    scratch_root = None
+    if backend == 'thread':
+        pool = ThreadPoolExecutor(max_workers=max_workers)
+        settings = {'cacheDir': cache_dir, 'timeout': timeout, 'cpuLimit': cpu_limit}
+
+        def submit(index, item):
+            return executor.submit(do_threaded_dynac_process, index, item, pynac_func, extractor,
+                                   file_list, stage, keep_outputs, settings)
+    elif backend == 'process':
+        if keep_outputs:
+            pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=init_worker,
+                initargs=(cache_dir, timeout, cpu_limit),
+            )
+        else:
+            scratch_root = tempfile.mkdtemp(prefix='dynacMap_', dir='.')
+            pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=init_worker_directory,
+                initargs=(file_list, cache_dir, timeout, cpu_limit, os.path.abspath(scratch_root), stage),
+            )
+
+        def submit(index, item):
+            return executor.submit(do_mapped_dynac_process, index, item, pynac_func, extractor,
+                                   file_list if keep_outputs else None, stage)
+    else:
+        raise ValueError('Unknown backend: %r' % (backend,))
+    try:
+        with pool as executor:
+            for index, future in bounded_completions(submit, items, max_pending or 2 * max_workers):
+                if future.exception() is not None:
+                    yield IterationResult(index, None, future.exception(), None)
+                else:
+                    result, stats = future.result()
+                    yield IterationResult(index, result, None, stats)
+    finally:
+        if scratch_root is not None:
+            shutil.rmtree(scratch_root, ignore_errors=True)
+
+
+def do_mapped_dynac_process(index, item, pynac_func, extractor=None, file_list=None, stage='copy'):
+    """
+    Execute ``pynac_func(item)``, followed by ``extractor(directory)``, and return a
+    tuple of the extracted result and a ``DataClasses.RunStats`` (see
+    ``do_single_dynac_process``).  If ``file_list`` is ``None``, this is done in the
+    ``pynac_in_worker_directory`` context manager, and the outputs are then
+    deleted, or otherwise in the ``pynac_in_sub_directory`` context manager, with
+    ``file_list`` staged as set by ``stage``.
+
+    The primary purpose of this function is to enable the ``map_pynac`` function.
+    """
+    if file_list is None:
+        context = pynac_in_worker_directory()
+    else:
+        context = pynac_in_sub_directory(index, file_list, stage)
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.monotonic()
+    with context:
+        result = pynac_func(item)
+        stats = _run_stats(time.monotonic() - start, resource.getrusage(resource.RUSAGE_CHILDREN), before)
+        if extractor is not None:
+            result = extractor(os.getcwd())
+    if file_list is None:
+        clear_worker_outputs()
+    return result, stats
+
+
+@contextmanager
+def _batch_context(directory, settings):
+    _batch_settings.__dict__.update(settings, directory=directory, stats=[])
+    try:
+        yield _batch_settings.stats
+    finally:
+        _batch_settings.__dict__.clear()
+
+
+def do_threaded_dynac_process(index, item, pynac_func, extractor, file_list, stage='symlink',
+                              keep_outputs=False, settings=None):
+    """
+    Execute ``pynac_func(item)``, followed by ``extractor(directory)``, in a
+    directory of their own, without changing the working directory of the process,
+    and return a tuple of the extracted result and the total ``DataClasses.RunStats``
+    of the simulations run by ``pynac_func``.  The directory is created by
+    ``make_run_directory`` if ``keep_outputs`` is true, or by ``run_directory`` in a
+    memory-backed filesystem otherwise.  ``settings`` holds the defaults of
+    ``Pynac.run`` (``timeout`` and ``cpuLimit``) and of the lattice cache
+    (``cacheDir``) for the duration of the call.
+
+    The primary purpose of this function is to enable the thread backend of
+    ``map_pynac`` and ``multi_process_pynac``.
+    """
+    if keep_outputs:
+        context = _existing_directory(make_run_directory(index, file_list, stage))
+    else:
+        context = run_directory(file_list, stage, tmpfs=True)
+    with context as directory:
+        with _batch_context(os.path.abspath(directory), settings or {}) as stats:
+            result = pynac_func(item)
+        if extractor is not None:
+            result = extractor(directory)
+    return result, total_run_stats(stats)
+
+
+def do_threaded_single_dynac_process(num, file_list, pynac_func, settings=None):
+    """
+    The thread backend equivalent of ``do_single_dynac_process``: execute
+    ``pynac_func`` with the ``dynacProc_NNNN`` directory as the default directory of
+    ``Pynac.run`` (see ``do_threaded_dynac_process``), and return the total
+    ``DataClasses.RunStats`` of the simulations it ran.
+    """
+    return do_threaded_dynac_process(num, None, lambda _: pynac_func(), None, file_list, 'copy', True,
+                                     settings)[1]
+
+
+@contextmanager
+def _existing_directory(directory):
+    yield directory
+
+
+async def run_pynacs_async(jobs, max_concurrent=None, timeout=None, cpu_limit=None):
+    """
+    Run many simulations concurrently from a single event loop, using
+    ``Pynac.run_async``.  ``jobs`` is an iterable of ``(pynac, cwd)`` pairs, each
+    ``cwd`` being the directory in which that simulation is run, and it is consumed
+    lazily, so that no more than ``max_concurrent`` jobs (default: the number of
+    CPUs) are in flight at any time.  ``timeout`` and ``cpu_limit`` are passed on to
+    every ``Pynac.run_async``.
+
+    Returns a list with one entry per job, in the order of ``jobs``: ``None`` if the
+    simulation ran successfully, or the exception it raised otherwise (e.g., a
+    ``DynacTimeoutError`` for a run that hit one of its limits).
+    """
+    jobs = enumerate(jobs)
+    results = {}
+
+    async def worker():
+        for num, (pyn, cwd) in jobs:
+            try:
+                await pyn.run_async(cwd=cwd, timeout=timeout, cpu_limit=cpu_limit)
+                results[num] = None
+            except Exception as exc:
+                results[num] = exc
+
+    await asyncio.gather(*[worker() for _ in range(max_concurrent or os.cpu_count() or 1)])
+    return [results[num] for num in range(len(results))]
+
+
+def multi_async_pynac(pynacs, file_list=(), max_concurrent=None, stats=None, timeout=None, cpu_limit=None,
+                      stage='copy'):
+    """
+    Run each ``Pynac`` instance in ``pynacs`` in its own ``dynacProc_NNNN``
+    directory (prepared as by ``pynac_in_sub_directory``, but without changing
+    directory), with up to ``max_concurrent`` Dynac processes running at once from a
+    single coordinating process.  See ``run_pynacs_async``.
+
+    Unlike ``multi_process_pynac``, nothing needs to be pickled or forked, but
+    every instance in ``pynacs`` has to be built in the calling process (``pynacs``
+    may be a generator).  The return value, and the ``stats``, ``timeout`` and
+    ``cpu_limit`` arguments, are the same as for ``multi_process_pynac``, with each
+    entry of ``stats`` being the ``runStats`` of the corresponding instance.
+    ``stage`` sets how ``file_list`` is staged into each directory (see
+    ``stage_files``).
+    """
+    ran = []
+
+    def jobs():
+        for num, pyn in enumerate(pynacs):
+            if stats is not None:
+                ran.append(pyn)
+            yield pyn, make_run_directory(num, file_list, stage)
+
+    results = asyncio.run(run_pynacs_async(jobs(), max_concurrent, timeout, cpu_limit))
+    if stats is not None:
+        stats.extend([pyn.runStats if res is None else None for pyn, res in zip(ran, results)])
+    exc = [res for res in results if res is not None]
+    if exc:
+        return exc
+    else:
+        return "No errors encountered"
+
+
+def make_run_directory(num, file_list, stage='copy'):
+    """
+    Create the directory ``dynacProc_NNNN`` (deleting any existing directory of that
+    name), stage the files listed in ``file_list`` into it (see ``stage_files``),
+    and return its name.
+    """
+    print('Running %d' % num)
+    new_dir = 'dynacProc_%04d' % num
+    if os.path.isdir(new_dir):
+        shutil.rmtree(new_dir)
+    os.mkdir(new_dir)
+    stage_files(file_list, new_dir, stage)
+    return new_dir
+
+
+def stage_files(file_list, directory, stage='copy'):
+    """
+    Make the files listed in ``file_list`` available in ``directory``, according to
+    ``stage``:
+
+    * ``'copy'``: copy each file.
+    * ``'symlink'``: create a symbolic link to each file.
+    * ``'hardlink'``: create a hard link to each file, falling back to a copy when
+      this isn't possible (e.g., across filesystems).
+
+    Links avoid copying large inputs (e.g., field maps) for every simulation, but
+    should only be used for files that Dynac doesn't modify.
+    """
+    if stage not in ('copy', 'symlink', 'hardlink'):
+        raise ValueError('Unknown staging method: %r' % (stage,))
+    for f in file_list:
+        dest = os.path.join(directory, os.path.basename(f))
+        if stage == 'symlink':
+            os.symlink(os.path.abspath(f), dest)
+            continue
+        if stage == 'hardlink':
+            try:
+                os.link(f, dest)
+                continue
+            except OSError:
+                pass
+        shutil.copy(f, dest)
+
+
+def _tmpfs_root():
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
 
 
 @contextmanager
-def pynac_in_sub_directory(num, file_list):
+def run_directory(file_list=(), stage='symlink', tmpfs=False):
+    """
+    A context manager that creates a new, uniquely named directory, stages the files
+    listed in ``file_list`` into it (by default, as symbolic links; see
+    ``stage_files``), and hands its path back to the context, for use as the
+    ``cwd`` of ``Pynac.run``.  Unlike ``pynac_in_sub_directory``, it does not
+    change the working directory of the process, so it can be used from several
+    threads at once.
+
+    By default, the directory is created in the current directory, and is left in
+    place.  If ``tmpfs`` is true, it is instead created in a memory-backed
+    filesystem (``/dev/shm`` where available, or the temporary directory
+    otherwise), and is deleted on exiting the context, so anything needed from the
+    outputs must be extracted within the context.
+    """
+    root = _tmpfs_root() if tmpfs else '.'
+    directory = tempfile.mkdtemp(prefix='dynacRun_', dir=root)
+    try:
+        stage_files(file_list, directory, stage)
+        yield directory
+    finally:
+        if tmpfs:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+@contextmanager
+def pynac_in_sub_directory(num, file_list, stage='copy'):
         """
         A context manager to create a new directory, move the files listed in ``file_list``
         to that directory, and change to that directory before handing control back to
@@ -732,15 +1974,9 @@ def pynac_in_sub_directory(num, file_list):
         The primary purpose of this function is to enable multiprocess use of Pynac via
         the ``multi_process_pynac`` function.
         """
-        print('Running %d' % num)
-        new_dir = 'dynacProc_%04d' % num
-        if os.path.isdir(new_dir):
-            shutil.rmtree(new_dir)
-        os.mkdir(new_dir)
-        for f in file_list:
-            shutil.copy(f, new_dir)
-        os.chdir(new_dir)
-
-        yield
-
-        os.chdir('..')
+        home = os.getcwd()
+        os.chdir(make_run_directory(num, file_list, stage))
+        try:
+            yield
+        finally:
+            os.chdir(home)
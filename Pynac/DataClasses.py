@@ -44,3 +44,65 @@ try:
     CentreOfGravity.TOF.__doc__ = 'Time-of-flight parameter'
 except AttributeError:
     warnings.warn('Namedtuples cannot have docstrings in this version of Python')
+
+ProgressEvent = namedtuple('ProgressEvent', ['index', 'dynacType', 'elapsed'])
+try:
+    ProgressEvent.__doc__ = '''
+    Progress of a running Dynac simulation, as reported by Dynac when it starts
+    to process an element of the lattice.
+    '''
+    ProgressEvent.index.__doc__ = 'The index of the element, as reported by Dynac'
+    ProgressEvent.dynacType.__doc__ = 'The Dynac type of the element (e.g., QUADRUPO)'
+    ProgressEvent.elapsed.__doc__ = 'Seconds elapsed since Dynac was started'
+except AttributeError:
+    warnings.warn('Namedtuples cannot have docstrings in this version of Python')
+
+RunStats = namedtuple('RunStats', ['wall', 'user', 'sys', 'maxRSS'])
+try:
+    RunStats.__doc__ = '''
+    The resources used by a Dynac run (or, summed, by a batch of runs).
+    '''
+    RunStats.wall.__doc__ = 'Wall-clock time of the run, in seconds'
+    RunStats.user.__doc__ = 'User CPU time used by Dynac, in seconds'
+    RunStats.sys.__doc__ = 'System CPU time used by Dynac, in seconds'
+    RunStats.maxRSS.__doc__ = 'Peak resident set size of Dynac, in bytes'
+except AttributeError:
+    warnings.warn('Namedtuples cannot have docstrings in this version of Python')
+
+IterationResult = namedtuple('IterationResult', ['index', 'result', 'error', 'stats'])
+try:
+    IterationResult.__doc__ = '''
+    The outcome of one iteration of a batch of simulations (see ``Core.map_pynac``).
+    '''
+    IterationResult.index.__doc__ = 'The index of the iteration in the batch'
+    IterationResult.result.__doc__ = 'The value extracted from the iteration, or None if it failed'
+    IterationResult.error.__doc__ = 'The exception raised by the iteration, or None if it succeeded'
+    IterationResult.stats.__doc__ = 'The RunStats of the iteration, or None if it failed'
+except AttributeError:
+    warnings.warn('Namedtuples cannot have docstrings in this version of Python')
+
+WorkItem = namedtuple('WorkItem', ['pynacFunc', 'item', 'extractor', 'files', 'settings'], defaults=(None,))
+try:
+    WorkItem.__doc__ = '''
+    A simulation to be run by a worker agent (see ``Distributed.Coordinator``).
+    '''
+    WorkItem.pynacFunc.__doc__ = 'The function that builds and runs the simulation of the item'
+    WorkItem.item.__doc__ = 'The argument of pynacFunc (e.g., a lattice and its perturbation)'
+    WorkItem.extractor.__doc__ = 'The function that extracts the results from the simulation directory'
+    WorkItem.files.__doc__ = 'The (name, key) pairs of the input files needed by the simulation'
+    WorkItem.settings.__doc__ = 'The defaults of Pynac.run (timeout and cpuLimit) for the simulation'
+except AttributeError:
+    warnings.warn('Namedtuples cannot have docstrings in this version of Python')
+
+EmitPlotEntry = namedtuple('EmitPlotEntry', ['plotType', 'title', 'offset', 'blocks'])
+try:
+    EmitPlotEntry.__doc__ = '''
+    The location of one plot in an ``emit.plot`` file (see ``Plotting.EmitPlotIndex``).
+    '''
+    EmitPlotEntry.plotType.__doc__ = 'The type of the plot: 1 for EMITGR, 2 for PROFGR, 3 for ENVEL'
+    EmitPlotEntry.title.__doc__ = 'The (first) title of the plot'
+    EmitPlotEntry.offset.__doc__ = 'The byte offset of the plot, just after its type'
+    EmitPlotEntry.blocks.__doc__ = ('A dictionary of the (byte offset, number of lines) of each block '
+                                    'of pairs of numbers of the plot, by name')
+except AttributeError:
+    warnings.warn('Namedtuples cannot have docstrings in this version of Python')
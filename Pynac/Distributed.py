@@ -0,0 +1,458 @@
+"""
+Running simulations on many hosts.  A ``Coordinator`` holds a queue of work items,
+served over the network by a ``multiprocessing.managers`` server, and worker agents
+(``run_worker``, e.g., started on each host with ``python -m Pynac.Distributed``)
+lease items from it, run them, and send their results back.
+
+Every lease has to be renewed by its worker (which is done by a heartbeat thread
+of the agent) within ``lease_timeout`` seconds, so the items held by a worker that
+dies, hangs, or loses its connection are handed out again.  As the heartbeat keeps
+the lease of a hung Dynac run alive, runs should also be given a ``timeout`` or
+``cpu_limit``, which the workers apply to every ``Pynac.run``.
+
+The coordinator only listens on the loopback interface unless it is given the
+address of another interface (or ``''``, for every interface), so that serving
+workers on other hosts is an explicit choice.
+
+The work items, the functions they name, and their results are pickled, so the
+functions have to be importable, from the same module, on every worker host.  The
+input files of the simulations are sent along with the work, and each one is only
+transferred once to each agent.
+"""
+from collections import defaultdict, deque
+from multiprocessing.managers import BaseManager
+import hashlib
+import multiprocessing
+import os
+import queue
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from Pynac.Core import do_threaded_dynac_process
+from Pynac.DataClasses import IterationResult, WorkItem
+
+AUTHKEY_ENV = 'PYNAC_AUTHKEY'
+"""
+Name of the environment variable from which ``python -m Pynac.Distributed`` takes
+the authentication key shared by the coordinator and its workers.
+"""
+
+
+class WorkerLostError(RuntimeError):
+    """
+    The error of a work item whose lease expired on every one of its attempts,
+    i.e., that may be killing the workers that run it.
+    """
+
+
+class TaskBoard(object):
+    """
+    The queue of work items of a ``Coordinator``, which lives in its manager
+    server process and is shared, through proxies, by the coordinator and all of
+    the worker agents.
+
+    Items are handed out by ``lease``, and a lease that is not renewed within
+    ``lease_timeout`` seconds expires, putting the item back at the head of the
+    queue.  An item whose lease has expired ``max_attempts`` times is instead
+    completed with a ``WorkerLostError``.  Only the first completion of an item is
+    kept, so an item that was handed out again is not reported twice.
+    """
+    def __init__(self, lease_timeout=60.0, max_attempts=3):
+        self.leaseTimeout = lease_timeout
+        self.maxAttempts = max_attempts
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._tasks = {}
+        self._leases = {}
+        self._attempts = defaultdict(int)
+        self._files = {}
+        self._results = queue.Queue()
+        self._closed = False
+
+    def put(self, index, task):
+        """
+        Queue the ``DataClasses.WorkItem`` given as ``task``, under ``index``.
+        """
+        with self._lock:
+            self._tasks[index] = task
+            self._pending.append(index)
+
+    def add_file(self, key, data):
+        """
+        Store the content of an input file, under ``key``.
+        """
+        self._files.setdefault(key, data)
+
+    def file(self, key):
+        """
+        Return the content of the input file stored under ``key``.
+        """
+        return self._files[key]
+
+    def lease_timeout(self):
+        """
+        Return the number of seconds within which a lease has to be renewed.
+        """
+        return self.leaseTimeout
+
+    def lease(self, worker):
+        """
+        Hand the next queued item out to ``worker``, as an ``(index, task)`` pair, or
+        return ``None`` if no item is queued.
+        """
+        with self._lock:
+            self._expire()
+            if not self._pending:
+                return None
+            index = self._pending.popleft()
+            self._attempts[index] += 1
+            self._leases[index] = (worker, time.monotonic() + self.leaseTimeout)
+            return index, self._tasks[index]
+
+    def renew(self, worker):
+        """
+        Renew every lease held by ``worker``.
+        """
+        with self._lock:
+            deadline = time.monotonic() + self.leaseTimeout
+            for index, (holder, _) in list(self._leases.items()):
+                if holder == worker:
+                    self._leases[index] = (worker, deadline)
+
+    def release(self, worker):
+        """
+        Put every item leased by ``worker`` back at the head of the queue, without
+        counting it as a failed attempt.
+        """
+        with self._lock:
+            for index, (holder, _) in list(self._leases.items()):
+                if holder == worker:
+                    del self._leases[index]
+                    self._attempts[index] -= 1
+                    self._pending.appendleft(index)
+
+    def complete(self, index, result, error, stats):
+        """
+        Record the outcome of the item ``index``.
+        """
+        with self._lock:
+            if index not in self._tasks:
+                return
+            del self._tasks[index]
+            self._leases.pop(index, None)
+            self._attempts.pop(index, None)
+            if index in self._pending:
+                self._pending.remove(index)
+            self._results.put(IterationResult(index, result, error, stats))
+
+    def next_result(self, timeout=1.0):
+        """
+        Return the ``DataClasses.IterationResult`` of the next completed item, or
+        ``None`` if none completes within ``timeout`` seconds.  Expired leases are
+        also dealt with while waiting, even if no worker is left to ask for work.
+        """
+        try:
+            return self._results.get(timeout=timeout)
+        except queue.Empty:
+            with self._lock:
+                self._expire()
+            return None
+
+    def close(self):
+        """
+        Mark the queue as complete, i.e., no more items will be put.
+        """
+        self._closed = True
+
+    def finished(self):
+        """
+        Return whether the queue is closed, and every item has been completed.
+        """
+        with self._lock:
+            return self._closed and not self._tasks
+
+    def _expire(self):
+        now = time.monotonic()
+        for index, (worker, deadline) in list(self._leases.items()):
+            if deadline > now:
+                continue
+            del self._leases[index]
+            if self._attempts[index] < self.maxAttempts:
+                self._pending.appendleft(index)
+                continue
+            del self._tasks[index]
+            error = WorkerLostError('Item %r was lost by %d workers, the last being %s'
+                                    % (index, self._attempts.pop(index), worker))
+            self._results.put(IterationResult(index, None, error, None))
+
+
+_board = None
+
+
+def _shared_board(lease_timeout=60.0, max_attempts=3):
+    # Every proxy of the manager server refers to the same board.
+    global _board
+    if _board is None:
+        _board = TaskBoard(lease_timeout, max_attempts)
+    return _board
+
+
+class _BoardManager(BaseManager):
+    pass
+
+
+_BoardManager.register('board', callable=_shared_board)
+
+
+def _file_key(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+class Coordinator(object):
+    """
+    Serve a queue of work items to worker agents on ``address`` (a ``(host,
+    port)`` pair; by default, the loopback interface, on a free port, so that only
+    workers on this host can connect, while ``('', port)`` serves every interface),
+    authenticating them with ``authkey`` (by default, the authentication key of the
+    current process, which is inherited by the workers started with
+    ``start_local_worker``).  The address that workers should connect to is in the
+    ``address`` attribute.
+
+    ``lease_timeout`` and ``max_attempts`` are as for ``TaskBoard``.  ``timeout``
+    and ``cpu_limit`` are applied by the workers as the defaults of every
+    ``Pynac.run`` of the items (see ``Pynac.timeout`` and ``Pynac.cpuLimit``), so a
+    hung run is killed, and returned as a ``Core.DynacTimeoutError``, rather than
+    holding its item for ever.  The server is stopped by ``close``, or on leaving
+    the context if a ``Coordinator`` is used as a context manager.
+    """
+    def __init__(self, address=('127.0.0.1', 0), authkey=None, lease_timeout=60.0, max_attempts=3,
+                 timeout=None, cpu_limit=None):
+        self.settings = {'timeout': timeout, 'cpuLimit': cpu_limit}
+        self.authkey = bytes(authkey if authkey is not None else multiprocessing.current_process().authkey)
+        self._manager = _BoardManager(address, self.authkey)
+        self._manager.start()
+        self.board = self._manager.board(lease_timeout, max_attempts)
+        self.address = self._manager.address
+        self._fileKeys = {}
+        self._nextIndex = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """
+        Stop the server.  Workers still connected to it then exit.
+        """
+        self._manager.shutdown()
+
+    def submit(self, pynac_func, item, extractor=None, file_list=()):
+        """
+        Queue the simulation of ``item``, to be run on a worker as for
+        ``Core.map_pynac`` (with ``extractor`` called with the directory of the
+        simulation), and with the files in ``file_list`` staged into that
+        directory.  Return the index of the item, which is that of its
+        ``DataClasses.IterationResult``.
+        """
+        index = self._nextIndex
+        self._nextIndex += 1
+        files = tuple((os.path.basename(f), self._file_key(f)) for f in file_list)
+        self.board.put(index, WorkItem(pynac_func, item, extractor, files, self.settings))
+        return index
+
+    def _file_key(self, filename):
+        filename = os.path.abspath(filename)
+        if filename not in self._fileKeys:
+            with open(filename, 'rb') as f:
+                data = f.read()
+            key = _file_key(data)
+            self.board.add_file(key, data)
+            self._fileKeys[filename] = key
+        return self._fileKeys[filename]
+
+    def map(self, pynac_func, items, extractor=None, file_list=(), max_pending=None):
+        """
+        The distributed equivalent of ``Core.map_pynac``: a generator that queues the
+        simulation of each of ``items`` (see ``submit``), and yields the
+        ``DataClasses.IterationResult`` of each as it completes, with the position
+        of the item in ``items`` as its index.  ``items`` is consumed lazily, with no
+        more than ``max_pending`` items (by default, all of them) queued or running
+        at a time.  Once ``items`` is exhausted, the queue is closed.
+        """
+        items = iter(items)
+        offset = self._nextIndex
+        outstanding = 0
+        exhausted = False
+        while True:
+            while not exhausted and (max_pending is None or outstanding < max_pending):
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    self.board.close()
+                    break
+                self.submit(pynac_func, item, extractor, file_list)
+                outstanding += 1
+            if not outstanding:
+                return
+            result = self.board.next_result()
+            if result is not None:
+                outstanding -= 1
+                yield result._replace(index=result.index - offset)
+
+    def start_local_worker(self, max_workers=1):
+        """
+        Start a worker agent in a new process on this host, and return that
+        ``multiprocessing.Process``.
+        """
+        address = ('localhost', self.address[1])
+        proc = multiprocessing.Process(target=run_worker, args=(address, self.authkey, max_workers))
+        proc.daemon = True
+        proc.start()
+        return proc
+
+
+def distributed_pynac(pynac_func, items, extractor=None, file_list=(), address=('127.0.0.1', 0), authkey=None,
+                      local_workers=0, lease_timeout=60.0, max_attempts=3, max_pending=None, timeout=None,
+                      cpu_limit=None):
+    """
+    Run the simulation of each of ``items``, as for ``Core.map_pynac``, on the
+    worker agents connected to a new ``Coordinator`` (see ``Coordinator.map``), and
+    yield the ``DataClasses.IterationResult`` of each as it completes.
+
+    ``local_workers`` agents are started on this host, while agents on other hosts
+    can be started with ``python -m Pynac.Distributed``, given the address of the
+    coordinator and its ``authkey``, if ``address`` is that of an interface that
+    they can reach (by default, the coordinator only listens on the loopback
+    interface).  ``lease_timeout`` and ``max_attempts`` are as for ``TaskBoard``,
+    and ``timeout`` and ``cpu_limit`` as for ``Coordinator``.
+
+    As for the thread backend of ``map_pynac``, the simulations are run in
+    directories of their own, without changing the working directory of the
+    agent, so the lattice should be carried by the item itself (e.g., as a
+    ``Pynac`` instance, with its perturbations applied), rather than read from a
+    file by ``pynac_func``.
+    """
+    coordinator = Coordinator(address, authkey, lease_timeout, max_attempts, timeout, cpu_limit)
+    workers = []
+    try:
+        workers.extend(coordinator.start_local_worker() for _ in range(local_workers))
+        for result in coordinator.map(pynac_func, items, extractor, file_list, max_pending):
+            yield result
+    finally:
+        coordinator.close()
+        for proc in workers:
+            proc.join(lease_timeout)
+            if proc.is_alive():
+                proc.terminate()
+
+
+def run_worker(address, authkey=None, max_workers=1, poll_interval=0.5):
+    """
+    A worker agent: connect to the ``Coordinator`` at ``address``, and run the items
+    that it hands out, ``max_workers`` at a time, until its queue is finished or the
+    connection to it is lost.
+
+    Each item is run by ``Core.do_threaded_dynac_process``, in a directory of its
+    own, into which its input files are linked from a scratch directory of the
+    agent, with the ``timeout`` and ``cpu_limit`` given to the ``Coordinator``.
+    An exception raised by an item is sent back as its result.
+    """
+    authkey = bytes(authkey if authkey is not None else multiprocessing.current_process().authkey)
+    manager = _BoardManager(address, authkey)
+    manager.connect()
+    board = manager.board()
+    worker = '%s:%d' % (socket.gethostname(), os.getpid())
+    inputs = tempfile.mkdtemp(prefix='dynacAgent_')
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(board, worker, stop), daemon=True)
+    heartbeat.start()
+    threads = [
+        threading.Thread(target=_serve_items, args=(board, worker, inputs, poll_interval), daemon=True)
+        for _ in range(max_workers)
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        # Hand the items of an agent that is stopped back straight away, rather
+        # than once their leases expire.
+        board.release(worker)
+        raise
+    finally:
+        stop.set()
+        shutil.rmtree(inputs, ignore_errors=True)
+
+
+def _heartbeat(board, worker, stop):
+    try:
+        interval = board.lease_timeout() / 3.0
+        while not stop.wait(interval):
+            board.renew(worker)
+    except (EOFError, OSError):
+        pass
+
+
+def _serve_items(board, worker, inputs, poll_interval):
+    try:
+        while not board.finished():
+            lease = board.lease(worker)
+            if lease is None:
+                time.sleep(poll_interval)
+                continue
+            index, task = lease
+            try:
+                file_list = [_fetch_file(board, inputs, name, key) for name, key in task.files]
+                result, stats = do_threaded_dynac_process(index, task.item, task.pynacFunc, task.extractor,
+                                                          file_list, settings=task.settings)
+            except Exception as err:
+                _complete(board, index, None, err, None)
+            else:
+                _complete(board, index, result, None, stats)
+    except (EOFError, OSError):
+        pass
+
+
+def _complete(board, index, result, error, stats):
+    try:
+        board.complete(index, result, error, stats)
+    except (EOFError, OSError):
+        raise
+    except Exception as err:
+        # The result or error could not be sent (e.g., it is not picklable).
+        board.complete(index, None, RuntimeError('Failed to send the result of item %r: %r' % (index, err)),
+                       None)
+
+
+def _fetch_file(board, inputs, name, key):
+    directory = os.path.join(inputs, key)
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(board.file(key))
+        os.replace(tmp_path, path)
+    return path
+
+
+def main(argv):
+    """
+    Run a worker agent: ``python -m Pynac.Distributed HOST:PORT [MAX_WORKERS]``, with
+    the authentication key of the coordinator in the ``PYNAC_AUTHKEY`` environment
+    variable.
+    """
+    host, port = argv[0].rsplit(':', 1)
+    max_workers = int(argv[1]) if len(argv) > 1 else 1
+    run_worker((host, int(port)), os.environ[AUTHKEY_ENV].encode(), max_workers)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -19,7 +19,63 @@ _dynac2pynac = defaultdict(lambda: 'NotImplemented', {
 })
 
 
+class _Attribute(object):
+    """
+    A descriptor for a piece of the state of an element, held in a slot of the
+    element named after the attribute with a leading underscore.  Assigning to
+    the attribute marks the element as changed, by discarding the Dynac text
+    cached for it by ``Lattice.render_element``.
+    """
+    def __set_name__(self, owner, name):
+        self.slot = '_' + name
+
+    def __get__(self, ele, owner=None):
+        if ele is None:
+            return self
+        return getattr(ele, self.slot)
+
+    def __set__(self, ele, value):
+        setattr(ele, self.slot, value)
+        ele._rendered = None
+
+
+class _Param(_Attribute):
+    """
+    A descriptor for a parameter of an element.  The value of the parameter is
+    held in a slot of the element (named after the parameter, with a leading
+    underscore), and it is presented as a ``Param`` whose unit is stored once, on
+    the class, rather than in every instance.  ``unit`` may also be a function of
+    the element, for parameters whose unit depends on the element's settings.
+
+    Either a ``Param`` or a bare value may be assigned to the parameter; only the
+    value of a ``Param`` is kept.
+    """
+    def __init__(self, unit=None):
+        self.unit = unit
+
+    def __get__(self, ele, owner=None):
+        if ele is None:
+            return self
+        unit = self.unit(ele) if callable(self.unit) else self.unit
+        return Param(val=getattr(ele, self.slot), unit=unit)
+
+    def __set__(self, ele, value):
+        if isinstance(value, Param):
+            value = value.val
+        _Attribute.__set__(self, ele, value)
+
+
 class PynacElement(metaclass=abc.ABCMeta):
+    """
+    The base class of all Pynac elements.
+
+    The Dynac text of an element is cached (see ``Lattice.render_element``) when
+    all of its state is held in slots, and the cache is discarded whenever one of
+    its ``_Attribute`` or ``_Param`` descriptors is assigned to.  Subclasses
+    whose instances have a ``__dict__`` are never cached.
+    """
+    __slots__ = ('_rendered',)
+
     @abc.abstractclassmethod
     def from_dynacRepr(cls, pynacRepr):
         pass
@@ -37,10 +93,15 @@ class Quad(PynacElement):
     be put back into the ``lattice`` attribute of `Pynac` using the ``dynacRepresentation``
     method.
     """
+    __slots__ = ('_L', '_B', '_aperRadius')
+    L = _Param('cm')
+    B = _Param('kG')
+    aperRadius = _Param('cm')
+
     def __init__(self, L, B, aperRadius):
-        self.L = Param(val = L, unit = 'cm')
-        self.B = Param(val = B, unit = 'kG')
-        self.aperRadius = Param(val = aperRadius, unit = 'cm')
+        self.L = L
+        self.B = B
+        self.aperRadius = aperRadius
 
     @classmethod
     def from_dynacRepr(cls, pynacRepr):
@@ -58,7 +119,7 @@ class Quad(PynacElement):
         is multiplicative, so a value of ``scalingFactor = 1.0`` will result in no change
         of the field.
         """
-        self.B = self.B._replace(val=self.B.val * scalingFactor)
+        self.B = self._B * scalingFactor
 
     def setField(self, new_value):
         """
@@ -66,13 +127,13 @@ class Quad(PynacElement):
         is multiplicative, so a value of ``scalingFactor = 1.0`` will result in no change
         of the field.
         """
-        self.B = self.B._replace(val=new_value)
+        self.B = new_value
 
     def dynacRepresentation(self):
         """
         Return the Pynac representation of this quadrupole instance.
         """
-        return ['QUADRUPO', [[self.L.val, self.B.val, self.aperRadius.val]]]
+        return ['QUADRUPO', [[self._L, self._B, self._aperRadius]]]
 
     def __repr__(self):
         s = 'QUAD:'
@@ -91,12 +152,19 @@ class CavityAnalytic(PynacElement):
     be put back into the ``lattice`` attribute of ``Pynac`` using the ``dynacRepresentation``
     method.
     """
+    __slots__ = ('_cavID', '_xesln', '_phase', '_fieldReduction', '_isec')
+    cavID = _Param()
+    xesln = _Param('cm')
+    phase = _Param('deg')
+    fieldReduction = _Param('percent')
+    isec = _Param()
+
     def __init__(self, phase, fieldReduction, cavID=0, xesln=0, isec=0):
-        self.cavID = Param(val = cavID, unit = None)
-        self.xesln = Param(val = xesln, unit = 'cm')
-        self.phase = Param(val = phase, unit = 'deg')
-        self.fieldReduction = Param(val = fieldReduction, unit = 'percent')
-        self.isec = Param(val = isec, unit = None)
+        self.cavID = cavID
+        self.xesln = xesln
+        self.phase = phase
+        self.fieldReduction = fieldReduction
+        self.isec = isec
 
     @classmethod
     def from_dynacRepr(cls, pynacRepr):
@@ -116,7 +184,7 @@ class CavityAnalytic(PynacElement):
         The adjustment is additive, so a value of ``scalingFactor = 0.0`` will result
         in no change of the phase.
         """
-        self.phase = self.phase._replace(val = self.phase.val + adjustment)
+        self.phase = self._phase + adjustment
 
     def scaleField(self, scalingFactor):
         """
@@ -124,17 +192,16 @@ class CavityAnalytic(PynacElement):
         The adjustment is multiplicative, so a value of ``scalingFactor = 1.0`` will result
         in no change of the field.
         """
-        oldField = self.fieldReduction.val
-        newField = 100.0 * (scalingFactor * (1.0 + oldField/100.0) - 1.0)
-        self.fieldReduction = self.fieldReduction._replace(val = newField)
+        oldField = self._fieldReduction
+        self.fieldReduction = 100.0 * (scalingFactor * (1.0 + oldField/100.0) - 1.0)
 
     def dynacRepresentation(self):
         """
         Return the Dynac representation of this cavity instance.
         """
         return ['CAVMC', [
-            [self.cavID.val],
-            [self.xesln.val, self.phase.val, self.fieldReduction.val, self.isec.val, 1],
+            [self._cavID],
+            [self._xesln, self._phase, self._fieldReduction, self._isec, 1],
             ]]
 
     def __repr__(self):
@@ -152,8 +219,11 @@ class Drift(PynacElement):
     be put back into the ``lattice`` attribute of `Pynac` using the ``dynacRepresentation``
     method.
     """
+    __slots__ = ('_L',)
+    L = _Param('cm')
+
     def __init__(self, L):
-        self.L = Param(val = L, unit = 'cm')
+        self.L = L
 
     @classmethod
     def from_dynacRepr(cls, pynacRepr):
@@ -167,7 +237,7 @@ class Drift(PynacElement):
         """
         Return the Dynac representation of this drift instance.
         """
-        return ['DRIFT', [[self.L.val]]]
+        return ['DRIFT', [[self._L]]]
 
     def __repr__(self):
         s = 'DRIFT:'
@@ -183,25 +253,47 @@ class AccGap(PynacElement):
     be put back into the ``lattice`` attribute of `Pynac` using the ``dynacRepresentation``
     method.
     """
+    __slots__ = (
+        '_L', '_TTF', '_TTFprime', '_TTFprimeprime', '_EField', '_phase', '_F', '_atten',
+        '_gapID', '_energy', '_beta', '_S', '_SP', '_quadLength', '_quadStrength', '_accumLen',
+    )
+    L = _Param('cm')
+    TTF = _Param()
+    TTFprime = _Param()
+    TTFprimeprime = _Param()
+    EField = _Param('MV/m')
+    phase = _Param('deg')
+    F = _Param('MHz')
+    atten = _Param()
+
+    # The following are dummy variables, not used by Dynac
+    gapID = _Param()
+    energy = _Param('MeV')
+    beta = _Param()
+    S = _Param()
+    SP = _Param()
+    quadLength = _Param('cm')
+    quadStrength = _Param('kG/cm')
+    accumLen = _Param('cm')
+
     def __init__(self, L, TTF, TTFprime, TTFprimeprime, EField, phase, F, atten):
-        self.L = Param(val = L, unit = 'cm')
-        self.TTF = Param(val = TTF, unit = None)
-        self.TTFprime = Param(val = TTFprime, unit = None)
-        self.TTFprimeprime = Param(val = TTFprimeprime, unit = None)
-        self.EField = Param(val = EField, unit = 'MV/m')
-        self.phase = Param(val = phase, unit = 'deg')
-        self.F = Param(val = F, unit = 'MHz')
-        self.atten = Param(val = atten, unit = None)
-
-        # The following are dummy variables, not used by Dynac
-        self.gapID = Param(val = 0, unit = None)
-        self.energy = Param(val = 0, unit = 'MeV')
-        self.beta = Param(val = 0, unit = None)
-        self.S = Param(val = 0, unit = None)
-        self.SP = Param(val = 0, unit = None)
-        self.quadLength = Param(val = 0, unit = 'cm')
-        self.quadStrength = Param(val = 0, unit = 'kG/cm')
-        self.accumLen = Param(val = 0, unit = 'cm')
+        self.L = L
+        self.TTF = TTF
+        self.TTFprime = TTFprime
+        self.TTFprimeprime = TTFprimeprime
+        self.EField = EField
+        self.phase = phase
+        self.F = F
+        self.atten = atten
+
+        self.gapID = 0
+        self.energy = 0
+        self.beta = 0
+        self.S = 0
+        self.SP = 0
+        self.quadLength = 0
+        self.quadStrength = 0
+        self.accumLen = 0
 
     @classmethod
     def from_dynacRepr(cls, pynacRepr):
@@ -220,14 +312,14 @@ class AccGap(PynacElement):
         atten = float(pynacList[15])
 
         gap = cls(L, TTF, TTFprime, TTFprimeprime, EField, phase, F, atten)
-        gap.gapID = Param(val = int(pynacList[0]), unit = None)
-        gap.energy = Param(val = float(pynacList[1]), unit = 'MeV')
-        gap.beta = Param(val = float(pynacList[2]), unit = None)
-        gap.S = Param(val = float(pynacList[6]), unit = None)
-        gap.SP = Param(val = float(pynacList[7]), unit = None)
-        gap.quadLength = Param(val = float(pynacList[8]), unit = 'cm')
-        gap.quadStrength = Param(val = float(pynacList[9]), unit = 'kG/cm')
-        gap.accumLen = Param(val = float(pynacList[12]), unit = 'cm')
+        gap.gapID = int(pynacList[0])
+        gap.energy = float(pynacList[1])
+        gap.beta = float(pynacList[2])
+        gap.S = float(pynacList[6])
+        gap.SP = float(pynacList[7])
+        gap.quadLength = float(pynacList[8])
+        gap.quadStrength = float(pynacList[9])
+        gap.accumLen = float(pynacList[12])
 
         return gap
 
@@ -236,22 +328,22 @@ class AccGap(PynacElement):
         Return the Dynac representation of this accelerating gap instance.
         """
         details = [
-            self.gapID.val,
-            self.energy.val,
-            self.beta.val,
-            self.L.val,
-            self.TTF.val,
-            self.TTFprime.val,
-            self.S.val,
-            self.SP.val,
-            self.quadLength.val,
-            self.quadStrength.val,
-            self.EField.val,
-            self.phase.val,
-            self.accumLen.val,
-            self.TTFprimeprime.val,
-            self.F.val,
-            self.atten.val,
+            self._gapID,
+            self._energy,
+            self._beta,
+            self._L,
+            self._TTF,
+            self._TTFprime,
+            self._S,
+            self._SP,
+            self._quadLength,
+            self._quadStrength,
+            self._EField,
+            self._phase,
+            self._accumLen,
+            self._TTFprimeprime,
+            self._F,
+            self._atten,
         ]
         return ['CAVSC', [details]]
 
@@ -265,17 +357,21 @@ class AccGap(PynacElement):
 
 
 class Set4DAperture(PynacElement):
+    __slots__ = ('_energy', '_phase', '_x', '_y', '_radius', '_energyDefnFlag')
+    energy = _Param(lambda ele: 'MeV' if ele._energyDefnFlag in (1, 11) else '%')
+    phase = _Param('deg')
+    x = _Param('cm')
+    y = _Param('cm')
+    radius = _Param('cm')
+    energyDefnFlag = _Param()
+
     def __init__(self, energy, phase, x, y, radius, energyDefnFlag = 0):
-        if energyDefnFlag == 1 or energyDefnFlag == 11:
-            energyUnit = 'MeV'
-        else:
-            energyUnit = '%'
-        self.energy = Param(val = energy, unit = energyUnit)
-        self.phase = Param(val = phase, unit = 'deg')
-        self.x = Param(val = x, unit = 'cm')
-        self.y = Param(val = y, unit = 'cm')
-        self.radius = Param(val = radius, unit = 'cm')
-        self.energyDefnFlag = Param(val = energyDefnFlag, unit = None)
+        self.energy = energy
+        self.phase = phase
+        self.x = x
+        self.y = y
+        self.radius = radius
+        self.energyDefnFlag = energyDefnFlag
 
     @classmethod
     def from_dynacRepr(cls, pynacRepr):
@@ -296,12 +392,12 @@ class Set4DAperture(PynacElement):
         Return the Pynac representation of this Set4DAperture instance.
         """
         details = [
-            self.energyDefnFlag.val,
-            self.energy.val,
-            self.phase.val,
-            self.x.val,
-            self.y.val,
-            self.radius.val,
+            self._energyDefnFlag,
+            self._energy,
+            self._phase,
+            self._x,
+            self._y,
+            self._radius,
         ]
         return ['REJECT', [details]]
 
@@ -316,11 +412,17 @@ class Set4DAperture(PynacElement):
 
 
 class Buncher(PynacElement):
+    __slots__ = ('_voltage', '_phase', '_harmonicNum', '_apertureRadius')
+    voltage = _Param('MV')
+    phase = _Param('deg')
+    harmonicNum = _Param()
+    apertureRadius = _Param('cm')
+
     def __init__(self, voltage, phase, harmonicNum, apertureRadius):
-        self.voltage = Param(val = voltage, unit = 'MV')
-        self.phase = Param(val = phase, unit = 'deg')
-        self.harmonicNum = Param(val = harmonicNum, unit = None)
-        self.apertureRadius = Param(val = apertureRadius, unit = 'cm')
+        self.voltage = voltage
+        self.phase = phase
+        self.harmonicNum = harmonicNum
+        self.apertureRadius = apertureRadius
 
     @classmethod
     def from_dynacRepr(cls, pynacRepr):
@@ -335,10 +437,10 @@ class Buncher(PynacElement):
         Return the Pynac representation of this Set4DAperture instance.
         """
         details = [
-            self.voltage.val,
-            self.phase.val,
-            self.harmonicNum.val,
-            self.apertureRadius.val,
+            self._voltage,
+            self._phase,
+            self._harmonicNum,
+            self._apertureRadius,
         ]
         return ['BUNCHER', [details]]
 
@@ -352,9 +454,13 @@ class Buncher(PynacElement):
 
 
 class AccFieldFromFile(PynacElement):
+    __slots__ = ('_filename', '_scaleFactor')
+    filename = _Attribute()
+    scaleFactor = _Param()
+
     def __init__(self, filename, scaleFactor):
         self.filename = filename
-        self.scaleFactor = Param(val = scaleFactor, unit = None)
+        self.scaleFactor = scaleFactor
 
     @classmethod
     def from_dynacRepr(cls, pynacRepr):
@@ -366,7 +472,7 @@ class AccFieldFromFile(PynacElement):
         """
         Return the Pynac representation of this AccFieldFromFile instance.
         """
-        return ['FIELD', [[self.filename], [self.scaleFactor.val]]]
+        return ['FIELD', [[self._filename], [self._scaleFactor]]]
 
     def __repr__(self):
         s = 'AccFieldFile: '
@@ -376,15 +482,13 @@ class AccFieldFromFile(PynacElement):
 
 
 class Steerer(PynacElement):
+    __slots__ = ('_field_strength', '_plane')
+    field_strength = _Param('T.m')
+    plane = _Param('None')
+
     def __init__(self, field_strength, plane):
-        self.field_strength = Param(
-            val=field_strength,
-            unit='T.m'
-        )
-        self.plane = Param(
-            val=plane,
-            unit='None'
-        )
+        self.field_strength = field_strength
+        self.plane = plane
 
     @classmethod
     def from_dynacRepr(cls, pynacRepr):
@@ -399,11 +503,11 @@ class Steerer(PynacElement):
         """
         Return the Dynac representation of this steerer instance.
         """
-        if self.plane.val == 'H':
+        if self._plane == 'H':
             p = 0
-        elif self.plane.val == 'V':
+        elif self._plane == 'V':
             p = 1
-        return ['STEER', [[self.field_strength.val], [p]]]
+        return ['STEER', [[self._field_strength, p]]]
 
     def scaleField(self, scalingFactor):
         """
@@ -411,9 +515,7 @@ class Steerer(PynacElement):
         is multiplicative, so a value of ``scalingFactor = 1.0`` will result in no change
         of the field.
         """
-        self.field_strength = self.field_strength._replace(
-            val=self.field_strength.val * scalingFactor
-        )
+        self.field_strength = self._field_strength * scalingFactor
 
     def setField(self, new_value):
         """
@@ -421,9 +523,7 @@ class Steerer(PynacElement):
         is multiplicative, so a value of ``scalingFactor = 1.0`` will result in no change
         of the field.
         """
-        self.field_strength = self.field_strength._replace(
-            val=new_value
-        )
+        self.field_strength = new_value
 
     def __repr__(self):
         s = 'STEER:'
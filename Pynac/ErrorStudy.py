@@ -0,0 +1,325 @@
+"""
+Seeded, reproducible Monte Carlo error studies.  An ``ErrorStudy`` applies random
+perturbations, described by a list of ``Perturbation`` specifications, to the
+elements of a lattice, and runs one simulation per seed in parallel (see
+``Core.map_pynac``).
+
+Every seed draws its perturbations from its own random stream, derived from the
+seed of the study and the number of the seed alone, so the perturbations of a seed
+do not depend on how many seeds are run, or on the order in which they are run,
+and any seed can be reproduced on its own (see ``ErrorStudy.reproduce``).  A long
+study can also be checkpointed in a ``StudyJournal``, so that it can be resumed
+after an interruption, rather than started again.
+"""
+from collections import namedtuple
+import base64
+import copy
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import numpy as np
+from Pynac.Core import Pynac, map_pynac, ele_from_pynac
+from Pynac.Elements import PynacElement
+from Pynac.DataClasses import IterationResult, RunStats
+
+Perturbation = namedtuple('Perturbation', ['dynacType', 'method', 'sigma', 'mean', 'distribution'],
+                          defaults=(None, 'normal'))
+Perturbation.__doc__ = '''
+A random perturbation of every element of one Dynac type, applied by calling one
+of the methods of the equivalent ``Elements`` class with a random value, e.g.::
+
+    Perturbation('QUADRUPO', 'scaleField', 1e-2)   # Quad.scaleField(N(1, 0.01))
+    Perturbation('CAVMC', 'adjustPhase', 2.0)      # CavityAnalytic.adjustPhase(N(0, 2))
+    Perturbation('STEER', 'setField', 1e-4)        # Steerer.setField(N(0, 1e-4))
+'''
+Perturbation.dynacType.__doc__ = 'The Dynac type of the perturbed elements (e.g., QUADRUPO)'
+Perturbation.method.__doc__ = 'The name of the element method that applies the perturbation'
+Perturbation.sigma.__doc__ = ('The standard deviation of the perturbation, or its half-width if '
+                              'the distribution is uniform')
+Perturbation.mean.__doc__ = ('The mean of the perturbation (default: 1.0 for the multiplicative '
+                             'scaleField method, 0.0 otherwise)')
+Perturbation.distribution.__doc__ = "Either 'normal' (the default) or 'uniform'"
+
+
+def _mean(perturbation):
+    if perturbation.mean is not None:
+        return perturbation.mean
+    return 1.0 if perturbation.method == 'scaleField' else 0.0
+
+
+class ErrorStudy(object):
+    """
+    A Monte Carlo error study of the lattice in the Dynac input file ``filename``,
+    applying the list of ``Perturbation`` given as ``perturbations`` in each of
+    ``num_seeds`` simulations.  If several perturbations apply to the same
+    element, they are applied in the order in which they are listed.
+
+    ``seed`` is the seed of the whole study (an integer, or a sequence of
+    integers), from which the random stream of every seed is derived with
+    ``numpy.random.SeedSequence``.  If it is not given, a fresh seed is drawn, and
+    kept in the ``seed`` attribute, so that the study can still be reproduced.
+
+    ``file_list`` lists the files needed to run the simulation (including
+    ``filename`` itself, and any field maps or beam files that it refers to), which
+    are staged into the directory of each simulation.
+
+    The input file is parsed once, when the study is created, and each seed then
+    perturbs its own copy of the lattice (see ``build``).
+    """
+    def __init__(self, filename, perturbations, num_seeds, seed=None, file_list=()):
+        self.filename = os.path.abspath(filename)
+        self.perturbations = [Perturbation(*p) for p in perturbations]
+        for p in self.perturbations:
+            if p.distribution not in ('normal', 'uniform'):
+                raise ValueError('Unknown distribution: %r' % (p.distribution,))
+        self.numSeeds = num_seeds
+        self.seed = np.random.SeedSequence(seed).entropy
+        self.fileList = list(file_list)
+        base = Pynac(self.filename)
+        self._baseName, self._baseLattice = base.name, base.lattice
+        self.indices = {p.dynacType: base.get_x_inds(p.dynacType) for p in self.perturbations}
+
+    def seed_sequence(self, num):
+        """
+        Return the ``numpy.random.SeedSequence`` of seed number ``num``.  This is the
+        same as the ``num``-th child spawned from the ``SeedSequence`` of the study.
+        """
+        return np.random.SeedSequence(self.seed, spawn_key=(num,))
+
+    def sample_seed(self, num):
+        """
+        Return the perturbations of seed number ``num``, as a list with one array
+        per ``Perturbation``, holding the value for every element it applies to, in
+        lattice order.
+        """
+        rng = np.random.default_rng(self.seed_sequence(num))
+        samples = []
+        for p in self.perturbations:
+            size = len(self.indices[p.dynacType])
+            if p.distribution == 'normal':
+                samples.append(rng.normal(_mean(p), p.sigma, size))
+            else:
+                samples.append(rng.uniform(_mean(p) - p.sigma, _mean(p) + p.sigma, size))
+        return samples
+
+    def sample(self, seeds=None):
+        """
+        Return the perturbations of all of the ``seeds`` (by default, every seed of
+        the study) at once, as a list with one array per ``Perturbation``, of shape
+        ``(len(seeds), number of elements)``.  Row ``i`` is identical to the
+        corresponding array of ``sample_seed(seeds[i])``.
+        """
+        seeds = range(self.numSeeds) if seeds is None else seeds
+        per_seed = [self.sample_seed(num) for num in seeds]
+        return [
+            np.array([s[ind] for s in per_seed]).reshape(len(per_seed), len(self.indices[p.dynacType]))
+            for ind, p in enumerate(self.perturbations)
+        ]
+
+    def build(self, num, samples=None):
+        """
+        Return a ``Pynac`` instance of the lattice with the perturbations of seed
+        number ``num`` applied.  ``samples`` may be given, as returned by
+        ``sample_seed(num)``, to avoid drawing them again.
+
+        The lattice is a copy of the one parsed when the study was created, in which
+        every element is copied, so it can be changed without affecting other
+        seeds.  As the parameters of a ``PynacElement`` are immutable values, a
+        shallow copy of each is enough, which is much quicker than parsing the input
+        file again, or than a deep copy of the lattice; elements held as raw lists
+        are deep-copied.
+        """
+        if samples is None:
+            samples = self.sample_seed(num)
+        return _build(self._baseName, self._baseLattice, self.filename, self.perturbations, self.indices,
+                      samples)
+
+    def fingerprint(self):
+        """
+        Return a hash of everything that determines the perturbations and results
+        of each seed: the content of the input file, the perturbations, and the seed
+        of the study.  The number of seeds is not included, as it doesn't affect any
+        single seed, so a study may be extended with more seeds.
+        """
+        sha = hashlib.sha1()
+        with open(self.filename, 'rb') as f:
+            sha.update(f.read())
+        sha.update(json.dumps([
+            [p.dynacType, p.method, float(p.sigma), None if p.mean is None else float(p.mean), p.distribution]
+            for p in self.perturbations
+        ]).encode())
+        sha.update(str(self.seed).encode())
+        return sha.hexdigest()
+
+    def run(self, extractor=None, seeds=None, journal=None, **kwargs):
+        """
+        Run the simulation of each of the ``seeds`` (by default, every seed of the
+        study) in parallel with ``Core.map_pynac``, to which ``extractor`` and any
+        other keyword arguments are passed on (with ``file_list`` defaulting to the
+        ``fileList`` attribute).  The perturbations of all of the seeds are drawn
+        before any simulation is started.
+
+        Like ``map_pynac``, this is a generator, yielding a
+        ``DataClasses.IterationResult`` for each seed as it completes, whose
+        ``index`` is the number of the seed.
+
+        If the path of a ``StudyJournal`` is given as ``journal``, every seed that
+        completes successfully is recorded in it, along with its result.  When the
+        study is run again with the same journal, the seeds already recorded are not
+        run again, but their recorded results are yielded first, so the study picks
+        up where it was interrupted, with only the seeds that had failed, or were
+        still running, being rerun.
+        """
+        seeds = list(range(self.numSeeds) if seeds is None else seeds)
+        if journal is not None:
+            journal = StudyJournal(journal, self.fingerprint())
+            done = journal.completed()
+            for num in seeds:
+                if num in done:
+                    yield done[num]
+            seeds = [num for num in seeds if num not in done]
+        samples = self.sample(seeds)
+        items = ((num, [s[row] for s in samples]) for row, num in enumerate(seeds))
+        kwargs.setdefault('file_list', self.fileList)
+        for result in map_pynac(_SeedRunner(self), items, extractor, **kwargs):
+            result = result._replace(index=seeds[result.index])
+            if journal is not None and result.error is None:
+                journal.record(result)
+            yield result
+
+    def reproduce(self, num, cwd=None):
+        """
+        Run the simulation of seed number ``num`` on its own, in the directory
+        ``cwd`` (by default, the current directory), which should contain the files
+        in ``fileList``, and return its ``Pynac`` instance.  The perturbations are
+        identical to those applied to that seed by ``run``.
+        """
+        pyn = self.build(num)
+        pyn.run(cwd=cwd)
+        return pyn
+
+
+def _build(name, lattice, filename, perturbations, indices, samples):
+    pyn = Pynac.from_lattice(name, [
+        copy.copy(ele) if isinstance(ele, PynacElement) else copy.deepcopy(ele)
+        for ele in lattice
+    ])
+    pyn.filename = filename
+    for p, values in zip(perturbations, samples):
+        for ind, value in zip(indices[p.dynacType], values.tolist()):
+            ele = pyn.lattice[ind]
+            if isinstance(ele, list):
+                ele = ele_from_pynac(ele)
+            getattr(ele, p.method)(value)
+            pyn.lattice[ind] = ele
+    return pyn
+
+
+# The last base lattice unpickled by _SeedRunner in this process, as (key, (name, lattice)).
+_unpickledBase = (None, None)
+
+
+class _SeedRunner(object):
+    # A picklable callable, so that the seeds of an ErrorStudy can be run by the
+    # process backend of map_pynac, which pickles it along with every seed.  It
+    # holds only what building a seed needs, with the base lattice pickled once
+    # per study, as bytes (which are quick to pickle again), and unpickled once
+    # per worker process rather than once per seed.
+    def __init__(self, study):
+        self.filename = study.filename
+        self.perturbations = study.perturbations
+        self.indices = study.indices
+        self.base = pickle.dumps((study._baseName, study._baseLattice), protocol=pickle.HIGHEST_PROTOCOL)
+        self.key = hashlib.sha1(self.base).hexdigest()
+
+    def __call__(self, item):
+        global _unpickledBase
+        num, samples = item
+        key, base = _unpickledBase
+        if key != self.key:
+            base = pickle.loads(self.base)
+            _unpickledBase = (self.key, base)
+        _build(base[0], base[1], self.filename, self.perturbations, self.indices, samples).run()
+
+
+class StudyJournal(object):
+    """
+    An append-only record, in the file ``path``, of the seeds of a study that have
+    completed, along with their results.  The file holds one JSON object per line:
+    a header holding the ``fingerprint`` of the study, followed by one entry per
+    seed, with its result pickled and base64-encoded.
+
+    Each entry is appended with a single ``write`` to a file opened with
+    ``O_APPEND``, and flushed to disk before ``record`` returns, so an entry is
+    either complete or, if the process died while writing it, a torn last line,
+    which is discarded when the journal is next opened.  A new journal is written
+    to a temporary file, and linked into place once its header is on disk, so
+    ``path`` never holds a journal without a header.  Opening the journal of a
+    different study (i.e., with a different ``fingerprint``) raises
+    ``ValueError``.
+    """
+    def __init__(self, path, fingerprint):
+        self.path = path
+        self.fingerprint = fingerprint
+        fd, temp = tempfile.mkstemp(prefix='.journal_', dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(json.dumps({'fingerprint': fingerprint}) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            try:
+                os.link(temp, path)
+            except FileExistsError:
+                self._check_header()
+        finally:
+            os.remove(temp)
+
+    def _check_header(self):
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            try:
+                recorded = json.loads(data[:data.find(b'\n') + 1].decode())['fingerprint']
+            except (ValueError, KeyError, TypeError):
+                raise ValueError('%s is not a study journal' % self.path)
+            if recorded != self.fingerprint:
+                raise ValueError('%s is the journal of a different study' % self.path)
+            if not data.endswith(b'\n'):
+                # A torn entry, which the next append would run into.
+                f.truncate(data.rfind(b'\n') + 1)
+
+    def record(self, result):
+        """
+        Record the ``DataClasses.IterationResult`` of a completed seed.
+        """
+        entry = {
+            'seed': result.index,
+            'result': base64.b64encode(pickle.dumps(result.result, protocol=pickle.HIGHEST_PROTOCOL)).decode(),
+            'stats': None if result.stats is None else list(result.stats),
+        }
+        line = (json.dumps(entry) + '\n').encode()
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        try:
+            os.write(fd, line)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def completed(self):
+        """
+        Return a dictionary of the ``DataClasses.IterationResult`` of every seed
+        recorded in the journal, keyed by the number of the seed.
+        """
+        results = {}
+        with open(self.path) as f:
+            f.readline()
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                stats = None if entry['stats'] is None else RunStats(*entry['stats'])
+                result = pickle.loads(base64.b64decode(entry['result']))
+                results[entry['seed']] = IterationResult(entry['seed'], result, None, stats)
+        return results
@@ -0,0 +1,329 @@
+"""
+Containers for Pynac lattices.
+"""
+from bisect import bisect_left, insort
+from collections import defaultdict
+from heapq import merge
+import numpy as np
+from Pynac.Elements import PynacElement
+
+_FAMILY_LAYOUTS = {
+    'QUADRUPO': [['L', 'B', 'aperRadius']],
+    'CAVMC': [['cavID'], ['xesln', 'phase', 'fieldReduction', 'isec', 1]],
+    'DRIFT': [['L']],
+    'CAVSC': [[
+        'gapID', 'energy', 'beta', 'L', 'TTF', 'TTFprime', 'S', 'SP',
+        'quadLength', 'quadStrength', 'EField', 'phase', 'accumLen',
+        'TTFprimeprime', 'F', 'atten',
+    ]],
+    'STEER': [['field_strength', 'plane']],
+}
+
+_FIELD_PARAM = {
+    'QUADRUPO': 'B',
+    'CAVMC': 'fieldReduction',
+    'STEER': 'field_strength',
+}
+
+
+def _dynac_repr(ele):
+    try:
+        return ele.dynacRepresentation()
+    except AttributeError:
+        return ele
+
+
+def _dynac_type(ele):
+    return _dynac_repr(ele)[0]
+
+
+def render_element(ele):
+    """
+    Return the text of a single element of a Dynac input file, with each line
+    terminated by ``\\r\\n``.
+
+    The text of a ``PynacElement`` whose state is held entirely in slots is cached
+    on the element, and reused until one of its parameters is changed (e.g., by
+    ``Quad.scaleField``), so rendering a lattice in which few elements have
+    changed only formats those elements.  Elements given as raw lists are always
+    formatted afresh.
+    """
+    text = getattr(ele, '_rendered', None)
+    if text is not None:
+        return text
+    rep = _dynac_repr(ele)
+    lines = [rep[0]]
+    lines.extend([' '.join([str(i) for i in datum]) for datum in rep[1]])
+    lines.append('')
+    text = '\r\n'.join(lines)
+    if isinstance(ele, PynacElement) and not hasattr(ele, '__dict__'):
+        ele._rendered = text
+    return text
+
+
+def render_deck(name, lattice):
+    """
+    Render a complete Dynac input file (the ``name`` line followed by every
+    element of ``lattice``) in one go, and return it encoded as bytes.
+    """
+    return ''.join([name, '\r\n'] + [render_element(ele) for ele in lattice]).encode()
+
+
+class IndexedLattice(list):
+    """
+    A list of lattice elements that maintains an index from Dynac type to the
+    positions of the elements of that type, so that ``indices`` (and therefore
+    ``Pynac.get_x_inds`` and ``Pynac.get_x_objs``) costs O(k) in the number of
+    matching elements, rather than a scan of the whole lattice.
+
+    The index is kept correct by every list operation.  Appending elements, or
+    replacing an element by assignment (e.g., ``lattice[i] = quad``), updates it
+    in place.  Operations that move elements (insertion, deletion, slice
+    assignment, sorting, etc.) cause it to be rebuilt from a cached list of
+    element types on the next lookup, without recomputing the type of every
+    element.  Changing the type of a raw list element in-place (i.e.,
+    ``lattice[i][0] = 'DRIFT'``) is not tracked.
+    """
+    def __init__(self, iterable=()):
+        super(IndexedLattice, self).__init__()
+        self._types = []
+        self._index = defaultdict(list)
+        self.extend(iterable)
+
+    def __reduce__(self):
+        return self.__class__, (list(self),)
+
+    def indices(self, *dynac_type):
+        """
+        Return, in lattice order, the positions of the elements whose Dynac type is
+        one of those given.
+        """
+        if self._index is None:
+            self._rebuild_index()
+        if len(dynac_type) == 1:
+            return list(self._index.get(dynac_type[0], ()))
+        return list(merge(*[self._index.get(t, ()) for t in dynac_type]))
+
+    def _rebuild_index(self):
+        index = defaultdict(list)
+        for ind, dynac_type in enumerate(self._types):
+            index[dynac_type].append(ind)
+        self._index = index
+
+    def _invalidate(self):
+        self._index = None
+
+    def append(self, ele):
+        dynac_type = _dynac_type(ele)
+        super(IndexedLattice, self).append(ele)
+        self._types.append(dynac_type)
+        if self._index is not None:
+            self._index[dynac_type].append(len(self._types) - 1)
+
+    def extend(self, iterable):
+        for ele in iterable:
+            self.append(ele)
+
+    def __iadd__(self, iterable):
+        self.extend(iterable)
+        return self
+
+    def __setitem__(self, key, value):
+        if isinstance(key, slice):
+            value = list(value)
+            super(IndexedLattice, self).__setitem__(key, value)
+            self._types[key] = [_dynac_type(ele) for ele in value]
+            self._invalidate()
+            return
+        if key < 0:
+            key += len(self)
+        new_type = _dynac_type(value)
+        super(IndexedLattice, self).__setitem__(key, value)
+        old_type = self._types[key]
+        self._types[key] = new_type
+        if self._index is not None and new_type != old_type:
+            old_inds = self._index[old_type]
+            del old_inds[bisect_left(old_inds, key)]
+            insort(self._index[new_type], key)
+
+    def __delitem__(self, key):
+        super(IndexedLattice, self).__delitem__(key)
+        del self._types[key]
+        self._invalidate()
+
+    def insert(self, ind, ele):
+        dynac_type = _dynac_type(ele)
+        super(IndexedLattice, self).insert(ind, ele)
+        self._types.insert(ind, dynac_type)
+        self._invalidate()
+
+    def pop(self, ind=-1):
+        ele = super(IndexedLattice, self).pop(ind)
+        self._types.pop(ind)
+        self._invalidate()
+        return ele
+
+    def remove(self, ele):
+        del self[self.index(ele)]
+
+    def clear(self):
+        super(IndexedLattice, self).clear()
+        self._types = []
+        self._index = defaultdict(list)
+
+    def __imul__(self, num):
+        super(IndexedLattice, self).__imul__(num)
+        self._types *= num
+        self._invalidate()
+        return self
+
+    def sort(self, *args, **kwargs):
+        super(IndexedLattice, self).sort(*args, **kwargs)
+        self._types = [_dynac_type(ele) for ele in self]
+        self._invalidate()
+
+    def reverse(self):
+        super(IndexedLattice, self).reverse()
+        self._types.reverse()
+        self._invalidate()
+
+
+def _layout_matches(layout, rep):
+    if len(rep[1]) != len(layout):
+        return False
+    for layout_row, row in zip(layout, rep[1]):
+        if len(layout_row) != len(row):
+            return False
+        for field, val in zip(layout_row, row):
+            if not isinstance(field, str) and field != val:
+                return False
+    return True
+
+
+def _column(values):
+    types = set(type(v) for v in values)
+    if types == {int}:
+        return np.array(values, dtype=np.int64)
+    if types == {float}:
+        return np.array(values, dtype=np.float64)
+    return np.array(values, dtype=object)
+
+
+class ColumnarLattice(object):
+    """
+    A lattice in which the parameters of each family of elements (quads,
+    ``CAVMC`` cavities, drifts, ``CAVSC`` gaps, and steerers) are held in NumPy
+    arrays, one per parameter, rather than in one Python object per element.
+    This allows whole-family manipulations (e.g., scaling the field of every
+    quad by a vector of errors) to be single array operations.
+
+    The arrays are found in the ``columns`` attribute, keyed by Dynac type and
+    then by the name of the parameter in the equivalent ``Elements`` class (e.g.,
+    ``columns['QUADRUPO']['B']``), and ``indices`` gives the positions of each
+    family in the lattice.  All other elements are kept unchanged.
+
+    Iterating over a ``ColumnarLattice`` gives the Dynac representation of each
+    element, so it can be used as the lattice of a ``Pynac`` instance, and running
+    it sends Dynac exactly the same input as the lattice it was built from.
+    """
+    def __init__(self, lattice):
+        self._slots = []
+        rows = {family: [] for family in _FAMILY_LAYOUTS}
+        positions = {family: [] for family in _FAMILY_LAYOUTS}
+        for ind, ele in enumerate(lattice):
+            rep = _dynac_repr(ele)
+            layout = _FAMILY_LAYOUTS.get(rep[0])
+            if layout is not None and _layout_matches(layout, rep):
+                self._slots.append((rep[0], len(rows[rep[0]])))
+                rows[rep[0]].append(rep[1])
+                positions[rep[0]].append(ind)
+            else:
+                self._slots.append((None, ele))
+
+        self.columns = {}
+        self.indices = {}
+        for family, layout in _FAMILY_LAYOUTS.items():
+            if not rows[family]:
+                continue
+            self.indices[family] = np.array(positions[family], dtype=np.intp)
+            self.columns[family] = {}
+            for row_num, layout_row in enumerate(layout):
+                for col_num, field in enumerate(layout_row):
+                    if isinstance(field, str):
+                        self.columns[family][field] = _column([r[row_num][col_num] for r in rows[family]])
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __iter__(self):
+        values = {
+            family: {field: col.tolist() for field, col in cols.items()}
+            for family, cols in self.columns.items()
+        }
+        for family, item in self._slots:
+            if family is None:
+                yield item
+            else:
+                yield self._family_repr(family, values[family], item)
+
+    def __getitem__(self, ind):
+        family, item = self._slots[ind]
+        if family is None:
+            return item
+        values = {field: col[item:item + 1].tolist() for field, col in self.columns[family].items()}
+        return self._family_repr(family, values, 0)
+
+    def _family_repr(self, family, values, row):
+        return [family, [
+            [values[field][row] if isinstance(field, str) else field for field in layout_row]
+            for layout_row in _FAMILY_LAYOUTS[family]
+        ]]
+
+    def to_lattice(self):
+        """
+        Return the lattice as a list of Dynac representations.
+        """
+        return list(self)
+
+    def column(self, dynac_type, field):
+        """
+        Return the array holding the parameter ``field`` of every element of Dynac
+        type ``dynac_type``, in lattice order.  Changes made in-place to this array
+        are reflected in the lattice, but note that the whole-family methods
+        (``scale_field``, etc.) replace the array rather than modifying it.
+        """
+        return self.columns[dynac_type][field]
+
+    def scale_field(self, dynac_type, scaling_factors):
+        """
+        Multiplicatively adjust the field of every element of type ``dynac_type``
+        (``QUADRUPO``, ``CAVMC``, or ``STEER``), in the same way as the
+        ``scaleField`` method of the equivalent ``Elements`` class.
+        ``scaling_factors`` is either a scalar or an array with one entry per
+        element.
+        """
+        field = _FIELD_PARAM[dynac_type]
+        old = self.columns[dynac_type][field]
+        if dynac_type == 'CAVMC':
+            new = 100.0 * (scaling_factors * (1.0 + old / 100.0) - 1.0)
+        else:
+            new = old * scaling_factors
+        self.columns[dynac_type][field] = new
+
+    def set_field(self, dynac_type, new_values):
+        """
+        Set the field of every element of type ``dynac_type`` (``QUADRUPO`` or
+        ``STEER``).  ``new_values`` is either a scalar or an array with one entry
+        per element.
+        """
+        field = _FIELD_PARAM[dynac_type]
+        old = self.columns[dynac_type][field]
+        self.columns[dynac_type][field] = np.broadcast_to(new_values, old.shape).copy()
+
+    def adjust_phase(self, dynac_type, adjustments):
+        """
+        Additively adjust the phase of every element of type ``dynac_type``
+        (``CAVMC`` or ``CAVSC``).  ``adjustments`` is either a scalar or an array
+        with one entry per element.
+        """
+        self.columns[dynac_type]['phase'] = self.columns[dynac_type]['phase'] + adjustments
@@ -0,0 +1,307 @@
+"""
+Readers of the output files written by Dynac, which return their numerical content
+as NumPy arrays, rather than as Python objects per value, so that the outputs of
+many simulations can be read and compared quickly.
+"""
+import os
+import re
+import tempfile
+import numpy as np
+from Pynac._batch import settings as _batch_settings
+
+_EMIT_CARD_MARKER = 'beam (emit card)'
+# The names of the numbers on each of the lines of an EMIT card in dynac.short (see
+# the header of that file for their meaning).
+_EMIT_CARD_LAYOUT = [
+    ['refBeta', 'refEnergy', 'refTOF', 'KE', 'TOF', 'energyOffset', 'TOFOffset'],
+    ['x', 'xp', 'y', 'yp'],
+    ['alphaX', 'betaX', 'alphaY', 'betaY', 'alphaZ', 'betaZ'],
+    ['alphaZDeg', 'betaZDeg', 'emitZDeg', 'frequency'],
+    ['dPhi', 'dW', 'r12Z', 'emitZ', 'particlesLeft'],
+    ['xSize', 'xpSize', 'r12X', 'normEmitX', 'nonNormEmitX'],
+    ['ySize', 'ypSize', 'r12Y', 'normEmitY', 'nonNormEmitY'],
+]
+# A number that Fortran couldn't fit in the width of its field is printed as
+# asterisks, possibly running into the previous field.
+_OVERFLOW = re.compile(r'[-+]?\*+')
+
+EMIT_CARD_DTYPE = np.dtype([(name, np.float64) for line in _EMIT_CARD_LAYOUT for name in line])
+"""
+The NumPy structured dtype of the rows returned by ``read_emit_cards``, with one
+``float64`` field per number of an EMIT card: the reference particle (``refBeta``,
+``refEnergy`` in MeV, ``refTOF`` in deg), the centre of gravity (``KE``, ``TOF``,
+``energyOffset``, ``TOFOffset``, and ``x``, ``xp``, ``y``, ``yp`` in mm and mrad),
+the Twiss parameters (``alphaX``, ``betaX``, ``alphaY``, ``betaY``, ``alphaZ``,
+``betaZ``, and ``alphaZDeg``, ``betaZDeg``, ``emitZDeg``, with the RF
+``frequency``), the longitudinal (``dPhi`` in deg, ``dW`` in keV, ``r12Z``,
+``emitZ`` in keV.ns) and transverse (``xSize``, ``xpSize``, ``r12X``,
+``normEmitX``, ``nonNormEmitX``, and likewise for ``y``) phase spaces, and the
+number of ``particlesLeft``.
+"""
+
+
+def _default_directory(directory):
+    if directory is None:
+        directory = getattr(_batch_settings, 'directory', None)
+    return directory or '.'
+
+
+def _numbers(line, count):
+    # Any other token that doesn't start like a number is a unit or a label.
+    tokens = []
+    for token in _OVERFLOW.sub(' * ', line).split():
+        if token == '*':
+            tokens.append('nan')
+        elif token[0] in '0123456789.+-':
+            tokens.append(token)
+    tokens = tokens[:count]
+    return tokens + ['nan'] * (count - len(tokens))
+
+
+def iter_emit_card_lines(f):
+    """
+    Yield the numerical tokens of each EMIT card in the open ``dynac.short`` file
+    ``f``, as a flat list of strings, reading the file one line at a time.  A
+    number missing from a card, or printed as asterisks (as Fortran does when it
+    doesn't fit in its field), is given as ``'nan'``, and a card cut short by the
+    end of the file is skipped.
+    """
+    for line in f:
+        if _EMIT_CARD_MARKER not in line:
+            continue
+        tokens = []
+        for names in _EMIT_CARD_LAYOUT:
+            line = f.readline()
+            if not line:
+                return
+            tokens.extend(_numbers(line, len(names)))
+        yield tokens
+
+
+def read_emit_cards(directory=None):
+    """
+    Read every EMIT card of the ``dynac.short`` file in ``directory`` (by default,
+    the directory of the current iteration, when called from an iteration of a
+    batch run with the thread backend of ``Core.map_pynac``, and otherwise the
+    current directory), and return them as a NumPy structured array of dtype
+    ``EMIT_CARD_DTYPE``, with one row per card, in the order of the lattice.
+
+    The file is read in a single pass, and all of the numbers are converted to
+    floats at once, so this is much cheaper than building a ``Core.PhaseSpace``
+    per card (see ``Core.make_phase_space_list``).
+    """
+    with open(os.path.join(_default_directory(directory), 'dynac.short')) as f:
+        tokens = [t for card in iter_emit_card_lines(f) for t in card]
+    values = np.array(tokens, dtype=np.float64)
+    return values.view(EMIT_CARD_DTYPE)
+
+
+# The names of the columns of dynac.print, by their heading in the file.
+_PRINT_COLUMNS = {
+    'ELEMENT': 'dynacType',
+    'l(m)': 'l',
+    'x(mm)': 'x',
+    'y(mm)': 'y',
+    'z(deg)': 'zDeg',
+    'z(mm)': 'zMM',
+    'Ex,n,RMS(mm.mrd)': 'emitX',
+    'Ey,n,RMS(mm.mrd)': 'emitY',
+    'Ez,RMS(KeV.ns)': 'emitZ',
+    'Wcog(MeV)': 'Wcog',
+    '#particles': 'particles',
+    'xmin(mm)': 'xMin',
+    'xmax(mm)': 'xMax',
+    'ymin(mm)': 'yMin',
+    'ymax(mm)': 'yMax',
+    'tmin(s)': 'tMin',
+    'tmax(s)': 'tMax',
+    'phmin(deg)': 'phMin',
+    'phmax(deg)': 'phMax',
+    'Wmin(MeV)': 'WMin',
+    'Wmax(MeV)': 'WMax',
+    'Dx(m)': 'Dx',
+    'Dy(m)': 'Dy',
+    'dW(MeV)': 'dW',
+    'Wref(MeV)': 'Wref',
+    'Tref(s)': 'Tref',
+    'Tcog(s)': 'Tcog',
+    'xbar(mm)': 'xBar',
+    'ybar(mm)': 'yBar',
+}
+
+
+def _print_dtype(headings, type_width):
+    fields = []
+    for heading in headings:
+        name = _PRINT_COLUMNS.get(heading) or re.sub(r'\W', '', heading.split('(')[0]) or 'column'
+        while name in [f[0] for f in fields]:
+            name += '_'
+        if name == 'dynacType':
+            fields.append((name, 'U%d' % type_width))
+        elif name == 'particles':
+            fields.append((name, np.int64))
+        else:
+            fields.append((name, np.float64))
+    return np.dtype(fields)
+
+
+def parse_print_table(f):
+    """
+    Parse the open ``dynac.print`` file ``f`` into a NumPy structured array with
+    one row per element, as for ``read_print_table``.  ``ValueError`` is raised,
+    naming the line, if a row doesn't have one value per heading.
+    """
+    headings = f.readline().split()
+    if headings[:1] == ['#']:
+        headings = headings[1:]
+    rows = []
+    for num, line in enumerate(f, 2):
+        row = line.split()
+        if not row:
+            continue
+        if len(row) != len(headings):
+            raise ValueError('Line %d of %s has %d values, rather than %d: %r'
+                             % (num, getattr(f, 'name', 'dynac.print'), len(row), len(headings), line.strip()))
+        rows.append(row)
+    table = np.array(rows, dtype=str).reshape(-1, len(headings))
+    out = np.empty(len(table), dtype=_print_dtype(headings, max(1, table.dtype.itemsize // 4)))
+    for column, name in enumerate(out.dtype.names):
+        out[name] = table[:, column]
+    return out
+
+
+def read_print_table(directory=None, cache=False):
+    """
+    Read the table of the ``dynac.print`` file in ``directory`` (by default, as for
+    ``read_emit_cards``), which has one row per element, and return it as a NumPy
+    structured array, with a field per column: the Dynac type of the element
+    (``dynacType``), its position (``l``, in m), the beam sizes (``x``, ``y``,
+    ``zDeg``, ``zMM``), the RMS emittances (``emitX``, ``emitY``, ``emitZ``), the
+    energy (``Wcog``), the number of ``particles`` (an integer), and so on (see
+    ``_PRINT_COLUMNS`` for all of them).
+
+    The file is split in one go, and each column is converted by NumPy as a whole,
+    with no Python-level conversion of single values.
+
+    If ``cache`` is true, the array is also saved, next to ``dynac.print``, to a
+    ``dynac.print.npy`` file, which later calls memory-map (read-only) instead of
+    parsing the table again, for as long as ``dynac.print`` is not rewritten.
+    """
+    directory = _default_directory(directory)
+    filename = os.path.join(directory, 'dynac.print')
+    if not cache:
+        with open(filename) as f:
+            return parse_print_table(f)
+    cache_file = filename + '.npy'
+    mtime = os.stat(filename).st_mtime_ns
+    try:
+        if os.stat(cache_file).st_mtime_ns == mtime:
+            return np.load(cache_file, mmap_mode='r')
+    except (OSError, ValueError):
+        pass
+    with open(filename) as f:
+        table = parse_print_table(f)
+    # Written atomically, with the modification time of dynac.print, which marks
+    # the cache as being up to date.
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    except OSError:
+        return table
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, table)
+        os.utime(tmp_path, ns=(mtime, mtime))
+        os.replace(tmp_path, cache_file)
+    except OSError:
+        os.remove(tmp_path)
+        return table
+    return np.load(cache_file, mmap_mode='r')
+
+
+def _dump_section(lines):
+    headings = lines[0].split()[1:]
+    rows = [line for line in lines[2:] if line.strip()]
+    if not rows:
+        return {heading: np.empty(0) for heading in headings}
+    num_columns = len(rows[0].split())
+    table = np.array(''.join(rows).split(), dtype=np.float64).reshape(-1, num_columns)
+    names = headings + ['column%d' % i for i in range(len(headings), num_columns)]
+    section = {column: table[:, i] for i, column in enumerate(names[:num_columns])}
+    section[names[0]] = section[names[0]].astype(np.int64)
+    return section
+
+
+def parse_dump(f):
+    """
+    Parse the open ``dynac.dmp`` file ``f``, as for ``read_dump``.
+    """
+    dump = {}
+    name = None
+    lines = []
+    for line in f:
+        if line.lstrip().startswith('#') and line.rstrip().endswith('.dmp'):
+            if name is not None:
+                dump[name] = _dump_section(lines)
+            name = line.split()[-1][:-len('.dmp')]
+            lines = []
+        else:
+            lines.append(line)
+    if name is not None:
+        dump[name] = _dump_section(lines)
+    return dump
+
+
+def read_dump(directory=None):
+    """
+    Read the ``dynac.dmp`` file in ``directory`` (by default, as for
+    ``read_emit_cards``), which holds a table of the bunchers, cavity gaps and cavities of
+    the lattice, with one row per cavity.  Return a dictionary keyed by the name of
+    each table (e.g., ``'buncher'``, ``'gap'`` and ``'cavmc'``), of dictionaries
+    of NumPy arrays, keyed by the headings of the columns of that table (e.g.,
+    ``'Z'``, ``'trans'``, ``'PHIs'``, ``'Wcog'``, ``'Ex,RMS,n'`` and
+    ``'EffVolt'``).  The first column, the number of the cavity, is an integer
+    array, and any column without a heading is named by its position (e.g.,
+    ``'column13'``).
+
+    Each table is converted to floats in one go, so this also works as the
+    ``extractor`` of ``Core.map_pynac``, followed by ``stack_dumps``.
+    """
+    with open(os.path.join(_default_directory(directory), 'dynac.dmp')) as f:
+        return parse_dump(f)
+
+
+def stack_dumps(dumps):
+    """
+    Stack the results of ``read_dump`` for many runs (e.g., the seeds of an error
+    study) into a single dictionary of the same layout, in which each column is a
+    2-D float array with one row per run, so that statistics over the runs are a
+    single reduction along the first axis (e.g., ``np.std(stacked['cavmc']['PHIs'],
+    axis=0)``).  A table with fewer rows in some runs (e.g., because they lost
+    their beam) is padded with NaN, as is a table or column missing from some
+    runs altogether (e.g., because they lost their beam before the first cavity).
+    """
+    dumps = list(dumps)
+    # The tables and columns of every run, in the order they are first seen.
+    names = {}
+    for dump in dumps:
+        for name, table in dump.items():
+            names.setdefault(name, {}).update(dict.fromkeys(table))
+    stacked = {}
+    empty = np.empty(0)
+    for name, columns in names.items():
+        stacked[name] = {}
+        for column in columns:
+            values = [dump.get(name, {}).get(column, empty) for dump in dumps]
+            out = np.full((len(values), max(len(v) for v in values)), np.nan)
+            for row, v in enumerate(values):
+                out[row, :len(v)] = v
+            stacked[name][column] = out
+    return stacked
+
+
+def read_dumps(directories):
+    """
+    Read the ``dynac.dmp`` file of each of ``directories``, and return them stacked
+    by ``stack_dumps``.
+    """
+    return stack_dumps(read_dump(directory) for directory in directories)
@@ -3,7 +3,153 @@ from bokeh.plotting import figure
 from bokeh.layouts import gridplot, column, row
 from bokeh.models.sources import ColumnDataSource
 from bokeh.models import BoxSelectTool
-from collections import defaultdict
+from bokeh.core.properties import without_property_validation
+from collections import defaultdict, deque
+from itertools import islice
+import json
+import os
+import numpy as np
+from Pynac.DataClasses import EmitPlotEntry
+
+# The layout of each type of plot in emit.plot, following the line giving its type:
+# 'title' and 'line' are single lines (a title, and axis limits or a separator),
+# and (name, numLines) is a block of pairs of numbers, whose number of lines is
+# given on the line before it if numLines is None.
+_PLOT_LAYOUTS = {
+    1: [
+        'title', 'line', ('horizEllipse', 201), ('horizBeam', None),
+        'line', ('vertEllipse', 201), ('vertBeam', None),
+        'line', 'line', ('longEllipse', 201), ('longBeam', None),
+    ],
+    2: [
+        'title', 'line', ('beamX', None), 'line', ('beamY', None),
+        ('profileX', None), ('profileY', None), ('profileZ', None),
+        ('profileXP', None), ('profileYP', None), ('profileZP', None),
+    ],
+    3: [
+        'title', 'line', ('envelopeX', None), ('envelopeY', None),
+        'line', 'title', 'line', ('energy', None),
+        'line', 'title', 'line', ('phase', None),
+    ],
+}
+
+
+def _pairs_from_lines(lines, numLines, filename):
+    # The whole block of numLines lines is converted in one go, and each of its
+    # two columns is handed back as a contiguous array, ready to be used in a
+    # ColumnDataSource as it is.  A field that Fortran couldn't fit in its width
+    # (printed as asterisks), or any other token that isn't a number, is an error.
+    # A block may be empty (e.g., the beam of a plot once the whole beam is lost).
+    if numLines == 0:
+        return np.empty(0), np.empty(0)
+    try:
+        data = np.array(lines.split(), dtype=np.float64)
+    except ValueError as exc:
+        raise ValueError('Malformed block of %d lines in %s: %s' % (numLines, filename, exc))
+    if data.size < 2 * numLines or data.size % numLines:
+        raise ValueError('Malformed block of %d lines in %s' % (numLines, filename))
+    columns = np.ascontiguousarray(data.reshape(numLines, -1)[:, :2].T)
+    return columns[0], columns[1]
+
+
+class EmitPlotIndex(object):
+    """
+    An index of the plots in the ``emit.plot`` file ``filename``, giving the type,
+    title and byte offset of each plot, and of each of its blocks of numbers, as
+    an ``DataClasses.EmitPlotEntry`` per plot, in the ``plots`` attribute.  It is
+    built in a single pass over the file, without converting any of the numbers,
+    so that any one plot, or block, can then be read by seeking straight to it.
+
+    If ``cache`` is true, the index is also saved next to the file (as
+    ``emit.plot.idx``), and later loaded from there, rather than built again, for
+    as long as the file is not rewritten.
+    """
+    def __init__(self, filename='emit.plot', cache=False):
+        self.filename = filename
+        stat = os.stat(filename)
+        self._stamp = [stat.st_size, stat.st_mtime_ns]
+        self.plots = self._load() if cache else None
+        if self.plots is None:
+            self.plots = self._build()
+            if cache:
+                self._save()
+
+    def __len__(self):
+        return len(self.plots)
+
+    def __getitem__(self, plotNum):
+        return self.plots[plotNum]
+
+    def _build(self):
+        plots = []
+        with open(self.filename, 'rb') as f:
+            for line in iter(f.readline, b''):
+                if not line.strip():
+                    continue
+                plotType = int(line)
+                offset = f.tell()
+                title = None
+                blocks = {}
+                for step in _PLOT_LAYOUTS[plotType]:
+                    if step == 'title' and title is None:
+                        title = f.readline().decode(errors='replace').strip()
+                    elif step in ('title', 'line'):
+                        f.readline()
+                    else:
+                        name, numLines = step
+                        if numLines is None:
+                            numLines = int(f.readline())
+                        blocks[name] = (f.tell(), numLines)
+                        deque(islice(f, numLines), maxlen=0)
+                plots.append(EmitPlotEntry(plotType, title, offset, blocks))
+        return plots
+
+    def _indexFilename(self):
+        return self.filename + '.idx'
+
+    def _load(self):
+        try:
+            with open(self._indexFilename()) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if saved.get('stamp') != self._stamp:
+            return None
+        return [
+            EmitPlotEntry(plotType, title, offset, {name: tuple(block) for name, block in blocks.items()})
+            for plotType, title, offset, blocks in saved['plots']
+        ]
+
+    def _save(self):
+        tmpFilename = self._indexFilename() + '.tmp%d' % os.getpid()
+        try:
+            with open(tmpFilename, 'w') as f:
+                json.dump({'stamp': self._stamp, 'plots': [list(plot) for plot in self.plots]}, f)
+            os.replace(tmpFilename, self._indexFilename())
+        except OSError:
+            pass
+
+    def isCurrent(self):
+        '''
+        Return whether the file is unchanged since the index was built.
+        '''
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            return False
+        return [stat.st_size, stat.st_mtime_ns] == self._stamp
+
+    def readPairs(self, plotNum, name):
+        """
+        Read the block of pairs of numbers ``name`` (e.g., ``'horizBeam'``; see
+        ``_PLOT_LAYOUTS``) of plot number ``plotNum``, and return its two columns as
+        arrays.
+        """
+        offset, numLines = self.plots[plotNum].blocks[name]
+        with open(self.filename, 'rb') as f:
+            f.seek(offset)
+            return _pairs_from_lines(b''.join(islice(f, numLines)), numLines, self.filename)
+
 
 class PynPlt(object):
     '''
@@ -292,15 +438,31 @@ class PynPlt(object):
         show(grid)
 
 class NewPynPlt:
-    def __init__(self, filename='emit.plot'):
+    '''
+    Dynac-style plots of the ``emit.plot`` file ``filename``.
+
+    By default, every plot in the file is parsed on instantiation, and ``plotit``
+    shows them all.  If ``lazy`` is true, nothing is parsed until a single plot is
+    asked for, with ``parsePlot`` or ``plotSingle``, which then only parse that
+    plot, found through an ``EmitPlotIndex`` of the file (saved next to the file if
+    ``cacheIndex`` is true), so the time to show the first plot doesn't depend on
+    how many plots the file holds.
+    '''
+    def __init__(self, filename='emit.plot', lazy=False, cacheIndex=False):
         self.filename = filename
+        self.cacheIndex = cacheIndex
+        self.index = None
         self.plotHandleDict = defaultdict(list)
         self.emitgrColumnData = []
         self.profgrColumnData = []
         self.envelColumnData = []
 
-        self.parseAndOrganise()
+        if not lazy:
+            self.parseAndOrganise()
 
+    # The data of the ColumnDataSources are arrays of floats just parsed, so Bokeh's
+    # check of every one of their elements is skipped.
+    @without_property_validation
     def parseAndOrganise(self):
         parsedData = self._parseEmitPlot()
 
@@ -324,81 +486,121 @@ class NewPynPlt:
                 self.emitgrColumnData[ind]['beam'].data['z'] = beamData['z']
                 self.emitgrColumnData[ind]['beam'].data['zp'] = beamData['zp']
             except IndexError:
-                self.emitgrColumnData.append({
-                    'plotTitle': plotData['plotTitle'],
-                    'horizEllipse': ColumnDataSource(data=dict(
-                        x = hEllipseData['x'],
-                        xp = hEllipseData['xp']
-                    )),
-                    'vertEllipse': ColumnDataSource(data=dict(
-                        y = vEllipseData['y'],
-                        yp = vEllipseData['yp']
-                    )),
-                    'longEllipse': ColumnDataSource(data=dict(
-                        z = lEllipseData['z'],
-                        zp = lEllipseData['zp']
-                    )),
-                    'beam': ColumnDataSource(data=dict(
-                        x = beamData['x'],
-                        xp = beamData['xp'],
-                        y = beamData['y'],
-                        yp = beamData['yp'],
-                        z = beamData['z'],
-                        zp = beamData['zp'],
-                    ))
-                })
+                self.emitgrColumnData.append(self._emitgrColumnData(plotData))
 
         for ind, plotData in enumerate(parsedData[2]):
-            normedProfs = plotData['normedProfiles']
             try:
                 raise IndexError
             except IndexError:
-                self.profgrColumnData.append({
-                    'beam': ColumnDataSource(data=dict(
-                        x = plotData['beamDict']['x'],
-                        y = plotData['beamDict']['y'],
-                        z = plotData['beamDict']['z'],
-                    )),
-                    'normedProfX': ColumnDataSource(data=dict(
-                        x = normedProfs['x'],
-                        xval = normedProfs['xval'],
-                    )),
-                    'normedProfY': ColumnDataSource(data=dict(
-                        y = normedProfs['y'],
-                        yval = normedProfs['yval'],
-                    )),
-                    'normedProfZ': ColumnDataSource(data=dict(
-                        z = normedProfs['z'],
-                        zval = normedProfs['zval'],
-                    )),
-                    'normedProfXP': ColumnDataSource(data=dict(
-                        xp = normedProfs['xp'],
-                        xpval = normedProfs['xpval'],
-                    )),
-                    'normedProfYP': ColumnDataSource(data=dict(
-                        yp = normedProfs['yp'],
-                        ypval = normedProfs['ypval'],
-                    )),
-                    'normedProfZP': ColumnDataSource(data=dict(
-                        zp = normedProfs['zp'],
-                        zpval = normedProfs['zpval'],
-                    )),
-                })
+                self.profgrColumnData.append(self._profgrColumnData(plotData))
 
         for ind, plotData in enumerate(parsedData[3]):
-            beamEnv = plotData['envelopes']
             try:
                 raise IndexError
             except IndexError:
-                self.envelColumnData.append({
-                    'envelopes': ColumnDataSource(data=dict(
-                        s = beamEnv['s'],
-                        x = beamEnv['x'],
-                        y = beamEnv['y'],
-                        w = beamEnv['dW/W'],
-                        phase = beamEnv['phi'],
-                    ))
-                })
+                self.envelColumnData.append(self._envelColumnData(plotData))
+
+    @without_property_validation
+    def _emitgrColumnData(self, plotData):
+        hEllipseData = plotData['horizEllipse']
+        vEllipseData = plotData['vertEllipse']
+        lEllipseData = plotData['longEllipse']
+        beamData = plotData['beamDict']
+        return {
+            'plotTitle': plotData['plotTitle'],
+            'horizEllipse': ColumnDataSource(data=dict(
+                x = hEllipseData['x'],
+                xp = hEllipseData['xp']
+            )),
+            'vertEllipse': ColumnDataSource(data=dict(
+                y = vEllipseData['y'],
+                yp = vEllipseData['yp']
+            )),
+            'longEllipse': ColumnDataSource(data=dict(
+                z = lEllipseData['z'],
+                zp = lEllipseData['zp']
+            )),
+            'beam': ColumnDataSource(data=dict(
+                x = beamData['x'],
+                xp = beamData['xp'],
+                y = beamData['y'],
+                yp = beamData['yp'],
+                z = beamData['z'],
+                zp = beamData['zp'],
+            ))
+        }
+
+    @without_property_validation
+    def _profgrColumnData(self, plotData):
+        normedProfs = plotData['normedProfiles']
+        return {
+            'beam': ColumnDataSource(data=dict(
+                x = plotData['beamDict']['x'],
+                y = plotData['beamDict']['y'],
+                z = plotData['beamDict']['z'],
+            )),
+            'normedProfX': ColumnDataSource(data=dict(
+                x = normedProfs['x'],
+                xval = normedProfs['xval'],
+            )),
+            'normedProfY': ColumnDataSource(data=dict(
+                y = normedProfs['y'],
+                yval = normedProfs['yval'],
+            )),
+            'normedProfZ': ColumnDataSource(data=dict(
+                z = normedProfs['z'],
+                zval = normedProfs['zval'],
+            )),
+            'normedProfXP': ColumnDataSource(data=dict(
+                xp = normedProfs['xp'],
+                xpval = normedProfs['xpval'],
+            )),
+            'normedProfYP': ColumnDataSource(data=dict(
+                yp = normedProfs['yp'],
+                ypval = normedProfs['ypval'],
+            )),
+            'normedProfZP': ColumnDataSource(data=dict(
+                zp = normedProfs['zp'],
+                zpval = normedProfs['zpval'],
+            )),
+        }
+
+    @without_property_validation
+    def _envelColumnData(self, plotData):
+        beamEnv = plotData['envelopes']
+        return {
+            'envelopes': ColumnDataSource(data=dict(
+                s = beamEnv['s'],
+                x = beamEnv['x'],
+                y = beamEnv['y'],
+                w = beamEnv['dW/W'],
+                phase = beamEnv['phi'],
+            ))
+        }
+
+    def parsePlot(self, plotNum):
+        '''
+        Parse plot number ``plotNum`` of the file on its own, by seeking straight
+        to it, and return its type (1 for EMITGR, 2 for PROFGR, 3 for ENVEL) and its
+        parsed data.
+        '''
+        if self.index is None or not self.index.isCurrent():
+            self.index = EmitPlotIndex(self.filename, cache=self.cacheIndex)
+        entry = self.index[plotNum]
+        with open(self.filename) as self.emitPlotFile:
+            self.emitPlotFile.seek(entry.offset)
+            return entry.plotType, self._plotTypeDefs()[entry.plotType]()
+
+    def plotSingle(self, plotNum):
+        '''
+        Parse and show plot number ``plotNum`` of the file alone (see ``parsePlot``).
+        '''
+        plotType, plotData = self.parsePlot(plotNum)
+        if plotType == 1:
+            return self._showEMITGR(self._emitgrColumnData(plotData))
+        if plotType == 2:
+            return self._showPROFGR(self._profgrColumnData(plotData))
+        return self._showENVEL(self._envelColumnData(plotData))
 
     def plotit(self):
         for i in range(len(self.emitgrColumnData)):
@@ -421,7 +623,10 @@ class NewPynPlt:
                 self.plotHandleDict['profgrHandle'].append(self.plotPROFGR(i))
 
     def plotEMITGR(self, plotInd):
-        fig0 = figure(title=self.emitgrColumnData[plotInd]['plotTitle'],
+        return self._showEMITGR(self.emitgrColumnData[plotInd])
+
+    def _showEMITGR(self, columnData):
+        fig0 = figure(title=columnData['plotTitle'],
                       plot_height=400, plot_width=400)
         fig0.add_tools(BoxSelectTool())
         fig1 = figure(plot_height=400, plot_width=400)
@@ -432,25 +637,28 @@ class NewPynPlt:
         fig3.add_tools(BoxSelectTool())
 
         fig0.circle('x', 'xp', color="#2222aa", alpha=0.5,
-                    line_width=2, source=self.emitgrColumnData[plotInd]['beam'])
+                    line_width=2, source=columnData['beam'])
         fig0.line('x', 'xp', line_width=2, color='red',
-                    source=self.emitgrColumnData[plotInd]['horizEllipse'])
+                    source=columnData['horizEllipse'])
         fig1.circle('y', 'yp', color="#2222aa", alpha=0.5,
-                    line_width=2, source=self.emitgrColumnData[plotInd]['beam'])
+                    line_width=2, source=columnData['beam'])
         fig1.line('y', 'yp', line_width=2, color='red',
-                    source=self.emitgrColumnData[plotInd]['vertEllipse'])
+                    source=columnData['vertEllipse'])
         fig2.circle('x', 'y', color="#2222aa", alpha=0.5,
-                    line_width=2, source=self.emitgrColumnData[plotInd]['beam'])
+                    line_width=2, source=columnData['beam'])
         fig3.circle('z', 'zp', color="#2222aa", alpha=0.5,
-                    line_width=2, source=self.emitgrColumnData[plotInd]['beam'])
+                    line_width=2, source=columnData['beam'])
         fig3.line('z', 'zp', line_width=2, color='red',
-                    source=self.emitgrColumnData[plotInd]['longEllipse'])
+                    source=columnData['longEllipse'])
 
         grid = gridplot([fig0, fig1], [fig2, fig3])
 
         return show(grid, notebook_handle=True)
 
     def plotPROFGR(self, plotInd):
+        return self._showPROFGR(self.profgrColumnData[plotInd])
+
+    def _showPROFGR(self, columnData):
         fig0 = figure(plot_height=400, plot_width=400)
         fig0.add_tools(BoxSelectTool())
         fig1 = figure(plot_height=400, plot_width=400)
@@ -461,42 +669,48 @@ class NewPynPlt:
         fig3.add_tools(BoxSelectTool())
 
         fig0.circle('z', 'x', color="#2222aa", alpha=0.5,
-            line_width=2, source=self.profgrColumnData[plotInd]['beam'])
+            line_width=2, source=columnData['beam'])
         fig1.circle('z', 'y', color="#2222aa", alpha=0.5,
-            line_width=2, source=self.profgrColumnData[plotInd]['beam'])
-        fig2.line('x', 'xval', color='red', source=self.profgrColumnData[plotInd]['normedProfX'])
-        fig2.line('y', 'yval', color='green', source=self.profgrColumnData[plotInd]['normedProfY'])
-        fig2.line('z', 'zval', color='blue', source=self.profgrColumnData[plotInd]['normedProfZ'])
-        fig3.line('xp', 'xpval', color='red', source=self.profgrColumnData[plotInd]['normedProfXP'])
-        fig3.line('yp', 'ypval', color='green', source=self.profgrColumnData[plotInd]['normedProfYP'])
-        fig3.line('zp', 'zpval', color='blue', source=self.profgrColumnData[plotInd]['normedProfZP'])
+            line_width=2, source=columnData['beam'])
+        fig2.line('x', 'xval', color='red', source=columnData['normedProfX'])
+        fig2.line('y', 'yval', color='green', source=columnData['normedProfY'])
+        fig2.line('z', 'zval', color='blue', source=columnData['normedProfZ'])
+        fig3.line('xp', 'xpval', color='red', source=columnData['normedProfXP'])
+        fig3.line('yp', 'ypval', color='green', source=columnData['normedProfYP'])
+        fig3.line('zp', 'zpval', color='blue', source=columnData['normedProfZP'])
 
         grid = gridplot([fig0, fig1], [fig2, fig3])
 
         return show(grid, notebook_handle=True)
 
     def plotENVEL(self, plotInd):
+        return self._showENVEL(self.envelColumnData[plotInd])
+
+    def _showENVEL(self, columnData):
         fig0 = figure(plot_height=400, plot_width=800)
         fig0.add_tools(BoxSelectTool())
         fig1 = figure(plot_height=400, plot_width=800)
         fig1.add_tools(BoxSelectTool())
         fig2 = figure(plot_height=400, plot_width=800)
-        fig0.line('s', 'x', color='blue', line_width=1, source=self.envelColumnData[plotInd]['envelopes'])
-        fig0.line('s', 'y', color='green', line_width=1, source=self.envelColumnData[plotInd]['envelopes'])
-        fig1.line('s', 'w', color='blue', line_width=1, source=self.envelColumnData[plotInd]['envelopes'])
-        fig2.line('s', 'phase', color='blue', line_width=1, source=self.envelColumnData[plotInd]['envelopes'])
+        fig0.line('s', 'x', color='blue', line_width=1, source=columnData['envelopes'])
+        fig0.line('s', 'y', color='green', line_width=1, source=columnData['envelopes'])
+        fig1.line('s', 'w', color='blue', line_width=1, source=columnData['envelopes'])
+        fig2.line('s', 'phase', color='blue', line_width=1, source=columnData['envelopes'])
 
         grid = gridplot([fig0], [fig1], [fig2])
 
         return show(grid, notebook_handle=True)
 
-    def _parseEmitPlot(self):
-        plotTypeDefs = {
+    def _plotTypeDefs(self):
+        return {
             1: self._parseEMITGRdata,
             2: self._parsePROFGRdata,
             3: self._parseENVELdata
         }
 
+    def _parseEmitPlot(self):
+        plotTypeDefs = self._plotTypeDefs()
+
         plotData = {1: [], 2: [], 3: []}
 
         with open(self.filename) as self.emitPlotFile:
@@ -597,9 +811,6 @@ class NewPynPlt:
         return output
 
     def _getPairDataFromFile(self, x1, x2, numLines=201):
-        dataDict = {x1: [], x2: []}
-        for _ in range(numLines):
-            datum = [float(i) for i in self.emitPlotFile.readline().strip().split()]
-            dataDict[x1].append(datum[0])
-            dataDict[x2].append(datum[1])
-        return dataDict
+        block = ''.join(islice(self.emitPlotFile, numLines))
+        data1, data2 = _pairs_from_lines(block, numLines, self.filename)
+        return {x1: data1, x2: data2}
@@ -0,0 +1,10 @@
+"""
+Settings of the batch (see ``Core.map_pynac``) that the calling thread is running
+an iteration of, which take the place of process-wide settings (e.g., the working
+directory) so that several iterations can run at once in one process.  They are
+set by ``Core``, and read by both ``Core`` and the readers of ``Output``, which
+default to the directory of the iteration.
+"""
+import threading
+
+settings = threading.local()
@@ -0,0 +1,58 @@
+"""
+Benchmark of the per-iteration overhead of the two backends of
+``Core.map_pynac``: a ProcessPool, in which every worker is a full Python
+interpreter, against a ThreadPool driving the Dynac subprocesses directly.  The
+lattice is the zero-length beam-generation lattice used by ``Core.Builder``, so
+the time of each iteration is dominated by the batch machinery and by starting
+Dynac, rather than by the simulation itself.
+
+Requires ``dynacv6_0`` to be on the ``PATH``.  Run from the repository root with::
+
+    python benchmarks/batch_backends.py [iterations] [workers]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from Pynac.Core import Pynac, map_pynac
+
+TRIVIAL_LATTICE = [
+    ['GEBEAM', [
+        [4, 1],
+        [352.21e6, 1000],
+        [0.0, 0.0, 0.0, 0.0, 0.0, 0.0],
+        [0.0, 7.5, 0.5],
+        [0.0, 7.5, 0.5],
+        [0.0, 7.5, 500.0],
+    ]],
+    ['INPUT', [[938.27231, 1.0, 1.0], [3.6223537, 0.0]]],
+    ['REFCOG', [[0]]],
+    ['STOP', []],
+]
+
+
+def run_trivial_lattice(item):
+    Pynac.from_lattice('Zero-length lattice', TRIVIAL_LATTICE).run()
+
+
+def main(iterations=200, workers=4):
+    cwd = os.getcwd()
+    tmp_dir = tempfile.mkdtemp()
+    os.chdir(tmp_dir)
+    try:
+        for backend in ['process', 'thread']:
+            start = time.monotonic()
+            results = list(map_pynac(run_trivial_lattice, range(iterations), max_workers=workers,
+                                     backend=backend))
+            elapsed = time.monotonic() - start
+            errors = sum(1 for r in results if r.error is not None)
+            print('%-8s %8.2f ms/iteration (%d errors)' % (backend, 1e3 * elapsed / iterations, errors))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:3]])
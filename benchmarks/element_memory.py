@@ -0,0 +1,51 @@
+"""
+Memory benchmark of the element classes of ``Pynac.Elements``.
+
+The ESS deck is parsed, and the memory allocated for its lattice and for a number
+of independent copies of it (as kept when holding many perturbed lattices for an
+error study) is measured with ``tracemalloc``.
+
+Run from the repository root with::
+
+    python benchmarks/element_memory.py [deck] [copies]
+"""
+import copy
+import os
+import sys
+import tracemalloc
+from collections import Counter
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from Pynac.Core import Pynac
+
+DEFAULT_DECK = os.path.join(os.path.dirname(__file__), '..', 'tests', 'ESS_with_SC_ana.in')
+
+
+def traced_size(func):
+    """
+    Return the result of ``func()`` and the memory allocated by it that is still
+    held when it returns.
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = func()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def main(deck=DEFAULT_DECK, copies=100):
+    pyn = Pynac(deck)
+    counts = Counter(type(ele).__name__ for ele in pyn.lattice if not isinstance(ele, list))
+    print('Elements: ' + ', '.join('%d %s' % (n, name) for name, n in counts.most_common()))
+
+    for name in counts:
+        objs = [ele for ele in pyn.lattice if type(ele).__name__ == name]
+        _, size = traced_size(lambda: copy.deepcopy(objs))
+        print('%-18s %6.0f bytes/element' % (name, float(size) / len(objs)))
+
+    _, size = traced_size(lambda: [copy.deepcopy(pyn.lattice) for _ in range(copies)])
+    print('%d lattice copies: %.1f MiB (%.0f kiB per lattice)' % (copies, size / 2.**20, size / 1024. / copies))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *[int(i) for i in sys.argv[2:3]])
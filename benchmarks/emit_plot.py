@@ -0,0 +1,78 @@
+"""
+Benchmark of parsing an ``emit.plot`` file with ``Plotting.NewPynPlt``, against a
+reader that converts the file one point at a time (with a ``readline``, a
+``split`` and a ``float`` per value), as ``NewPynPlt`` used to.  The file holds
+one ``EMITGR`` and one ``PROFGR`` plot of a bunch of many particles (by default,
+100,000), in the layout written by Dynac.
+
+Run from the repository root with::
+
+    python benchmarks/emit_plot.py [particles]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from Pynac.Plotting import NewPynPlt
+
+
+def _write_pairs(f, data):
+    f.write(''.join('  %.17g  %.17g\n' % (a, b) for a, b in data))
+
+
+def write_emit_plot(filename, particles, rng):
+    """
+    Write a synthetic ``emit.plot`` with an ``EMITGR`` and a ``PROFGR`` plot of
+    ``particles`` particles.
+    """
+    with open(filename, 'w') as f:
+        f.write('           1\n EMITGR BENCHMARK\n -1 1 -1 1\n')
+        for plane in range(3):
+            if plane == 2:
+                f.write(' skipped\n -1 1 -1 1\n')
+            elif plane == 1:
+                f.write(' -1 1 -1 1\n')
+            _write_pairs(f, rng.normal(size=(201, 2)))
+            f.write('  %10d\n' % particles)
+            _write_pairs(f, rng.normal(size=(particles, 2)))
+        f.write('           2\n PROFGR BENCHMARK\n -1 1 -1 1\n')
+        f.write('  %10d\n' % particles)
+        _write_pairs(f, rng.normal(size=(particles, 2)))
+        f.write(' -1 1 -1 1\n  %10d\n' % particles)
+        _write_pairs(f, rng.normal(size=(particles, 2)))
+        for _ in range(6):
+            f.write('  %10d\n' % 102)
+            _write_pairs(f, rng.normal(size=(102, 2)))
+
+
+class PointByPointPynPlt(NewPynPlt):
+    """
+    ``NewPynPlt`` with its former reader of blocks of pairs of numbers.
+    """
+    def _getPairDataFromFile(self, x1, x2, numLines=201):
+        dataDict = {x1: [], x2: []}
+        for _ in range(numLines):
+            datum = [float(i) for i in self.emitPlotFile.readline().strip().split()]
+            dataDict[x1].append(datum[0])
+            dataDict[x2].append(datum[1])
+        return dataDict
+
+
+def main(particles=100000):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tmp_dir, 'emit.plot')
+        write_emit_plot(filename, particles, np.random.default_rng(0))
+        for label, parse in [('per point', PointByPointPynPlt), ('bulk', NewPynPlt)]:
+            start = time.perf_counter()
+            parse(filename)
+            print('%-10s %8.1f ms' % (label, 1e3 * (time.perf_counter() - start)))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:2]])
@@ -0,0 +1,65 @@
+"""
+Benchmark of sending the ESS deck to Dynac: the original line-by-line writes
+against rendering the whole deck once (``Pynac.render``) and writing it in a
+single call.  Writes go to an unbuffered ``os.devnull``, which has the same
+per-write system call cost as an unbuffered pipe, but no reader.
+
+The last case re-renders the deck after perturbing every quad, cavity and
+steerer, as in one Monte Carlo seed, so that only those elements are formatted
+again and the text of all others comes from the render cache.
+
+Run from the repository root with::
+
+    python benchmarks/render_deck.py [deck] [repeats]
+"""
+import os
+import sys
+import timeit
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from Pynac.Core import Pynac
+
+DEFAULT_DECK = os.path.join(os.path.dirname(__file__), '..', 'tests', 'ESS_with_SC_ana.in')
+
+
+def write_line_by_line(pyn, out):
+    """
+    The writing loop of ``Pynac.run`` before the deck was rendered in one go (and
+    before element text was cached).
+    """
+    out.write((pyn.name + '\r\n').encode())
+    for pynEle in pyn.lattice:
+        try:
+            ele = pynEle.dynacRepresentation()
+        except AttributeError:
+            ele = pynEle
+        out.write((ele[0] + '\r\n').encode())
+        for datum in ele[1]:
+            out.write((' '.join([str(i) for i in datum]) + '\r\n').encode())
+
+
+def main(deck=DEFAULT_DECK, repeats=20):
+    pyn = Pynac(deck)
+    quads, cavs, steerers = pyn.get_x_objs('QUADRUPO'), pyn.get_x_objs('CAVMC'), pyn.get_x_objs('STEER')
+
+    def perturb_and_render():
+        for quad in quads:
+            quad.scaleField(1.0)
+        for cav in cavs:
+            cav.adjustPhase(0.0)
+        for steerer in steerers:
+            steerer.setField(steerer.field_strength.val)
+        return pyn.render()
+
+    with open(os.devnull, 'wb', buffering=0) as out:
+        runs = [
+            ('line-by-line', lambda: write_line_by_line(pyn, out)),
+            ('one-shot', lambda: out.write(pyn.render())),
+            ('perturbed seed', lambda: out.write(perturb_and_render())),
+        ]
+        for label, func in runs:
+            best = min(timeit.repeat(func, number=1, repeat=repeats))
+            print('%-24s %8.2f ms/deck' % (label, 1e3 * best))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *[int(i) for i in sys.argv[2:3]])
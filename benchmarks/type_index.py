@@ -0,0 +1,47 @@
+"""
+Benchmark of lookups by Dynac type (``Pynac.get_x_inds``) using the type index of
+``Lattice.IndexedLattice`` against a scan of the whole lattice.
+
+Run from the repository root with::
+
+    python benchmarks/type_index.py [deck] [repeats]
+"""
+import os
+import sys
+import timeit
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from Pynac.Core import Pynac, dynac_from_ele
+
+DEFAULT_DECK = os.path.join(os.path.dirname(__file__), '..', 'tests', 'ESS_with_SC_ana.in')
+QUERIES = [('QUADRUPO',), ('CAVMC',), ('STEER',), ('EMITGR', 'ENVEL', 'PROFGR')]
+
+
+def scan_x_inds(lattice, *dynac_type):
+    """
+    The lookup as done before the type index existed.
+    """
+    return [i for i, x in enumerate(lattice) for y in dynac_type if dynac_from_ele(x) == y]
+
+
+def main(deck=DEFAULT_DECK, repeats=20):
+    pyn = Pynac(deck)
+    for query in QUERIES:
+        if pyn.get_x_inds(*query) != scan_x_inds(pyn.lattice, *query):
+            raise AssertionError('Index and scan disagree for %s' % (query,))
+
+    def scan():
+        for query in QUERIES:
+            scan_x_inds(pyn.lattice, *query)
+
+    def indexed():
+        for query in QUERIES:
+            pyn.get_x_inds(*query)
+
+    print('%d elements, %d queries per round' % (len(pyn.lattice), len(QUERIES)))
+    for label, func in [('scan', scan), ('indexed', indexed)]:
+        best = min(timeit.repeat(func, number=1, repeat=repeats))
+        print('%-8s %10.1f us/round' % (label, 1e6 * best))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *[int(i) for i in sys.argv[2:3]])
@@ -0,0 +1,49 @@
+"""
+Benchmark of ``Pynac.run`` on the zero-length beam-generation lattice used by
+``Core.Builder``, with and without a ``Core.DynacPool`` of warm Dynac processes.
+For such a short lattice, the time of a run is dominated by starting Dynac and
+waiting for its handshake, which the pool takes out of the run, as long as it has
+time to refill between runs.
+
+Requires ``dynacv6_0`` to be on the ``PATH``.  Run from the repository root with::
+
+    python benchmarks/warm_pool.py [iterations] [pool size] [pause between runs, in ms]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from Pynac.Core import Pynac, DynacPool
+from batch_backends import TRIVIAL_LATTICE
+
+
+def time_runs(pyn, iterations, pool=None, pause=0.0):
+    elapsed = 0.0
+    for _ in range(iterations):
+        # Stands in for the work done between runs (e.g., perturbing the lattice),
+        # during which the pool is refilled.
+        time.sleep(pause)
+        start = time.monotonic()
+        pyn.run(pool=pool)
+        elapsed += time.monotonic() - start
+    return elapsed / iterations
+
+
+def main(iterations=100, size=2, pause_ms=100):
+    cwd = os.getcwd()
+    tmp_dir = tempfile.mkdtemp()
+    os.chdir(tmp_dir)
+    pyn = Pynac.from_lattice('Zero-length lattice', TRIVIAL_LATTICE)
+    try:
+        print('cold     %8.2f ms/run' % (1e3 * time_runs(pyn, iterations, pause=pause_ms / 1e3)))
+        with DynacPool(size, root=tmp_dir) as pool:
+            print('pooled   %8.2f ms/run' % (1e3 * time_runs(pyn, iterations, pool, pause_ms / 1e3)))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:4]])
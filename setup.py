@@ -9,5 +9,6 @@ setup(
   url = 'https://github.com/se-esss-litterbox/Pynac', # use the URL to the github repo
   download_url = 'https://github.com/se-esss-litterbox/Pynac/archive/0.9.7.tar.gz',
   keywords = ['simulation', 'particle', 'dynamics'], # arbitrary keywords
+  python_requires = '>=3.7',
   classifiers = [],
 )
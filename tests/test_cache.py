@@ -0,0 +1,63 @@
+import sys
+sys.path.append('../')
+import unittest
+import os
+import shutil
+import tempfile
+from Pynac.Core import Pynac
+from Pynac.Cache import LatticeCache
+import Pynac.Elements as pyEle
+
+
+class LatticeCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.deck = os.path.join(self.tmpDir, 'ESS_with_SC_ana.in')
+        shutil.copy(os.path.join(os.path.dirname(__file__), 'ESS_with_SC_ana.in'), self.deck)
+        self.cache = LatticeCache(os.path.join(self.tmpDir, 'cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def test_miss_then_hit(self):
+        parsed = Pynac(self.deck, cache=self.cache)
+        self.assertIsNotNone(self.cache.load(self.cache.key(self.deck)))
+        cached = Pynac(self.deck, cache=self.cache)
+        self.assertFalse(hasattr(cached, 'rawData'))
+        self.assertEqual(cached.name, parsed.name)
+        self.assertEqual(len(cached.lattice), len(parsed.lattice))
+        self.assertIsInstance(cached.lattice[cached.get_x_inds('QUADRUPO')[0]], pyEle.Quad)
+
+    def test_edit_invalidates(self):
+        key = self.cache.key(self.deck)
+        Pynac(self.deck, cache=self.cache)
+        with open(self.deck, 'a') as f:
+            f.write('\n')
+        self.assertNotEqual(self.cache.key(self.deck), key)
+        self.assertTrue(hasattr(Pynac(self.deck, cache=self.cache), 'rawData'))
+
+    def test_eviction(self):
+        self.cache.maxBytes = 0
+        Pynac(self.deck, cache=self.cache)
+        self.assertEqual(os.listdir(self.cache.directory), [])
+
+    def test_default_cache_is_next_to_deck(self):
+        Pynac(self.deck, cache=True)
+        self.assertTrue(os.listdir(os.path.join(self.tmpDir, '.pynac_cache')))
+
+    def test_no_cache_by_default(self):
+        os.environ.pop('PYNAC_CACHE_DIR', None)
+        Pynac(self.deck)
+        self.assertFalse(os.path.exists(os.path.join(self.tmpDir, '.pynac_cache')))
+
+    def test_cache_dir_from_environment(self):
+        os.environ['PYNAC_CACHE_DIR'] = self.cache.directory
+        try:
+            Pynac(self.deck)
+        finally:
+            del os.environ['PYNAC_CACHE_DIR']
+        self.assertIsNotNone(self.cache.load(self.cache.key(self.deck)))
+
+
+if __name__ == '__main__':
+    unittest.main()
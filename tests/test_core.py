@@ -1,8 +1,20 @@
 import sys
 sys.path.append('../')
 import unittest
+import asyncio
 import os
-from Pynac.Core import Pynac, get_number_of_particles
+import shutil
+import signal
+import tempfile
+import threading
+import time
+from unittest import mock
+from Pynac.Core import Pynac, get_number_of_particles, multi_async_pynac, multi_process_pynac, total_run_stats
+from Pynac.Core import map_pynac, run_directory, stage_files, bounded_completions
+from concurrent.futures import ThreadPoolExecutor
+from Pynac.Core import DynacError, DynacTimeoutError, DynacCancelledError, DynacPool
+from Pynac.Output import read_print_table
+import Pynac.Core as pynCore
 import Pynac.Elements as pyEle
 
 class PynacTest(unittest.TestCase):
@@ -35,6 +47,576 @@ class PynacTest(unittest.TestCase):
         inds = self.pynacInstance.get_x_inds('RDBEAM')
         self.assertEqual(self.pynacInstance.lattice[inds[0]][1][0][0], 'testfilename.in')
 
+class ParserTest(unittest.TestCase):
+    deck = '\n'.join([
+        'Parser test deck',
+        '; a comment',
+        '',
+        'RDBEAM',
+        'some_beam  file.dst',
+        '0',
+        '352.21    0.',
+        '938.2796 1.',
+        '3.6223537 1E0',
+        'DRIFT',
+        '  -.5e-3',
+        'NEWF',
+        '3.5 1.2.3',
+        'STOP',
+    ]) + '\n'
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.in')
+        with os.fdopen(fd, 'w') as f:
+            f.write(self.deck)
+        self.pynacInstance = Pynac(self.filename)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_name(self):
+        self.assertEqual(self.pynacInstance.name, 'Parser test deck')
+
+    def test_lattice_length(self):
+        self.assertEqual(len(self.pynacInstance.lattice), 4)
+
+    def test_tokenized_types(self):
+        rdbeam = self.pynacInstance.lattice[0]
+        self.assertEqual(rdbeam, ['RDBEAM', [['some_beam file.dst'], [0], [352.21, 0.0], [938.2796, 1.0], [3.6223537, 1.0]]])
+        self.assertIsInstance(rdbeam[1][1][0], int)
+        self.assertIsInstance(rdbeam[1][2][1], float)
+        self.assertEqual(self.pynacInstance.lattice[1].L.val, -0.0005)
+
+    def test_numeric_looking_text_is_kept_whole(self):
+        self.assertEqual(self.pynacInstance.lattice[2], ['NEWF', [['3.5 1.2.3']]])
+
+    def test_reference_deck(self):
+        ref = Pynac(os.path.join(os.path.dirname(__file__), 'ESS_with_SC_ana.in'))
+        self.assertEqual(len(ref.lattice), 1002)
+        self.assertEqual(ref.lattice[0][1][2], [352.21, 0.0])
+
+
+class RenderTest(unittest.TestCase):
+    def setUp(self):
+        self.pynacInstance = Pynac(os.path.join(os.path.dirname(__file__), 'ESS_with_SC_ana.in'))
+
+    def test_render_matches_line_by_line(self):
+        lines = [self.pynacInstance.name]
+        for pynEle in self.pynacInstance.lattice:
+            try:
+                ele = pynEle.dynacRepresentation()
+            except AttributeError:
+                ele = pynEle
+            lines.append(ele[0])
+            lines.extend(' '.join([str(i) for i in datum]) for datum in ele[1])
+        expected = ''.join(line + '\r\n' for line in lines).encode()
+        self.assertEqual(self.pynacInstance.render(), expected)
+        self.assertEqual(self.pynacInstance.deckBuffer, expected)
+
+    def test_write_deck_round_trip(self):
+        fd, filename = tempfile.mkstemp(suffix='.in')
+        os.close(fd)
+        try:
+            self.pynacInstance.write_deck(filename)
+            reloaded = Pynac(filename)
+            self.assertEqual(reloaded.name, self.pynacInstance.name)
+            self.assertEqual(reloaded.render(), self.pynacInstance.render())
+        finally:
+            os.remove(filename)
+
+
+class AsyncPynacTest(unittest.TestCase):
+    def setUp(self):
+        self.deck = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ESS_with_SC_ana.in')
+        self.cwd = os.getcwd()
+        self.tmpDir = tempfile.mkdtemp()
+        os.chdir(self.tmpDir)
+
+    def test_multi_async_pynac(self):
+        pynacs = (Pynac(self.deck) for _ in range(4))
+        result = multi_async_pynac(pynacs, max_concurrent=2)
+        self.assertEqual(result, "No errors encountered")
+        for num in range(4):
+            self.assertTrue(os.path.exists(os.path.join('dynacProc_%04d' % num, 'emit.plot')))
+        self.assertFalse(os.path.exists('emit.plot'))
+
+    def test_multi_async_pynac_stats(self):
+        stats = []
+        multi_async_pynac((Pynac(self.deck) for _ in range(3)), max_concurrent=2, stats=stats)
+        self.assertEqual(len(stats), 3)
+        for s in stats:
+            self.assertGreater(s.wall, 0.0)
+            self.assertGreater(s.user + s.sys, 0.0)
+        total = total_run_stats(stats)
+        self.assertAlmostEqual(total.wall, sum(s.wall for s in stats))
+        self.assertEqual(total.maxRSS, max(s.maxRSS for s in stats))
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpDir)
+
+
+def _run_reference_deck(*args):
+    Pynac(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ESS_with_SC_ana.in')).run()
+
+
+def _fail_on_two(item):
+    if item == 2:
+        raise ValueError(item)
+    _run_reference_deck()
+
+
+def _fail_in_first_directory():
+    if os.path.basename(os.getcwd()) == 'dynacProc_0000':
+        raise ValueError('first iteration')
+    _run_reference_deck()
+
+
+class BoundedCompletionsTest(unittest.TestCase):
+    def test_window_is_bounded(self):
+        consumed = []
+        in_flight = []
+
+        def items():
+            for num in range(20):
+                consumed.append(num)
+                yield num
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            def submit(index, item):
+                return executor.submit(lambda: item * item)
+            results = {}
+            for index, future in bounded_completions(submit, items(), 3):
+                in_flight.append(len(consumed) - len(results))
+                results[index] = future.result()
+        self.assertEqual(results, {num: num * num for num in range(20)})
+        self.assertLessEqual(max(in_flight), 3)
+
+    def test_close_cancels_pending(self):
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            futures = []
+
+            def submit(index, item):
+                futures.append(executor.submit(lambda: item))
+                return futures[-1]
+            completions = bounded_completions(submit, range(100), 5)
+            next(completions)
+            completions.close()
+        self.assertEqual(len(futures), 5)
+        self.assertTrue(all(f.done() for f in futures))
+
+
+class MultiProcessTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpDir = tempfile.mkdtemp()
+        os.chdir(self.tmpDir)
+        with open('input.dat', 'w') as f:
+            f.write('static input')
+
+    def test_reuse_dirs(self):
+        result = multi_process_pynac(['input.dat'], _run_reference_deck, num_iters=6, max_workers=2,
+                                     reuse_dirs=True)
+        self.assertEqual(result, "No errors encountered")
+        dirs = [d for d in os.listdir('.') if d.startswith('dynac')]
+        self.assertTrue(1 <= len(dirs) <= 2)
+        for d in dirs:
+            self.assertTrue(d.startswith('dynacWorker_'))
+            self.assertTrue(os.path.exists(os.path.join(d, 'input.dat')))
+            self.assertTrue(os.path.exists(os.path.join(d, 'emit.plot')))
+
+    def test_failed_iteration_leaves_its_directory(self):
+        result = multi_process_pynac(['input.dat'], _fail_in_first_directory, num_iters=3, max_workers=1)
+        self.assertNotEqual(result, "No errors encountered")
+        self.assertEqual(sorted(d for d in os.listdir('.') if d.startswith('dynac')),
+                         ['dynacProc_0000', 'dynacProc_0001', 'dynacProc_0002'])
+        self.assertTrue(os.path.exists(os.path.join('dynacProc_0002', 'emit.plot')))
+
+    def test_map_pynac(self):
+        results = list(map_pynac(_fail_on_two, range(5), extractor=get_number_of_particles,
+                                 file_list=['input.dat'], max_workers=2))
+        self.assertEqual(sorted(r.index for r in results), list(range(5)))
+        for r in results:
+            if r.index == 2:
+                self.assertIsInstance(r.error, ValueError)
+                self.assertIsNone(r.result)
+            else:
+                self.assertIsNone(r.error)
+                self.assertEqual(r.result, 1000)
+                self.assertGreater(r.stats.wall, 0.0)
+        self.assertEqual(os.listdir('.'), ['input.dat'])
+
+    def test_map_pynac_threads(self):
+        deck = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ESS_with_SC_ana.in')
+        results = list(map_pynac(lambda item: Pynac(deck).run(), range(4), extractor=get_number_of_particles,
+                                 file_list=['input.dat'], max_workers=2, backend='thread'))
+        self.assertEqual(sorted(r.index for r in results), list(range(4)))
+        self.assertEqual([r.result for r in results], [1000] * 4)
+        self.assertTrue(all(r.stats.user + r.stats.sys > 0.0 for r in results))
+        self.assertEqual(os.listdir('.'), ['input.dat'])
+
+    def test_readers_follow_thread_iteration(self):
+        deck = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ESS_with_SC_ana.in')
+
+        def run_and_read(item):
+            Pynac(deck).run()
+            return get_number_of_particles(), len(read_print_table())
+        results = list(map_pynac(run_and_read, range(3), max_workers=2, backend='thread'))
+        self.assertTrue(all(r.error is None for r in results))
+        self.assertEqual({r.result[0] for r in results}, {1000})
+        self.assertEqual(os.listdir('.'), ['input.dat'])
+
+    def test_multi_process_pynac_threads(self):
+        deck = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ESS_with_SC_ana.in')
+        stats = []
+        completed = []
+        result = multi_process_pynac(['input.dat'], lambda: Pynac(deck).run(), num_iters=3, max_workers=2,
+                                     stats=stats, backend='thread', callback=completed.append, max_pending=2)
+        self.assertEqual(result, "No errors encountered")
+        self.assertEqual(len(stats), 3)
+        self.assertEqual(sorted(r.index for r in completed), [0, 1, 2])
+        self.assertEqual([r.stats for r in sorted(completed)], stats)
+        for num in range(3):
+            self.assertTrue(os.path.exists(os.path.join('dynacProc_%04d' % num, 'emit.plot')))
+            self.assertTrue(os.path.exists(os.path.join('dynacProc_%04d' % num, 'input.dat')))
+        self.assertFalse(os.path.exists('emit.plot'))
+
+    def test_multi_process_pynac_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            multi_process_pynac(['input.dat'], _run_reference_deck, num_iters=2, backend='threads')
+        self.assertEqual(os.listdir('.'), ['input.dat'])
+
+    def test_map_pynac_keep_outputs(self):
+        results = list(map_pynac(_run_reference_deck, range(3), extractor=get_number_of_particles,
+                                 max_workers=2, keep_outputs=True))
+        self.assertEqual([r.result for r in results], [1000] * 3)
+        for num in range(3):
+            self.assertTrue(os.path.exists(os.path.join('dynacProc_%04d' % num, 'dynac.short')))
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpDir)
+
+
+class RunDirectoryTest(unittest.TestCase):
+    def setUp(self):
+        self.deck = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ESS_with_SC_ana.in')
+        self.cwd = os.getcwd()
+        self.tmpDir = tempfile.mkdtemp()
+        os.chdir(self.tmpDir)
+        with open('input.dat', 'w') as f:
+            f.write('static input')
+
+    def test_stage_files(self):
+        for stage in ['copy', 'symlink', 'hardlink']:
+            os.mkdir(stage)
+            stage_files(['input.dat'], stage, stage)
+            with open(os.path.join(stage, 'input.dat')) as f:
+                self.assertEqual(f.read(), 'static input')
+        self.assertTrue(os.path.islink(os.path.join('symlink', 'input.dat')))
+        self.assertEqual(os.stat('input.dat').st_nlink, 2)
+        with self.assertRaises(ValueError):
+            stage_files(['input.dat'], 'copy', 'move')
+
+    def test_run_in_directory(self):
+        pyn = Pynac(self.deck)
+        with run_directory(['input.dat']) as directory:
+            pyn.run(cwd=directory)
+        self.assertEqual(get_number_of_particles(directory), 1000)
+        self.assertTrue(os.path.islink(os.path.join(directory, 'input.dat')))
+        self.assertFalse(os.path.exists('emit.plot'))
+
+    def test_tmpfs_directory_is_removed(self):
+        with run_directory(['input.dat'], tmpfs=True) as directory:
+            Pynac(self.deck).run(cwd=directory)
+            self.assertTrue(os.path.exists(os.path.join(directory, 'emit.plot')))
+        self.assertFalse(os.path.exists(directory))
+
+    def test_concurrent_threads(self):
+        results = {}
+
+        def run(num):
+            with run_directory(['input.dat'], tmpfs=True) as directory:
+                Pynac(self.deck).run(cwd=directory)
+                results[num] = get_number_of_particles(directory)
+        threads = [threading.Thread(target=run, args=(num,)) for num in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, {num: 1000 for num in range(4)})
+        self.assertEqual(os.getcwd(), os.path.realpath(self.tmpDir))
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpDir)
+
+
+class ProgressTest(unittest.TestCase):
+    def setUp(self):
+        self.pyn = Pynac(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ESS_with_SC_ana.in'))
+        self.cwd = os.getcwd()
+        self.tmpDir = tempfile.mkdtemp()
+        os.chdir(self.tmpDir)
+
+    def test_progress_callback(self):
+        events = []
+        self.pyn.run(progress=events.append)
+        self.assertTrue(events)
+        self.assertTrue(all(isinstance(e.index, int) and e.dynacType.isupper() for e in events))
+        self.assertEqual(sorted(e.elapsed for e in events), [e.elapsed for e in events])
+        self.assertTrue(self.pyn.dynacStdout)
+
+    def test_progress_lines_are_checked_against_lattice(self):
+        types = [pynCore.dynac_from_ele(ele) for ele in self.pyn.lattice]
+        index = types.index('QUADRUPO') + 1
+        event = pynCore._progress_event('  %d QUADRUPO' % index, time.monotonic(), types)
+        self.assertEqual((event.index, event.dynacType), (index, 'QUADRUPO'))
+        for line in ['  %d DRIFT' % index, '  %d QUADRUPO' % (len(types) + 1), '  0 RDBEAM',
+                     '  1000 PARTICLES', 'Error at %d QUADRUPO' % index]:
+            self.assertIsNone(pynCore._progress_event(line, time.monotonic(), types), line)
+
+    def test_run_stats(self):
+        self.pyn.run()
+        stats = self.pyn.runStats
+        self.assertGreater(stats.wall, 0.0)
+        self.assertGreater(stats.user + stats.sys, 0.0)
+        self.assertLessEqual(stats.user + stats.sys, stats.wall * os.cpu_count())
+        self.assertGreater(stats.maxRSS, 0)
+
+    def test_progress_callback_error(self):
+        def progress(event):
+            raise ValueError(event)
+        with self.assertRaises(ValueError):
+            self.pyn.run(progress=progress)
+        self.assertTrue(os.path.exists('emit.plot'))
+
+    def test_iter_progress(self):
+        async def collect():
+            return [event async for event in self.pyn.iter_progress()]
+        events = asyncio.run(collect())
+        self.assertTrue(events)
+        sync_events = []
+        self.pyn.run(progress=sync_events.append)
+        self.assertEqual([(e.index, e.dynacType) for e in events], [(e.index, e.dynacType) for e in sync_events])
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpDir)
+
+
+class RunLimitsTest(unittest.TestCase):
+    def setUp(self):
+        self.pyn = Pynac(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ESS_with_SC_ana.in'))
+        self.cwd = os.getcwd()
+        self.tmpDir = tempfile.mkdtemp()
+        os.chdir(self.tmpDir)
+
+    def test_timeout(self):
+        with self.assertRaises(DynacTimeoutError):
+            self.pyn.run(timeout=1e-3)
+        self.assertIsNotNone(self.pyn.dynacProc.returncode)
+
+    def test_cancel(self):
+        cancel = threading.Event()
+        cancel.set()
+        with self.assertRaises(DynacCancelledError):
+            self.pyn.run(cancel=cancel)
+
+    def test_interrupted_run_stops_its_threads(self):
+        threads = threading.active_count()
+        with mock.patch('Pynac.Core._wait_with_rusage', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.pyn.run(timeout=30)
+        self.assertIsNotNone(self.pyn.dynacProc.returncode)
+        self.assertEqual(threading.active_count(), threads)
+
+    def test_kill_within_cpu_limit(self):
+        # A SIGKILL from elsewhere (e.g., the OOM killer) isn't put down to the CPU limit.
+        wait_with_rusage = pynCore._wait_with_rusage
+
+        def killed(proc):
+            return -signal.SIGKILL, wait_with_rusage(proc)[1]
+        with mock.patch('Pynac.Core._wait_with_rusage', side_effect=killed):
+            with self.assertRaises(DynacError) as context:
+                self.pyn.run(cpu_limit=60)
+        self.assertNotIsInstance(context.exception, DynacTimeoutError)
+
+    def test_cpu_limit_signal(self):
+        wait_with_rusage = pynCore._wait_with_rusage
+
+        def limited(proc):
+            return -signal.SIGXCPU, wait_with_rusage(proc)[1]
+        with mock.patch('Pynac.Core._wait_with_rusage', side_effect=limited):
+            with self.assertRaises(DynacTimeoutError):
+                self.pyn.run(cpu_limit=60)
+
+    def test_async_timeout(self):
+        with self.assertRaises(DynacTimeoutError):
+            asyncio.run(self.pyn.run_async(timeout=1e-3))
+        self.assertIsNotNone(self.pyn.dynacProc.returncode)
+
+    def test_async_timeout_leaves_no_tasks(self):
+        async def run():
+            with self.assertRaises(DynacTimeoutError):
+                await self.pyn.run_async(timeout=1e-3)
+            return asyncio.all_tasks() - {asyncio.current_task()}
+        self.assertEqual(asyncio.run(run()), set())
+
+    def test_async_cancel_event(self):
+        cancel = threading.Event()
+        cancel.set()
+        with self.assertRaises(DynacCancelledError):
+            asyncio.run(self.pyn.run_async(cancel=cancel))
+
+    def test_async_arguments_are_keywords(self):
+        with self.assertRaises(TypeError):
+            asyncio.run(self.pyn.run_async(None))
+
+    def test_async_cancel(self):
+        async def cancel_run():
+            task = asyncio.ensure_future(self.pyn.run_async())
+            await asyncio.sleep(0)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        asyncio.run(cancel_run())
+
+    def test_batch_continues_after_timeout(self):
+        result = multi_async_pynac((Pynac(self.pyn.filename) for _ in range(3)), timeout=1e-3)
+        self.assertEqual(len(result), 3)
+        self.assertTrue(all(isinstance(exc, DynacTimeoutError) for exc in result))
+        self.assertTrue(issubclass(DynacTimeoutError, DynacError))
+        self.assertTrue(issubclass(DynacError, RuntimeError))
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpDir)
+
+
+class DynacPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.pyn = Pynac(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ESS_with_SC_ana.in'))
+        self.cwd = os.getcwd()
+        self.tmpDir = tempfile.mkdtemp()
+        self.slotRoot = tempfile.mkdtemp()
+        os.chdir(self.tmpDir)
+
+    def test_pooled_runs(self):
+        with open('input.txt', 'w') as f:
+            f.write('input')
+        with DynacPool(size=2, root=self.slotRoot) as pool:
+            for _ in range(3):
+                self.pyn.run(pool=pool)
+                self.assertEqual(get_number_of_particles(), 1000)
+            deadline = time.monotonic() + 5
+            while len(os.listdir(self.slotRoot)) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(len(os.listdir(self.slotRoot)), 2)
+        self.assertEqual(os.listdir(self.slotRoot), [])
+        self.assertEqual(sorted(os.listdir('.')), ['dynac.dmp', 'dynac.print', 'dynac.short', 'emit.plot',
+                                                   'input.txt'])
+        self.assertTrue(any('element' in line for line in self.pyn.dynacStdout))
+
+    def test_pooled_run_in_other_directory(self):
+        with DynacPool(size=1, root=self.slotRoot) as pool:
+            with run_directory() as directory:
+                self.pyn.run(cwd=directory, pool=pool)
+                self.assertTrue(os.path.exists(os.path.join(directory, 'emit.plot')))
+
+    def test_outputs_are_not_linked(self):
+        for name in ['input.txt', 'emit.plot', 'emit.plot.idx']:
+            with open(name, 'w') as f:
+                f.write('old')
+        with DynacPool(size=1, root=self.slotRoot) as pool:
+            proc, slot = pool.acquire()
+            self.assertEqual(os.listdir(slot), ['input.txt'])
+            proc.kill()
+            proc.wait()
+            pool.release(slot)
+
+    def test_declared_inputs_are_linked(self):
+        os.mkdir('fields')
+        for name in ['input.txt', os.path.join('fields', 'field.map'), 'notes.txt']:
+            with open(name, 'w') as f:
+                f.write('input')
+        with DynacPool(size=1, root=self.slotRoot, file_list=['input.txt', 'fields/field.map']) as pool:
+            proc, slot = pool.acquire()
+            self.assertEqual(sorted(os.listdir(slot)), ['field.map', 'input.txt'])
+            proc.kill()
+            proc.wait()
+            pool.release(slot)
+            self.pyn.run(pool=pool)
+        self.assertTrue(os.path.exists('emit.plot'))
+
+    def test_dead_process_is_skipped(self):
+        with DynacPool(size=1, root=self.slotRoot) as pool:
+            proc, slot = pool.acquire()
+            proc.kill()
+            proc.wait()
+            pool.release(slot)
+            self.pyn.run(pool=pool)
+        self.assertTrue(os.path.exists('emit.plot'))
+
+    def test_failed_acquire_releases_process(self):
+        started = []
+
+        def fail(proc, cpu_limit):
+            if cpu_limit is not None:
+                started.append(proc)
+                raise OSError('cannot limit')
+        with DynacPool(size=1, root=self.slotRoot) as pool:
+            with mock.patch('Pynac.Core._limit_cpu', side_effect=fail):
+                with self.assertRaises(OSError):
+                    pool.acquire(cpu_limit=10)
+            self.assertIsNotNone(started[0].returncode)
+            deadline = time.monotonic() + 5
+            while len(os.listdir(self.slotRoot)) != 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(len(os.listdir(self.slotRoot)), 1)
+        self.assertEqual(os.listdir(self.slotRoot), [])
+
+    def test_close_wakes_waiting_acquire(self):
+        pool = DynacPool(size=0, root=self.slotRoot)
+        errors = []
+
+        def acquire():
+            try:
+                pool.acquire()
+            except RuntimeError as exc:
+                errors.append(exc)
+        threads = [threading.Thread(target=acquire) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        pool.close()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(errors), 2)
+
+    def test_async_pooled_run(self):
+        events = []
+        with DynacPool(size=1, root=self.slotRoot) as pool:
+            self.pyn.pool = pool
+            try:
+                asyncio.run(self.pyn.run_async(progress=events.append))
+            finally:
+                del self.pyn.pool
+        self.assertTrue(os.path.exists('emit.plot'))
+        self.assertTrue(events)
+
+    def test_closed_pool(self):
+        pool = DynacPool(size=1, root=self.slotRoot)
+        pool.close()
+        with self.assertRaises(RuntimeError):
+            self.pyn.run(pool=pool)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpDir)
+        shutil.rmtree(self.slotRoot)
+
+
 class RunningPynacTest(unittest.TestCase):
     @classmethod
     def setUpClass(self):
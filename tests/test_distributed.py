@@ -0,0 +1,111 @@
+import sys
+sys.path.append('../')
+import unittest
+import os
+import shutil
+import tempfile
+from Pynac.Core import Pynac, get_number_of_particles, DynacTimeoutError
+from Pynac.Distributed import Coordinator, TaskBoard, WorkerLostError, distributed_pynac
+from Pynac.DataClasses import WorkItem
+
+DECK = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ESS_with_SC_ana.in')
+
+
+def _run_pynac(pyn):
+    pyn.run()
+
+
+def _die_once(marker):
+    # Kill the whole worker process, the first time only.
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(1)
+    return 'survived'
+
+
+def _always_die(item):
+    os._exit(1)
+
+
+def _fail(item):
+    raise ValueError(item)
+
+
+class TaskBoardTest(unittest.TestCase):
+    def test_lease_and_complete(self):
+        board = TaskBoard()
+        board.put(0, WorkItem(None, 'a', None, ()))
+        index, task = board.lease('w1')
+        self.assertEqual((index, task.item), (0, 'a'))
+        self.assertIsNone(board.lease('w2'))
+        board.close()
+        self.assertFalse(board.finished())
+        board.complete(0, 'result', None, None)
+        board.complete(0, 'again', None, None)
+        self.assertEqual(board.next_result(0.1).result, 'result')
+        self.assertIsNone(board.next_result(0.1))
+        self.assertTrue(board.finished())
+
+    def test_expired_lease_is_requeued(self):
+        board = TaskBoard(lease_timeout=0.0, max_attempts=2)
+        board.put(0, WorkItem(None, 'a', None, ()))
+        self.assertEqual(board.lease('w1')[0], 0)
+        self.assertEqual(board.lease('w2')[0], 0)
+        self.assertIsNone(board.lease('w3'))
+        self.assertIsInstance(board.next_result(0.1).error, WorkerLostError)
+
+    def test_release(self):
+        board = TaskBoard()
+        board.put(0, WorkItem(None, 'a', None, ()))
+        board.lease('w1')
+        board.release('w1')
+        self.assertEqual(board.lease('w2')[0], 0)
+
+
+class DistributedTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpDir = tempfile.mkdtemp()
+        os.chdir(self.tmpDir)
+
+    def test_distributed_pynac(self):
+        results = list(distributed_pynac(_run_pynac, [Pynac(DECK)] * 3, get_number_of_particles, [DECK],
+                                         address=('localhost', 0), local_workers=2))
+        self.assertEqual(sorted(r.index for r in results), [0, 1, 2])
+        self.assertTrue(all(r.error is None for r in results))
+        self.assertTrue(all(r.result == 1000 for r in results))
+
+    def test_errors_are_returned(self):
+        results = list(distributed_pynac(_fail, ['a'], address=('localhost', 0), local_workers=1))
+        self.assertIsInstance(results[0].error, ValueError)
+
+    def test_run_limits_reach_workers(self):
+        results = list(distributed_pynac(_run_pynac, [Pynac(DECK)] * 2, local_workers=1, timeout=1e-3))
+        self.assertTrue(all(isinstance(r.error, DynacTimeoutError) for r in results))
+
+    def test_loopback_by_default(self):
+        with Coordinator() as coordinator:
+            self.assertEqual(coordinator.address[0], '127.0.0.1')
+
+    def test_lost_worker_is_replaced(self):
+        marker = os.path.join(self.tmpDir, 'marker')
+        with Coordinator(('localhost', 0), lease_timeout=1.0) as coordinator:
+            workers = [coordinator.start_local_worker() for _ in range(2)]
+            results = list(coordinator.map(_die_once, [marker]))
+            for proc in workers:
+                proc.join(5)
+        self.assertEqual(results[0].result, 'survived')
+        self.assertEqual(sorted(proc.exitcode for proc in workers), [0, 1])
+
+    def test_item_killing_every_worker(self):
+        results = list(distributed_pynac(_always_die, ['a'], address=('localhost', 0), local_workers=2,
+                                         lease_timeout=1.0, max_attempts=2))
+        self.assertIsInstance(results[0].error, WorkerLostError)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpDir)
+
+
+if __name__ == '__main__':
+    unittest.main()
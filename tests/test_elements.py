@@ -187,5 +187,29 @@ class ElementManipulationTest(unittest.TestCase):
         steerer.setField(10)
         self.assertEqual(steerer.field_strength.val, 10)
 
+class ElementStorageTest(unittest.TestCase):
+    def test_no_instance_dict(self):
+        for obj in [ele.Quad(1.0, 2.0, 3.0), ele.Drift(1.0), ele.Steerer(0.1, 'H'),
+                    ele.AccGap(1, 2, 3, 4, 5, 6, 7, 8), ele.CavityAnalytic(-30.0, 0.0)]:
+            self.assertFalse(hasattr(obj, '__dict__'))
+
+    def test_param_access(self):
+        quad = ele.Quad(4.0, -1.5, 0.92)
+        self.assertEqual(quad.L.val, 4.0)
+        self.assertEqual(quad.B.unit, 'kG')
+        self.assertEqual(quad.B, ele.Param(val=-1.5, unit='kG'))
+
+    def test_param_assignment(self):
+        quad = ele.Quad(4.0, -1.5, 0.92)
+        quad.B = ele.Param(val=2.0, unit='kG')
+        self.assertEqual(quad.dynacRepresentation(), ['QUADRUPO', [[4.0, 2.0, 0.92]]])
+        quad.B = 3.0
+        self.assertEqual(quad.B.val, 3.0)
+
+    def test_instance_dependent_unit(self):
+        self.assertEqual(ele.Set4DAperture(1, 2, 3, 4, 5, 1).energy.unit, 'MeV')
+        self.assertEqual(ele.Set4DAperture(1, 2, 3, 4, 5, 0).energy.unit, '%')
+
+
 if __name__ == '__main__':
     unittest.main()
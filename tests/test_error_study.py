@@ -0,0 +1,155 @@
+import sys
+sys.path.append('../')
+import unittest
+import os
+import shutil
+import tempfile
+from unittest import mock
+import numpy as np
+from Pynac.ErrorStudy import ErrorStudy, Perturbation, StudyJournal
+from Pynac.DataClasses import IterationResult
+
+DECK = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ESS_with_SC_ana.in')
+PERTURBATIONS = [
+    Perturbation('QUADRUPO', 'scaleField', 1e-2),
+    Perturbation('CAVMC', 'adjustPhase', 2.0),
+    Perturbation('CAVMC', 'scaleField', 1e-3),
+    Perturbation('STEER', 'setField', 1e-4, distribution='uniform'),
+]
+
+
+
+class ErrorStudyTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.study = ErrorStudy(DECK, PERTURBATIONS, num_seeds=5, seed=19781216)
+
+    def test_seed_streams_are_independent_of_study_size(self):
+        bigger = ErrorStudy(DECK, PERTURBATIONS, num_seeds=500, seed=19781216)
+        for a, b in zip(self.study.sample_seed(3), bigger.sample_seed(3)):
+            np.testing.assert_array_equal(a, b)
+
+    def test_seeds_differ(self):
+        self.assertFalse(np.array_equal(self.study.sample_seed(0)[0], self.study.sample_seed(1)[0]))
+
+    def test_sample_matches_sample_seed(self):
+        samples = self.study.sample()
+        self.assertEqual(samples[0].shape, (5, len(self.study.indices['QUADRUPO'])))
+        for num in range(5):
+            for a, b in zip(samples, self.study.sample_seed(num)):
+                np.testing.assert_array_equal(a[num], b)
+
+    def test_uniform_bounds(self):
+        steer = self.study.sample()[3]
+        self.assertTrue(np.all(np.abs(steer) <= 1e-4))
+
+    def test_unknown_distribution(self):
+        with self.assertRaises(ValueError):
+            ErrorStudy(DECK, [Perturbation('QUADRUPO', 'scaleField', 1e-2, distribution='cauchy')], 1)
+
+    def test_build_applies_perturbations(self):
+        study = ErrorStudy(DECK, PERTURBATIONS[:1], num_seeds=1, seed=1)
+        base = study.build(0, [np.ones(len(study.indices['QUADRUPO']))])
+        pyn = study.build(0)
+        scaling = study.sample_seed(0)[0]
+        for ind, factor in zip(study.indices['QUADRUPO'], scaling):
+            self.assertAlmostEqual(pyn.lattice[ind].B.val, base.lattice[ind].B.val * factor)
+
+    def test_build_is_reproducible(self):
+        self.assertEqual(self.study.build(2).render(), self.study.build(2).render())
+        self.assertNotEqual(self.study.build(2).render(), self.study.build(3).render())
+
+    def test_seeds_do_not_share_elements(self):
+        first = self.study.build(0)
+        again = self.study.build(1)
+        ind = self.study.indices['QUADRUPO'][0]
+        self.assertIsNot(first.lattice[ind], again.lattice[ind])
+        self.assertEqual(self.study.build(0).render(), first.render())
+
+    def test_fingerprint_of_numpy_values(self):
+        study = ErrorStudy(DECK, [Perturbation('QUADRUPO', 'scaleField', np.float64(1e-2), np.float64(1.0))],
+                           num_seeds=1, seed=1)
+        plain = ErrorStudy(DECK, [Perturbation('QUADRUPO', 'scaleField', 1e-2, 1.0)], num_seeds=1, seed=1)
+        self.assertEqual(study.fingerprint(), plain.fingerprint())
+
+    def test_unseeded_study_records_its_seed(self):
+        study = ErrorStudy(DECK, PERTURBATIONS, num_seeds=2)
+        again = ErrorStudy(DECK, PERTURBATIONS, num_seeds=2, seed=study.seed)
+        np.testing.assert_array_equal(study.sample_seed(1)[0], again.sample_seed(1)[0])
+
+
+class RunningErrorStudyTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpDir = tempfile.mkdtemp()
+        os.chdir(self.tmpDir)
+
+    def test_run(self):
+        study = ErrorStudy(DECK, PERTURBATIONS, num_seeds=4, seed=7)
+        results = list(study.run(seeds=[1, 3], backend='thread', max_workers=2))
+        self.assertEqual(sorted(r.index for r in results), [1, 3])
+        self.assertTrue(all(r.error is None for r in results))
+
+    def test_reproduce(self):
+        study = ErrorStudy(DECK, PERTURBATIONS, num_seeds=4, seed=7)
+        pyn = study.reproduce(2)
+        self.assertEqual(pyn.deckBuffer, study.build(2).render())
+        self.assertTrue(os.path.exists('emit.plot'))
+
+    def test_resume_from_journal(self):
+        study = ErrorStudy(DECK, PERTURBATIONS, num_seeds=3, seed=7)
+        extracted = []
+
+        def extractor(directory):
+            extracted.append(directory)
+            return len(extracted)
+
+        first = list(study.run(extractor, seeds=[0, 1], journal='study.journal', backend='thread'))
+        self.assertEqual(len(extracted), 2)
+        results = list(study.run(extractor, journal='study.journal', backend='thread'))
+        self.assertEqual(len(extracted), 3)
+        self.assertEqual(sorted(r.index for r in results), [0, 1, 2])
+        self.assertEqual(
+            {r.index: r.result for r in first},
+            {r.index: r.result for r in results if r.index < 2},
+        )
+
+    def test_journal_of_other_study(self):
+        list(ErrorStudy(DECK, PERTURBATIONS, num_seeds=1, seed=7).run(journal='study.journal',
+                                                                     backend='thread'))
+        with self.assertRaises(ValueError):
+            next(ErrorStudy(DECK, PERTURBATIONS, num_seeds=1, seed=8).run(journal='study.journal'))
+
+    def test_torn_entry_is_discarded(self):
+        journal = StudyJournal('study.journal', 'abc')
+        journal.record(IterationResult(0, {'a': 1}, None, None))
+        with open('study.journal', 'a') as f:
+            f.write('{"seed": 1, "res')
+        journal = StudyJournal('study.journal', 'abc')
+        journal.record(IterationResult(2, [2.0], None, None))
+        self.assertEqual(sorted(journal.completed()), [0, 2])
+        self.assertEqual(journal.completed()[0].result, {'a': 1})
+
+    def test_run_in_processes(self):
+        study = ErrorStudy(DECK, PERTURBATIONS, num_seeds=3, seed=7)
+        results = list(study.run(max_workers=2))
+        self.assertEqual(sorted(r.index for r in results), [0, 1, 2])
+        self.assertTrue(all(r.error is None for r in results))
+
+    def test_new_journal_is_created_with_its_header(self):
+        with mock.patch('os.link', side_effect=OSError('interrupted')):
+            with self.assertRaises(OSError):
+                StudyJournal('study.journal', 'abc')
+        self.assertEqual(os.listdir('.'), [])
+        StudyJournal('study.journal', 'abc')
+        self.assertEqual(os.listdir('.'), ['study.journal'])
+        with open('study.journal') as f:
+            self.assertEqual(f.read(), '{"fingerprint": "abc"}\n')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpDir)
+
+
+if __name__ == '__main__':
+    unittest.main()
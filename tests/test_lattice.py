@@ -0,0 +1,146 @@
+import sys
+sys.path.append('../')
+import unittest
+import os
+import numpy as np
+from Pynac.Core import Pynac, dynac_from_ele
+from Pynac.Lattice import ColumnarLattice, IndexedLattice, render_element
+import Pynac.Elements as pyEle
+
+
+def deck_lines(lattice):
+    lines = []
+    for ele in lattice:
+        try:
+            ele = ele.dynacRepresentation()
+        except AttributeError:
+            pass
+        lines.append(ele[0])
+        lines.extend(' '.join(str(i) for i in datum) for datum in ele[1])
+    return lines
+
+
+class ColumnarLatticeTest(unittest.TestCase):
+    def setUp(self):
+        self.pynacInstance = Pynac(os.path.join(os.path.dirname(__file__), 'ESS_with_SC_ana.in'))
+        self.columnar = ColumnarLattice(self.pynacInstance.lattice)
+
+    def test_same_deck(self):
+        self.assertEqual(len(self.columnar), len(self.pynacInstance.lattice))
+        self.assertEqual(deck_lines(self.columnar), deck_lines(self.pynacInstance.lattice))
+
+    def test_family_sizes(self):
+        self.assertEqual(len(self.columnar.column('QUADRUPO', 'B')), 243)
+        self.assertEqual(len(self.columnar.column('CAVMC', 'phase')), 62)
+        self.assertEqual(list(self.columnar.indices['QUADRUPO']), self.pynacInstance.get_x_inds('QUADRUPO'))
+
+    def test_getitem(self):
+        ind = self.pynacInstance.get_x_inds('CAVMC')[3]
+        self.assertEqual(self.columnar[ind], self.pynacInstance.lattice[ind].dynacRepresentation())
+
+    def test_scale_quads(self):
+        factors = np.linspace(0.9, 1.1, 243)
+        self.columnar.scale_field('QUADRUPO', factors)
+        for quad, factor in zip(self.pynacInstance.get_x_objs('QUADRUPO'), factors):
+            quad.scaleField(factor)
+        self.assertEqual(deck_lines(self.columnar), deck_lines(self.pynacInstance.lattice))
+
+    def test_cavities(self):
+        factors = np.linspace(0.95, 1.05, 62)
+        self.columnar.scale_field('CAVMC', factors)
+        self.columnar.adjust_phase('CAVMC', 2.5)
+        for cav, factor in zip(self.pynacInstance.get_x_objs('CAVMC'), factors):
+            cav.scaleField(factor)
+            cav.adjustPhase(2.5)
+        self.assertEqual(deck_lines(self.columnar), deck_lines(self.pynacInstance.lattice))
+
+    def test_set_steerers(self):
+        self.columnar.set_field('STEER', 0.001)
+        for steerer in self.pynacInstance.get_x_objs('STEER'):
+            steerer.setField(0.001)
+        self.assertEqual(deck_lines(self.columnar), deck_lines(self.pynacInstance.lattice))
+
+    def test_usable_as_pynac_lattice(self):
+        pyn = Pynac.from_lattice('Columnar', self.columnar)
+        self.assertEqual(len(pyn.get_x_inds('QUADRUPO')), 243)
+
+
+class IndexedLatticeTest(unittest.TestCase):
+    types = ['QUADRUPO', 'DRIFT', 'CAVMC', 'EMIT', 'STEER']
+
+    def setUp(self):
+        self.pynacInstance = Pynac(os.path.join(os.path.dirname(__file__), 'ESS_with_SC_ana.in'))
+        self.lattice = self.pynacInstance.lattice
+
+    def assertIndexCorrect(self):
+        for dynac_type in self.types:
+            scanned = [i for i, x in enumerate(self.lattice) if dynac_from_ele(x) == dynac_type]
+            self.assertEqual(self.lattice.indices(dynac_type), scanned)
+
+    def test_built_at_parse_time(self):
+        self.assertIsInstance(self.lattice, IndexedLattice)
+        self.assertIndexCorrect()
+
+    def test_multiple_types_in_lattice_order(self):
+        inds = self.pynacInstance.get_x_inds('QUADRUPO', 'DRIFT')
+        self.assertEqual(inds, sorted(inds))
+        self.assertEqual(len(inds), 243 + 412)
+
+    def test_replace(self):
+        ind = self.pynacInstance.get_x_inds('QUADRUPO')[5]
+        self.lattice[ind] = pyEle.Drift(1.0)
+        self.lattice[-1] = ['EMIT', []]
+        self.assertIndexCorrect()
+
+    def test_insert_and_delete(self):
+        self.lattice.insert(10, pyEle.Quad(1.0, 2.0, 3.0))
+        del self.lattice[self.pynacInstance.get_x_inds('CAVMC')[0]]
+        self.lattice.pop(3)
+        self.assertIndexCorrect()
+        self.lattice.append(['EMIT', []])
+        self.lattice[20:30] = [pyEle.Drift(1.0)]
+        self.assertIndexCorrect()
+
+    def test_assigning_a_list(self):
+        self.pynacInstance.lattice = [['EMIT', []]] + self.lattice
+        self.assertIsInstance(self.pynacInstance.lattice, IndexedLattice)
+        self.assertEqual(self.pynacInstance.get_x_inds('EMIT')[0], 0)
+
+
+class RenderCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.pynacInstance = Pynac(os.path.join(os.path.dirname(__file__), 'ESS_with_SC_ana.in'))
+        self.deck = self.pynacInstance.render()
+
+    def test_cached_after_render(self):
+        quad = self.pynacInstance.get_x_objs('QUADRUPO')[0]
+        self.assertIs(render_element(quad), quad._rendered)
+
+    def test_changes_mark_elements_dirty(self):
+        quad = self.pynacInstance.get_x_objs('QUADRUPO')[0]
+        cav = self.pynacInstance.get_x_objs('CAVMC')[0]
+        steerer = self.pynacInstance.get_x_objs('STEER')[0]
+        quad.scaleField(2.0)
+        cav.adjustPhase(1.0)
+        steerer.setField(0.5)
+        for ele in (quad, cav, steerer):
+            self.assertIsNone(ele._rendered)
+        self.assertIn('QUADRUPO\r\n4.0 %r 0.92\r\n' % quad.B.val, render_element(quad))
+        self.assertIn('STEER\r\n0.5 0\r\n', render_element(steerer))
+
+    def test_incremental_deck_matches_fresh_render(self):
+        for quad in self.pynacInstance.get_x_objs('QUADRUPO'):
+            quad.scaleField(1.01)
+        field = self.pynacInstance.get_x_objs('FIELD')[0]
+        field.filename = 'other_field.txt'
+        self.pynacInstance.set_new_rdbeam_file('other_beam.dst')
+        fresh = Pynac.from_lattice(self.pynacInstance.name, [
+            ele.dynacRepresentation() if hasattr(ele, 'dynacRepresentation') else ele
+            for ele in self.pynacInstance.lattice
+        ])
+        self.assertEqual(self.pynacInstance.render(), fresh.render())
+        self.assertNotEqual(self.pynacInstance.render(), self.deck)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import sys
+sys.path.append('../')
+import unittest
+import io
+import os
+import shutil
+import tempfile
+import numpy as np
+from Pynac.Core import make_phase_space_list, PhaseSpace
+from Pynac.Output import read_emit_cards, iter_emit_card_lines, EMIT_CARD_DTYPE, read_print_table
+from Pynac.Output import read_dump, read_dumps, stack_dumps
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class EmitCardTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.tmpDir = tempfile.mkdtemp()
+        shutil.copy(os.path.join(TEST_DIR, 'ref_dynac.short'), os.path.join(self.tmpDir, 'dynac.short'))
+        self.cards = read_emit_cards(self.tmpDir)
+
+    @classmethod
+    def tearDownClass(self):
+        shutil.rmtree(self.tmpDir)
+
+    def test_one_row_per_card(self):
+        self.assertEqual(self.cards.dtype, EMIT_CARD_DTYPE)
+        self.assertEqual(len(self.cards), 248)
+
+    def test_first_card(self):
+        card = self.cards[0]
+        self.assertEqual(card['refBeta'], 0.08762)
+        self.assertEqual(card['KE'], 3.624219)
+        self.assertEqual(card['x'], 0.023)
+        self.assertEqual(card['betaZ'], 0.0038511)
+        self.assertEqual(card['frequency'], 352.21)
+        self.assertEqual(card['emitZ'], 7.405)
+        self.assertEqual(card['particlesLeft'], 1000.0)
+        self.assertEqual(card['normEmitX'], 1.1921)
+        self.assertEqual(card['nonNormEmitY'], 13.438)
+
+    def test_no_missing_numbers(self):
+        for name in EMIT_CARD_DTYPE.names:
+            self.assertFalse(np.isnan(self.cards[name]).any(), name)
+
+    def test_truncated_card_is_skipped(self):
+        with open(os.path.join(self.tmpDir, 'dynac.short')) as f:
+            text = f.read()
+        cut = text.rindex('beam (emit card)') + 200
+        cards = list(iter_emit_card_lines(io.StringIO(text[:cut])))
+        self.assertEqual(len(cards), 247)
+
+    def test_overflowed_number_is_nan(self):
+        with open(os.path.join(self.tmpDir, 'dynac.short')) as f:
+            text = f.read()
+        text = text.replace('0.21412E+02    46.73', '***********    46.73', 1)
+        text = text.replace('1.618      8.374', '1.618*********', 1)
+        card = np.array(next(iter_emit_card_lines(io.StringIO(text))), dtype=np.float64).view(EMIT_CARD_DTYPE)[0]
+        self.assertTrue(np.isnan(card['dPhi']))
+        self.assertEqual(card['dW'], 46.73)
+        self.assertEqual(card['particlesLeft'], 1000.0)
+        self.assertEqual(card['xSize'], 1.618)
+        self.assertTrue(np.isnan(card['xpSize']))
+        self.assertEqual(card['r12X'], 0.0154)
+
+    def test_phase_space_list(self):
+        phase_spaces = make_phase_space_list(self.tmpDir)
+        self.assertEqual(len(phase_spaces), 248)
+        self.assertEqual(phase_spaces._phaseSpaces, {})
+        ps = phase_spaces[-1]
+        self.assertIsInstance(ps, PhaseSpace)
+        self.assertIs(phase_spaces[247], ps)
+        self.assertEqual(ps.xPhaseSpace.normEmit.val, self.cards['normEmitX'][-1])
+        self.assertEqual(ps.zPhaseSpace.mom.unit, 'keV')
+        self.assertEqual(ps.particlesLeft.val, 1000.0)
+        self.assertEqual(len(phase_spaces[:3]), 3)
+        with self.assertRaises(IndexError):
+            phase_spaces[248]
+
+
+class PrintTableTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        shutil.copy(os.path.join(TEST_DIR, 'ref_dynac.print'), os.path.join(self.tmpDir, 'dynac.print'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def test_read(self):
+        table = read_print_table(self.tmpDir)
+        self.assertEqual(len(table), 717)
+        self.assertEqual(len(table.dtype.names), 29)
+        self.assertEqual(table['dynacType'][0], 'START')
+        self.assertEqual(table['particles'].dtype, np.int64)
+        self.assertEqual(table['particles'][0], 1000)
+        self.assertEqual(table['Wcog'][0], 3.6242)
+        self.assertEqual(table['yBar'][0], -0.011847)
+        self.assertEqual(np.count_nonzero(table['dynacType'] == 'QUADRUPO'), 243)
+
+    def test_malformed_row(self):
+        filename = os.path.join(self.tmpDir, 'dynac.print')
+        with open(filename) as f:
+            lines = f.readlines()
+        lines[5] = lines[5].rsplit(None, 1)[0] + '\n'
+        with open(filename, 'w') as f:
+            f.writelines(lines)
+        with self.assertRaisesRegex(ValueError, 'Line 6 '):
+            read_print_table(self.tmpDir)
+
+    def test_cache(self):
+        table = read_print_table(self.tmpDir)
+        cached = read_print_table(self.tmpDir, cache=True)
+        self.assertTrue(os.path.exists(os.path.join(self.tmpDir, 'dynac.print.npy')))
+        mapped = read_print_table(self.tmpDir, cache=True)
+        self.assertIsInstance(mapped, np.memmap)
+        np.testing.assert_array_equal(mapped, table)
+        np.testing.assert_array_equal(cached, table)
+
+    def test_stale_cache_is_replaced(self):
+        read_print_table(self.tmpDir, cache=True)
+        filename = os.path.join(self.tmpDir, 'dynac.print')
+        with open(filename) as f:
+            lines = f.readlines()
+        with open(filename, 'w') as f:
+            f.writelines(lines[:3])
+        os.utime(filename, ns=(1, 1))
+        self.assertEqual(len(read_print_table(self.tmpDir, cache=True)), 2)
+
+
+class DumpTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.tmpDir = tempfile.mkdtemp()
+        shutil.copy(os.path.join(TEST_DIR, 'ref_dynac.dmp'), os.path.join(self.tmpDir, 'dynac.dmp'))
+        self.dump = read_dump(self.tmpDir)
+
+    @classmethod
+    def tearDownClass(self):
+        shutil.rmtree(self.tmpDir)
+
+    def test_tables(self):
+        self.assertEqual(sorted(self.dump), ['buncher', 'cavmc', 'gap'])
+        self.assertEqual([len(self.dump[t]['Z']) for t in ['buncher', 'gap', 'cavmc']], [3, 173, 62])
+
+    def test_columns(self):
+        gap = self.dump['gap']
+        self.assertEqual(gap['gap'].dtype, np.int64)
+        self.assertEqual(gap['gap'][0], 1)
+        self.assertEqual(self.dump['buncher']['EffVolt'][0], 0.12543)
+        self.assertEqual(self.dump['buncher']['Ex,RMS,n'][1], 0.32622)
+        self.assertEqual(self.dump['cavmc']['cav'][0], 174)
+        self.assertEqual(self.dump['cavmc']['PHIs'][0], -36.75)
+        self.assertIn('column13', self.dump['cavmc'])
+
+    def test_stack(self):
+        stacked = read_dumps([self.tmpDir, self.tmpDir])
+        self.assertEqual(stacked['cavmc']['PHIs'].shape, (2, 62))
+        np.testing.assert_array_equal(np.std(stacked['cavmc']['PHIs'], axis=0), np.zeros(62))
+
+    def test_stack_pads_short_tables(self):
+        short = {name: {column: values[:-1] for column, values in table.items()}
+                 for name, table in self.dump.items()}
+        stacked = stack_dumps([self.dump, short])
+        self.assertEqual(stacked['gap']['Z'].shape, (2, 173))
+        self.assertTrue(np.isnan(stacked['gap']['Z'][1, -1]))
+        self.assertFalse(np.isnan(stacked['gap']['Z'][0]).any())
+
+    def test_stack_pads_missing_tables(self):
+        lost = {'gap': {column: values for column, values in self.dump['gap'].items() if column != 'Z'}}
+        stacked = stack_dumps([lost, self.dump])
+        self.assertEqual(sorted(stacked), sorted(self.dump))
+        self.assertEqual(stacked['gap']['Z'].shape, (2, 173))
+        self.assertTrue(np.isnan(stacked['gap']['Z'][0]).all())
+        self.assertTrue(np.isnan(stacked['cavmc']['PHIs'][0]).all())
+        np.testing.assert_array_equal(stacked['cavmc']['PHIs'][1], self.dump['cavmc']['PHIs'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,11 @@
 import sys
 sys.path.append('../')
 import unittest
-from Pynac.Plotting import NewPynPlt
+import os
+import shutil
+import tempfile
+import numpy as np
+from Pynac.Plotting import NewPynPlt, EmitPlotIndex
 
 class parseEmitPlotTest(unittest.TestCase):
     def test_parseEmitPlot_basic_operation(self):
@@ -23,6 +27,103 @@ class parseEmitPlotTest(unittest.TestCase):
         self.assertIsInstance(plotter.envelColumnData, list)
         self.assertEqual(len(plotter.envelColumnData), 1)
         self.assertIn('envelopes', plotter.envelColumnData[0])
+    def test_parseEmitPlot_values(self):
+        plotter = NewPynPlt(filename='ref_emit.plot')
+        ellipse = plotter.emitgrColumnData[0]['horizEllipse'].data
+        self.assertIsInstance(ellipse['x'], np.ndarray)
+        self.assertEqual(len(ellipse['x']), 201)
+        self.assertEqual(ellipse['x'][0], -1.4151036394431031E-003)
+        self.assertEqual(ellipse['xp'][0], -12.642926635943544)
+        beam = plotter.emitgrColumnData[0]['beam'].data
+        self.assertEqual([len(beam[k]) for k in ['x', 'xp', 'y', 'yp', 'z', 'zp']], [1000] * 6)
+        self.assertEqual(beam['x'][0], 0.11088826203716526)
+        self.assertEqual(len(plotter.envelColumnData[0]['envelopes'].data['s']), 717)
+
+
+class EmitPlotIndexTest(unittest.TestCase):
+    def test_index_plots(self):
+        index = EmitPlotIndex('ref_emit.plot')
+        self.assertEqual([plot.plotType for plot in index.plots], [1, 2, 1, 3, 2])
+        self.assertEqual(index[0].blocks['horizEllipse'][1], 201)
+        self.assertEqual(index[0].blocks['horizBeam'][1], 1000)
+
+    def test_readPairs_matches_full_parse(self):
+        index = EmitPlotIndex('ref_emit.plot')
+        plotter = NewPynPlt(filename='ref_emit.plot')
+        beam = plotter.emitgrColumnData[1]['beam'].data
+        z, zp = index.readPairs(2, 'longBeam')
+        np.testing.assert_array_equal(z, beam['z'])
+        np.testing.assert_array_equal(zp, beam['zp'])
+
+    def test_parsePlot_matches_full_parse(self):
+        eager = NewPynPlt(filename='ref_emit.plot')
+        lazy = NewPynPlt(filename='ref_emit.plot', lazy=True)
+        self.assertEqual(lazy.emitgrColumnData, [])
+        plotType, plotData = lazy.parsePlot(3)
+        self.assertEqual(plotType, 3)
+        np.testing.assert_array_equal(plotData['envelopes']['s'],
+                                      eager.envelColumnData[0]['envelopes'].data['s'])
+        plotType, plotData = lazy.parsePlot(4)
+        self.assertEqual(plotType, 2)
+        np.testing.assert_array_equal(plotData['normedProfiles']['zp'],
+                                      eager.profgrColumnData[1]['normedProfZP'].data['zp'])
+
+    def test_overflowed_number_is_an_error(self):
+        index = EmitPlotIndex('ref_emit.plot')
+        offset, numLines = index[0].blocks['horizBeam']
+        with open('ref_emit.plot', 'rb') as f:
+            text = f.read()
+        line = text[offset:text.index(b'\n', offset)]
+        tmpDir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmpDir, 'emit.plot')
+            with open(filename, 'wb') as f:
+                f.write(text[:offset] + b' ' + b'*' * (len(line) - 1) + text[offset + len(line):])
+            with self.assertRaises(ValueError):
+                EmitPlotIndex(filename).readPairs(0, 'horizBeam')
+        finally:
+            shutil.rmtree(tmpDir)
+
+    def test_empty_beam_blocks(self):
+        index = EmitPlotIndex('ref_emit.plot')
+        with open('ref_emit.plot', 'rb') as f:
+            text = f.read()
+        # Empty the three beam blocks of the first plot, as after total beam loss.
+        for name in ['longBeam', 'vertBeam', 'horizBeam']:
+            offset, numLines = index[0].blocks[name]
+            countStart = text.rindex(b'\n', 0, offset - 1) + 1
+            end = offset
+            for _ in range(numLines):
+                end = text.index(b'\n', end) + 1
+            text = text[:countStart] + b'           0\n' + text[end:]
+        tmpDir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmpDir, 'emit.plot')
+            with open(filename, 'wb') as f:
+                f.write(text)
+            x, xp = EmitPlotIndex(filename).readPairs(0, 'horizBeam')
+            self.assertEqual((len(x), len(xp)), (0, 0))
+            self.assertEqual(x.dtype, np.float64)
+            plotter = NewPynPlt(filename=filename)
+            self.assertEqual(len(plotter.emitgrColumnData[0]['beam'].data['zp']), 0)
+            self.assertEqual(len(plotter.emitgrColumnData[1]['beam'].data['x']), 1000)
+        finally:
+            shutil.rmtree(tmpDir)
+
+    def test_cached_index(self):
+        tmpDir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmpDir, 'emit.plot')
+            shutil.copy('ref_emit.plot', filename)
+            built = EmitPlotIndex(filename, cache=True)
+            self.assertTrue(os.path.exists(filename + '.idx'))
+            loaded = EmitPlotIndex(filename, cache=True)
+            self.assertEqual(loaded.plots, built.plots)
+            with open(filename, 'a') as f:
+                f.write('\n')
+            self.assertFalse(loaded.isCurrent())
+        finally:
+            shutil.rmtree(tmpDir)
 
 if __name__ == '__main__':
     unittest.main()